@@ -0,0 +1,85 @@
+"""
+Memory footprint of queued BBPackets
+
+Fills a deque, as NodeState.inputs would be, with packets and reports the
+memory allocated per packet for the current BBPacket and for the previous,
+dict based implementation.
+
+Usage: python -m benchmarks.bbpacket_memory [-n COUNT] [--size BYTES]
+"""
+import argparse
+import gc
+import tracemalloc
+from collections import deque
+from typing import Callable, Optional
+
+from scapy.layers.l2 import Ether
+from scapy.packet import Packet
+
+from lowcaf.packetprocessing.bbpacket import BBPacket
+
+
+class LegacyBBPacket:
+    """
+    BBPacket before it was slotted: a __dict__ per instance and a metadata
+    dict per instance.
+    """
+
+    def __init__(self,
+                 data: Packet | bytes,
+                 timestamp: int,
+                 dropped: bool = False,
+                 metadata: Optional[dict] = None):
+        self.scapy_pkt = data
+        self.timestamp: int = timestamp
+        self.dropped: bool = dropped
+        self.metadata: dict = metadata if metadata is not None else {}
+
+
+def measure(factory: Callable[[int], object], count: int) -> int:
+    """
+    Args:
+        factory: Creates the i-th packet
+        count: Number of packets to queue
+
+    Returns:
+        Bytes allocated per queued packet
+    """
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    queue = deque(factory(i) for i in range(count))
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del queue
+    return (after - before) // count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', '--count', type=int, default=100_000)
+    parser.add_argument('--size', type=int, default=64,
+                        help='Packet size in bytes')
+    args = parser.parse_args()
+
+    header = bytes(Ether(dst='ff:ff:ff:ff:ff:ff', src='02:00:00:00:00:01'))
+    frame = memoryview(header + bytes(args.size - len(header)))
+
+    # each packet gets its own copy of the payload like in the socket runner
+    cases = {
+        'legacy, dissected': lambda i: LegacyBBPacket(
+            Ether(bytes(frame)), i),
+        'legacy, raw bytes': lambda i: LegacyBBPacket(bytes(frame), i),
+        'slotted, raw bytes': lambda i: BBPacket.from_raw(
+            bytes(frame), i, time_ns=i),
+        'slotted, with metadata': lambda i: BBPacket.from_raw(
+            bytes(frame), i, time_ns=i, metadata={'t_diff': 0.0}),
+    }
+
+    print(f'{args.count} packets of {args.size} bytes')
+    for name, factory in cases.items():
+        print(f'{name:>24}: {measure(factory, args.count):6d} B/packet')
+
+
+if __name__ == '__main__':
+    main()
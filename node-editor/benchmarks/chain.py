@@ -0,0 +1,161 @@
+"""
+Throughput of a linear chain with and without fusion
+
+Runs a Dummy Src -> (Histogram -> Counter) * n -> Null Sink graph once as
+is and once after PacketProcessor.compile and reports the time per packet.
+
+Before, a source of numbered packets -> Repeater -> Distribution ->
+Histogram -> Counter chain is run both ways, with bounded and unbounded queues, to check that
+fusion does not change the packets reaching the sink.
+
+Usage: python -m benchmarks.chain [-p PACKETS] [-b BUDGET] [LENGTH ...]
+"""
+import argparse
+import time
+from collections import deque
+
+import numpy as np
+
+from lowcaf.nodeeditor.portid import PortID
+from lowcaf.nodes.dist import DistN, NormalDist
+from lowcaf.nodes.dummy import DummySrcN, NullSnkN, CounterN
+from lowcaf.nodes.histogram import HistogramN
+from lowcaf.nodes.ifaces.rnode import RNode
+from lowcaf.nodes.repeater import RepeaterN
+from lowcaf.packetprocessing.bbpacket import BBPacket
+from lowcaf.packetprocessing.nodeselector import NodeSelector, TopoSelector
+from lowcaf.packetprocessing.packetprocessor import PacketProcessor
+
+REPEATS = 4  # Copies made by the Repeater of the checked chain
+CHECK_CAPACITY = 16  # Capacity of the bounded run of the checked chain
+
+
+class SeqSrcN(RNode):
+    """
+    Emits numbered packets with fixed timestamps, unlike DummySrcN whose
+    packets carry the time they were created
+    """
+
+    def __init__(self, node_id: int, nr_packets: int):
+        super().__init__(node_id, 0, 1, None)
+        self.nr_packets: int = nr_packets
+        self.ctr: int = 0
+
+    def process(self, inputs: list[deque], outputs: list[list]):
+        outputs[0].append(BBPacket.from_raw(
+            self.ctr.to_bytes(8, 'big'), 0, time_ns=self.ctr * 1_000_000))
+        self.ctr += 1
+
+    def is_ready(self, inputs: list[deque]) -> bool:
+        return self.ctr < self.nr_packets
+
+
+class RecordSnkN(RNode):
+    """
+    Keeps the time and bytes of every packet it receives. Not fused, so
+    the queue feeding it shows the effect of the capacity.
+    """
+
+    fusable = False
+
+    def __init__(self, node_id: int):
+        super().__init__(node_id, 1, 0, None)
+        self.received: list[tuple[float, bytes]] = []
+
+    def process(self, inputs: list[deque], outputs: list[list]):
+        pkt = inputs[0].popleft()
+        self.received.append((float(pkt.time), pkt.to_bytes()))
+
+    def is_ready(self, inputs: list[deque]) -> bool:
+        return len(inputs[0]) > 0
+
+
+def build(length: int, packets: int) -> PacketProcessor:
+    """
+    Args:
+        length: Number of nodes between source and sink
+        packets: Number of packets emitted by the source
+    """
+    nodes = {0: DummySrcN(0, packets, None)}
+    for node_id in range(1, length + 1):
+        if node_id % 2:
+            nodes[node_id] = HistogramN(node_id, None)
+        else:
+            nodes[node_id] = CounterN(node_id)
+    nodes[length + 1] = NullSnkN(length + 1)
+
+    links = {node_id: {0: PortID(node_id + 1, 0)}
+             for node_id in range(length + 1)}
+    return PacketProcessor(nodes, links)
+
+
+def run(length: int, packets: int, budget: int, fuse: bool) -> float:
+    """
+    Returns:
+        Time per packet in us
+    """
+    pp = build(length, packets)
+    pp.setup()
+    if fuse:
+        pp.compile()
+
+    start = time.perf_counter()
+    TopoSelector(pp, budget).gen_nodes(pp)
+    duration = time.perf_counter() - start
+    pp.teardown()
+    return duration / packets * 1e6
+
+
+def check(packets: int, budget: int, capacity: int | None, fuse: bool
+          ) -> tuple[list[tuple[float, bytes]], int]:
+    """
+    Returns:
+        The packets received by the sink of the checked chain and the
+        maximum length its input queue reached
+    """
+    sink = RecordSnkN(5)
+    nodes = {
+        0: SeqSrcN(0, packets),
+        1: RepeaterN(1, repeats=REPEATS),
+        2: DistN(2, None, NormalDist()),
+        3: HistogramN(3, None),
+        4: CounterN(4),
+        5: sink,
+    }
+    links = {node_id: {0: PortID(node_id + 1, 0)} for node_id in range(5)}
+    pp = PacketProcessor(nodes, links, capacity)
+    pp.setup()
+    if fuse:
+        pp.compile()
+
+    np.random.seed(0)
+    pp.run_until_idle(TopoSelector(pp, budget))
+    pp.teardown()
+    return sink.received, pp.nodes[5].peaks[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('lengths', type=int, nargs='*', default=[2, 8, 32])
+    parser.add_argument('-p', '--packets', type=int, default=20_000)
+    parser.add_argument('-b', '--budget', type=int,
+                        default=NodeSelector.DEFAULT_BUDGET)
+    args = parser.parse_args()
+
+    for capacity in (None, CHECK_CAPACITY):
+        plain, _ = check(args.packets, args.budget, capacity, False)
+        fused, peak = check(args.packets, args.budget, capacity, True)
+        assert len(plain) == args.packets * REPEATS
+        assert fused == plain, 'fusion changed the output'
+        print(f'capacity {capacity}: fused output identical, '
+              f'peak queue {peak}')
+
+    for length in args.lengths:
+        plain = run(length, args.packets, args.budget, False)
+        fused = run(length, args.packets, args.budget, True)
+        print(f'chain of {length:3d}: {plain:7.2f} us/packet, '
+              f'fused {fused:7.2f} us/packet ({plain / fused:4.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Read throughput of PcapSourceN
+
+Writes a capture of random UDP packets and reports the packets per second
+read with scapy's RawPcapReader, with RawReader and with PcapSourceN for
+every read-ahead worker. The packets are not dissected.
+
+Usage: python -m benchmarks.pcap_read [-n COUNT] [--size BYTES] [--ng]
+"""
+import argparse
+import functools
+import os
+import tempfile
+import time
+from multiprocessing.connection import wait
+
+from scapy.layers.inet import IP, UDP
+from scapy.layers.l2 import Ether
+from scapy.utils import PcapNgWriter, PcapWriter, RawPcapReader
+
+from lowcaf.nodes.pcap import PcapSourceN
+from lowcaf.util.pcapreader import RawReader
+from lowcaf.util.prefetch import WORKERS
+
+BUDGET = 64
+
+
+def scapy_reader(path: str) -> int:
+    count = 0
+    with RawPcapReader(path) as reader:
+        for _ in reader:
+            count += 1
+    return count
+
+
+def raw_reader(path: str) -> int:
+    count = 0
+    with RawReader(path) as reader:
+        for data, _, _ in reader:
+            bytes(data)
+            count += 1
+    return count
+
+
+def source_node(path: str, prefetch: str) -> int:
+    node = PcapSourceN(0, path, prefetch=prefetch)
+    node.setup(None)
+    count = 0
+    while True:
+        if node.is_ready([]):
+            out = [[]]
+            count += node.process_batch([], out, BUDGET)
+        elif waitable := node.waitable():
+            wait(waitable)
+        else:
+            break
+    node.teardown()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', '--count', type=int, default=100_000)
+    parser.add_argument('--size', type=int, default=128,
+                        help='Packet size in bytes')
+    parser.add_argument('--ng', action='store_true',
+                        help='Write a pcapng instead of a pcap file')
+    args = parser.parse_args()
+
+    header = Ether() / IP() / UDP()
+    fd, path = tempfile.mkstemp(suffix='.pcapng' if args.ng else '.pcap')
+    os.close(fd)
+    try:
+        writer = PcapNgWriter(path) if args.ng else PcapWriter(path)
+        with writer:
+            for i in range(args.count):
+                pkt = header / os.urandom(args.size - len(header))
+                pkt.time = i * 1e-3
+                writer.write(pkt)
+
+        print(f'{args.count} packets of {args.size} bytes')
+        cases = {
+            'RawPcapReader': scapy_reader,
+            'RawReader': raw_reader,
+        }
+        for prefetch in WORKERS:
+            cases[f'PcapSourceN, {prefetch}'] = functools.partial(
+                source_node, prefetch=prefetch)
+        for name, read in cases.items():
+            start = time.perf_counter()
+            count = read(path)
+            rate = count / (time.perf_counter() - start)
+            print(f'{name:>22}: {rate:12,.0f} packets/s')
+    finally:
+        os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Throughput of pipelined execution across worker processes
+
+Runs a Dummy Src -> Work * n -> Null Sink graph, where every Work node
+spends a fixed amount of CPU time per packet, once in a single process and
+once split into stages, and reports the time per packet. With --shards the
+Work nodes instead form a single stage replicated across that many
+processes. The speedup is bounded by the number of cores.
+
+Usage: python -m benchmarks.pipeline [-p PACKETS] [-n NODES] [-w WORK]
+                                     [--shards] [--ordered] [WORKERS ...]
+"""
+import argparse
+import hashlib
+import time
+from collections import deque
+
+from lowcaf.nodeeditor.portid import PortID
+from lowcaf.nodes.dummy import DummySrcN, NullSnkN
+from lowcaf.nodes.ifaces.rnode import RNode
+from lowcaf.packetprocessing.flowkey import KEY_ROUND_ROBIN
+from lowcaf.packetprocessing.packetprocessor import PacketProcessor
+
+
+class BenchWorkN(RNode):
+    stateless = True
+
+    def __init__(self, node_id: int, rounds: int):
+        super().__init__(node_id, 1, 1)
+        self.rounds = rounds
+
+    def process(self, inputs: list[deque], outputs: list[list]):
+        pkt = inputs[0].popleft()
+        digest = pkt.to_bytes()
+        for _ in range(self.rounds):
+            digest = hashlib.sha256(digest).digest()
+        outputs[0].append(pkt)
+
+    def is_ready(self, inputs: list[deque]) -> bool:
+        return len(inputs[0]) > 0
+
+
+def run(nodes: int,
+        packets: int,
+        rounds: int,
+        workers: int,
+        shards: bool = False,
+        ordered: bool = False) -> float:
+    """
+    Args:
+        workers: Worker processes, replicas of the Work stage if shards
+
+    Returns:
+        Time per packet in us
+    """
+    graph = {0: DummySrcN(0, packets, None)}
+    for node_id in range(1, nodes + 1):
+        graph[node_id] = BenchWorkN(node_id, rounds)
+    graph[nodes + 1] = NullSnkN(nodes + 1)
+    links = {node_id: {0: PortID(node_id + 1, 0)}
+             for node_id in range(nodes + 1)}
+
+    pp = PacketProcessor(graph, links)
+    pp.setup()
+    pp.compile()
+    if shards and workers > 0:
+        for node_id in range(1, nodes + 1):
+            graph[node_id].stage = 1
+        pp.shard(1, workers, KEY_ROUND_ROBIN, ordered)
+
+    start = time.perf_counter()
+    pp.drive(workers=0 if shards else workers)
+    duration = time.perf_counter() - start
+    pp.teardown()
+    return duration / packets * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('workers', type=int, nargs='*', default=[1, 2, 4])
+    parser.add_argument('-p', '--packets', type=int, default=20_000)
+    parser.add_argument('-n', '--nodes', type=int, default=4,
+                        help='Work nodes between source and sink')
+    parser.add_argument('-w', '--work', type=int, default=20,
+                        help='SHA-256 rounds per packet and node')
+    parser.add_argument('--shards', action='store_true',
+                        help='Replicate the Work nodes instead of splitting')
+    parser.add_argument('--ordered', action='store_true',
+                        help='Restore the packet order after the replicas')
+    args = parser.parse_args()
+
+    single = run(args.nodes, args.packets, args.work, 0)
+    results = [(workers, run(args.nodes, args.packets, args.work, workers,
+                             args.shards, args.ordered))
+               for workers in args.workers]
+
+    print(f'single process: {single:7.2f} us/packet')
+    for workers, us_per_pkt in results:
+        print(f'{workers:2d} workers:     {us_per_pkt:7.2f} us/packet '
+              f'({single / us_per_pkt:4.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
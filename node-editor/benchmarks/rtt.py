@@ -0,0 +1,108 @@
+"""
+Round-trip time from ns-3 through lowcaf and back
+
+A stand-in for ns-3 connects to an NS3 Src -> NS3 Snk graph sharing one
+socket, sends a packet, waits for it to come back and repeats. Reports the
+round-trip times for every transport, see PacketProcessor.
+
+Usage: python -m benchmarks.rtt [-m MESSAGES] [-s SIZE]
+"""
+import argparse
+import contextlib
+import io
+import socket
+import statistics
+import time
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import Connection
+
+from lowcaf.nodeeditor.portid import PortID
+from lowcaf.nodes.ns3snk import NS3SnkN
+from lowcaf.nodes.ns3src import NS3SrcN
+from lowcaf.packetprocessing.bbpacket import DecoderBB2Sim, EODMsg, \
+    MsgSim2BB
+from lowcaf.packetprocessing.packetprocessor import PacketProcessor
+from lowcaf.packetprocessing.transport import TRANSPORTS
+
+ADDRESS = '127.0.0.1'
+SRC_ID = 0
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind((ADDRESS, 0))
+        return sock.getsockname()[1]
+
+
+def fake_ns3(port: int, messages: int, size: int, results: Connection):
+    sock = socket.socket()
+    while True:
+        try:
+            sock.connect((ADDRESS, port))
+            break
+        except ConnectionRefusedError:
+            time.sleep(0.01)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    msg = MsgSim2BB(1, SRC_ID, 0, bytes(size)).serialize()
+    rtts = []
+    buff = b''
+    for _ in range(messages):
+        start = time.perf_counter_ns()
+        sock.sendall(msg)
+        msgs = []
+        while not msgs:
+            buff += sock.recv(65536)
+            msgs, ptr = DecoderBB2Sim.decode(buff)
+            buff = buff[ptr:]
+        rtts.append(time.perf_counter_ns() - start)
+
+    sock.sendall(EODMsg().serialize())
+    # wait for the fin of lowcaf
+    while True:
+        data = sock.recv(65536)
+        if not data or b'\x02' in data:
+            break
+    sock.close()
+    results.send(rtts)
+
+
+def run(transport: str, messages: int, size: int) -> list[int]:
+    """
+    Returns:
+        The round-trip times in ns
+    """
+    port = free_port()
+    nodes = {SRC_ID: NS3SrcN(SRC_ID, ADDRESS, port),
+             1: NS3SnkN(1, ADDRESS, port)}
+    pp = PacketProcessor(nodes, {SRC_ID: {0: PortID(1, 0)}},
+                         transport=transport)
+
+    results, child = Pipe(duplex=False)
+    peer = Process(target=fake_ns3, args=(port, messages, size, child))
+    peer.start()
+    # the nodes report every packet
+    with contextlib.redirect_stdout(io.StringIO()):
+        pp.setup()
+        pp.drive()
+    rtts = results.recv()
+    peer.join()
+    pp.teardown()
+    return rtts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-m', '--messages', type=int, default=2000)
+    parser.add_argument('-s', '--size', type=int, default=64,
+                        help='Payload bytes per packet')
+    args = parser.parse_args()
+
+    for transport in TRANSPORTS:
+        rtts = sorted(run(transport, args.messages, args.size))
+        print(f'{transport:>8}: median {statistics.median(rtts) / 1e3:7.1f}'
+              f' us, p99 {rtts[int(len(rtts) * 0.99)] / 1e3:7.1f} us')
+
+
+if __name__ == '__main__':
+    main()
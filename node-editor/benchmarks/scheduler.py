@@ -0,0 +1,151 @@
+"""
+Scheduling overhead of the node selectors
+
+Runs a graph of trivial nodes (one source fanning out into parallel chains
+that each end in a sink) to completion and reports the time per packet and
+hop. As the nodes do next to nothing, this is the cost of the selector.
+
+Usage: python -m benchmarks.scheduler [-p PACKETS] [-r REPEAT]
+                                      [SIZE ...] [-b BUDGET ...]
+"""
+import argparse
+import math
+import time
+from collections import deque
+
+from lowcaf.nodeeditor.portid import PortID
+from lowcaf.nodes.ifaces.rnode import RNode
+from lowcaf.packetprocessing.bbpacket import BBPacket
+from lowcaf.packetprocessing.nodeselector import NodeSelector, \
+    PrioritySelector, TopoSelector
+from lowcaf.packetprocessing.packetprocessor import PacketProcessor
+
+SELECTORS = [PrioritySelector, TopoSelector]
+
+
+class BenchSrcN(RNode):
+    def __init__(self, node_id: int, nr_outputs: int, packets: int):
+        super().__init__(node_id, 0, nr_outputs)
+        self.left = packets
+        self.pkt = BBPacket.from_raw(bytes(64), 0, time_ns=0)
+
+    def process(self, inputs: list[deque], outputs: list[list]):
+        self.left -= 1
+        for output in outputs:
+            output.append(self.pkt)
+
+    def is_ready(self, inputs: list[deque]) -> bool:
+        return self.left > 0
+
+
+class BenchFwdN(RNode):
+    def __init__(self, node_id: int):
+        super().__init__(node_id, 1, 1)
+
+    def process(self, inputs: list[deque], outputs: list[list]):
+        outputs[0].append(inputs[0].popleft())
+
+    def process_batch(self, inputs: list[deque], outputs: list[list],
+                      budget: int) -> int:
+        nr_pkts = min(budget, len(inputs[0]))
+        for _ in range(nr_pkts):
+            outputs[0].append(inputs[0].popleft())
+        return nr_pkts
+
+    def is_ready(self, inputs: list[deque]) -> bool:
+        return len(inputs[0]) > 0
+
+
+class BenchSnkN(RNode):
+    def __init__(self, node_id: int):
+        super().__init__(node_id, 1, 0)
+        self.count = 0
+
+    def process(self, inputs: list[deque], outputs: list[list]):
+        inputs[0].popleft()
+        self.count += 1
+
+    def is_ready(self, inputs: list[deque]) -> bool:
+        return len(inputs[0]) > 0
+
+
+def build(size: int, packets: int) -> tuple[dict, dict]:
+    """
+    Args:
+        size: Approximate number of nodes
+        packets: Number of packets emitted per source output
+
+    Returns:
+        nodes, links: As expected by the PacketProcessor
+    """
+    width = max(1, round(math.sqrt(size - 1)))
+    length = max(1, (size - 1) // width)
+
+    nodes = {0: BenchSrcN(0, width, packets)}
+    links = {0: {}}
+    for chain in range(width):
+        prev, port = 0, chain
+        for pos in range(length):
+            node_id = len(nodes)
+            if pos == length - 1:
+                nodes[node_id] = BenchSnkN(node_id)
+            else:
+                nodes[node_id] = BenchFwdN(node_id)
+                links[node_id] = {}
+            links[prev][port] = PortID(node_id, 0)
+            prev, port = node_id, 0
+
+    return nodes, links
+
+
+def run(selector: type,
+        size: int,
+        packets: int,
+        budget: int) -> tuple[int, float]:
+    """
+    Returns:
+        nr_nodes, us_per_hop: Graph size and time per processed packet
+    """
+    nodes, links = build(size, packets)
+    pp = PacketProcessor(nodes, links)
+
+    hops = 0
+    start = time.perf_counter()
+    ps = selector(pp, budget)
+    while not ps.is_finished():
+        ns = ps.select_next()
+        hops += ns.process_batch(budget)
+        ps.update(pp, ns)
+    duration = time.perf_counter() - start
+
+    delivered = sum(n.count for n in nodes.values()
+                    if isinstance(n, BenchSnkN))
+    assert delivered == packets * nodes[0].nr_outputs
+    return len(nodes), duration / hops * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('sizes', type=int, nargs='*',
+                        default=[10, 100, 1000])
+    parser.add_argument('-p', '--packets', type=int, default=200,
+                        help='Packets per source output')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='Runs per configuration, the best is reported')
+    parser.add_argument('-b', '--budget', type=int, nargs='+',
+                        default=[1, NodeSelector.DEFAULT_BUDGET],
+                        help='Packets a node may process per selection')
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        for budget in args.budget:
+            for selector in SELECTORS:
+                nr_nodes, us_per_hop = min(
+                    run(selector, size, args.packets, budget)
+                    for _ in range(args.repeat))
+                print(f'{nr_nodes:5d} nodes, budget {budget:4d} '
+                      f'{selector.__name__:>16}: {us_per_hop:7.2f} us/hop')
+
+
+if __name__ == '__main__':
+    main()
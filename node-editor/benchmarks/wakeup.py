@@ -0,0 +1,91 @@
+"""
+Idle CPU and wakeup latency of sources fed from outside of the graph
+
+A feeder process sends a message every GAP ms over a pipe to a source node,
+like the socket runner does for NS3 Src. The source either reports to be
+ready all the time and polls the pipe (spin) or waits on it via
+RNode.waitable (wait). Reports the CPU time the processor burned and the
+latency from sending a message to processing it.
+
+Usage: python -m benchmarks.wakeup [-m MESSAGES] [-g GAP]
+"""
+import argparse
+import statistics
+import time
+from collections import deque
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import Connection
+
+from lowcaf.nodeeditor.portid import PortID
+from lowcaf.nodes.dummy import NullSnkN
+from lowcaf.nodes.ifaces.rnode import RNode
+from lowcaf.packetprocessing.nodeselector import TopoSelector
+from lowcaf.packetprocessing.packetprocessor import PacketProcessor
+
+
+class SpinSrcN(RNode):
+    def __init__(self, node_id: int, conn: Connection, messages: int):
+        super().__init__(node_id, 0, 1)
+        self.conn = conn
+        self.left = messages
+        self.latencies = []
+
+    def process(self, inputs: list[deque], outputs: list[list]):
+        if not self.conn.poll():
+            return
+        self.latencies.append(time.perf_counter_ns() - self.conn.recv())
+        self.left -= 1
+
+    def is_ready(self, inputs: list[deque]) -> bool:
+        return self.left > 0
+
+
+class WaitSrcN(SpinSrcN):
+    def is_ready(self, inputs: list[deque]) -> bool:
+        return self.left > 0 and self.conn.poll()
+
+    def waitable(self) -> list:
+        return [self.conn] if self.left > 0 else []
+
+
+def feed(conn: Connection, messages: int, gap: float):
+    for _ in range(messages):
+        time.sleep(gap)
+        conn.send(time.perf_counter_ns())
+
+
+def run(src_type: type, messages: int, gap: float) -> tuple[float, float]:
+    """
+    Returns:
+        cpu, latency: CPU time of the processor in % of the run and the
+        median latency in us
+    """
+    recv_conn, send_conn = Pipe(duplex=False)
+    src = src_type(0, recv_conn, messages)
+    pp = PacketProcessor({0: src, 1: NullSnkN(1)}, {0: {0: PortID(1, 0)}})
+
+    feeder = Process(target=feed, args=(send_conn, messages, gap))
+    feeder.start()
+    start, cpu_start = time.perf_counter(), time.process_time()
+    pp.run_until_idle(TopoSelector(pp))
+    duration = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    feeder.join()
+
+    return cpu / duration * 100, statistics.median(src.latencies) / 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-m', '--messages', type=int, default=200)
+    parser.add_argument('-g', '--gap', type=float, default=5,
+                        help='Time between messages in ms')
+    args = parser.parse_args()
+
+    for name, src_type in (('spin', SpinSrcN), ('wait', WaitSrcN)):
+        cpu, latency = run(src_type, args.messages, args.gap / 1e3)
+        print(f'{name}: {cpu:5.1f} % CPU, median latency {latency:7.1f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -219,6 +219,8 @@ class NodeEditor:
             node_mngr.cpy_node_id_dict())
         pp = PacketProcessor(node_d, links)
         pp.setup()
+        if dpg.get_value(self.fuse_item):
+            pp.compile()
 
         dpg.configure_item(go, user_data=(running, loader, txt, pp, go_nogo,
                                           teardown, runner))
@@ -491,6 +493,13 @@ class NodeEditor:
                         label='Check Nodes',
                         callback=self.check_nodes_cb,
                     )
+                    # fuse linear chains before running, see
+                    # PacketProcessor.compile
+                    self.fuse_item = dpg.add_menu_item(
+                        label='Fuse Node Chains',
+                        check=True,
+                        default_value=False
+                    )
                 with dpg.menu(label='Tabs'):
                     dpg.add_menu_item(
                         label='Reset Current Tab',
@@ -8,7 +8,7 @@ import dearpygui.dearpygui as dpg
 from lowcaf.nodeeditor.nodebuilder import NodeBuilder
 from lowcaf.nodes.ifaces.inode import INode
 from lowcaf.nodes.ifaces.rnode import RNode
-from lowcaf.packetprocessing.bbpacket import BBPacket
+from lowcaf.packetprocessing.bbpacket import BBPacket, META_T_DIFF
 
 
 class CompG(INode):
@@ -64,9 +64,9 @@ class CompN(RNode):
         pkt_a: BBPacket = inputs[0].popleft()
         pkt_b: BBPacket = inputs[1].popleft()
 
-        diff = pkt_b.scapy_pkt.time - pkt_a.scapy_pkt.time
-        pkt_a.metadata['t_diff'] = diff
-        pkt_b.metadata['t_diff'] = diff
+        diff = pkt_b.time - pkt_a.time
+        pkt_a.set_meta(META_T_DIFF, diff)
+        pkt_b.set_meta(META_T_DIFF, diff)
 
         outputs[0].append(pkt_a)
         outputs[1].append(pkt_b)
@@ -1,3 +1,4 @@
+import logging
 import math
 from abc import abstractmethod
 from collections import deque
@@ -10,6 +11,8 @@ from lowcaf.nodes.ifaces.inode import INode
 from lowcaf.nodes.ifaces.rnode import RNode
 from lowcaf.packetprocessing.bbpacket import BBPacket
 
+LOGGER = logging.getLogger(__name__)
+
 
 def get_current_dist(func, lin_space) -> (list, list):
     res = []
@@ -184,6 +187,7 @@ class DistG(INode):
 
 
 class DistN(RNode):
+    stateless = True
 
     def __init__(
             self,
@@ -207,16 +211,22 @@ class DistN(RNode):
             self,
             inputs: list[deque[BBPacket]],
             outputs: list[list[BBPacket]]):
-        pkt: BBPacket = inputs[0].popleft()
+        self._shift(inputs[0].popleft(), outputs)
 
+    def process_batch(
+            self,
+            inputs: list[deque[BBPacket]],
+            outputs: list[list[BBPacket]],
+            budget: int) -> int:
+        nr_pkts = min(budget, len(inputs[0]))
+        for _ in range(nr_pkts):
+            self._shift(inputs[0].popleft(), outputs)
+        return nr_pkts
+
+    def _shift(self, pkt: BBPacket, outputs: list[list[BBPacket]]):
         time_shift: float = self.dist.draw_sample()
-        print('-----------')
-        print(pkt.scapy_pkt.time)
-        print(time_shift)
-        pkt.scapy_pkt.time += max(time_shift, 0)
-        print(pkt.scapy_pkt.time)
-        print('-----------')
-        print(f'--Dist: forwarded Pkt {pkt}--')
+        pkt.time += max(time_shift, 0)
+        LOGGER.debug(f'Shifted packet by {time_shift} to {pkt.time}')
         outputs[0].append(pkt)
 
     def is_ready(self, inputs: list[deque]) -> bool:
@@ -4,7 +4,6 @@ from multiprocessing.connection import Connection
 from typing import Callable
 
 import dearpygui.dearpygui as dpg
-from scapy.layers.l2 import Ether
 
 from lowcaf.nodeeditor.nodebuilder import NodeBuilder
 from lowcaf.nodes.ifaces.inode import INode
@@ -76,17 +75,16 @@ class DummySrcN(RNode):
         )
 
     def process(self, inputs: list[deque], outputs: list[list]):
-        pkt = BBPacket(Ether(b'abcdefgh'), 0)
+        pkt = BBPacket.from_raw(b'abcdefgh', 0)
         self.ctr -= 1
 
         outputs[0].append(pkt)
 
     def is_ready(self, inputs: list[deque]) -> bool:
-        if self.ctr > 0:
-            return True
-        else:
-            self.ctr = self.nr_packets
-            return False
+        return self.ctr > 0
+
+    def setup(self, reg_socks: Callable[[str, int, int], Connection]):
+        self.ctr = self.nr_packets
 
 
 class NullSnkG(INode):
@@ -115,6 +113,7 @@ class NullSnkG(INode):
 
 
 class NullSnkN(RNode):
+    gui_bound = True
 
     def __init__(
             self,
@@ -141,6 +140,17 @@ class NullSnkN(RNode):
             val = dpg.get_value(self.inode.ctr)
             dpg.set_value(self.inode.ctr, val + 1)
 
+    def process_batch(self, inputs: list[deque], outputs: list[list],
+                      budget: int) -> int:
+        nr_pkts = min(budget, len(inputs[0]))
+        for _ in range(nr_pkts):
+            inputs[0].popleft()
+
+        if self.inode is not None:
+            val = dpg.get_value(self.inode.ctr)
+            dpg.set_value(self.inode.ctr, val + nr_pkts)
+        return nr_pkts
+
     def is_ready(self, inputs: list[deque]) -> bool:
         LOGGER.debug(f"Is NullSnk ready? {len(inputs[0]) >= 1}")
         return len(inputs[0]) >= 1
@@ -182,6 +192,8 @@ class CounterG(INode):
 
 
 class CounterN(RNode):
+    gui_bound = True
+
     def __init__(
             self,
             node_id: int,
@@ -214,6 +226,19 @@ class CounterN(RNode):
 
         outputs[0].append(pkt)
 
+    def process_batch(self,
+                      inputs: list[deque[BBPacket]],
+                      outputs: list[list[BBPacket]],
+                      budget: int) -> int:
+        nr_pkts = min(budget, len(inputs[0]))
+        for _ in range(nr_pkts):
+            outputs[0].append(inputs[0].popleft())
+
+        self.ctr += nr_pkts
+        if self.inode is not None:
+            dpg.set_value(self.inode.ctr, str(self.ctr))
+        return nr_pkts
+
     def is_ready(self, inputs: list[deque]) -> bool:
         return len(inputs[0]) >= 1
 
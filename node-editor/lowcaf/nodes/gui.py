@@ -59,6 +59,8 @@ class GuiG(INode):
 
 
 class GuiN(RNode):
+    gui_bound = True
+
     def __init__(
             self,
             node_id: int,
@@ -81,7 +83,7 @@ class GuiN(RNode):
         pkt: BBPacket = inputs[0].popleft()
 
         if self.inode is not None:
-            self.inode.update({'pkts': len(pkt.scapy_pkt)})
+            self.inode.update({'pkts': len(pkt)})
 
     def is_ready(self, inputs: list[deque]) -> bool:
         return len(inputs[0]) >= 1
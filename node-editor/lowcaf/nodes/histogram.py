@@ -75,6 +75,8 @@ class HistogramG(INode):
 
 
 class HistogramN(RNode):
+    gui_bound = True
+
     def __init__(
             self,
             node_id: int,
@@ -96,9 +98,19 @@ class HistogramN(RNode):
     def process(self, inputs: list[deque], outputs: list[list]):
         pkt: BBPacket = inputs[0].popleft()
         if self.inode is not None:
-            self.inode.update({'bytes': len(pkt.scapy_pkt)})
+            self.inode.update({'bytes': len(pkt)})
         outputs[0].append(pkt)
 
+    def process_batch(self, inputs: list[deque], outputs: list[list],
+                      budget: int) -> int:
+        nr_pkts = min(budget, len(inputs[0]))
+        for _ in range(nr_pkts):
+            pkt: BBPacket = inputs[0].popleft()
+            if self.inode is not None:
+                self.inode.update({'bytes': len(pkt)})
+            outputs[0].append(pkt)
+        return nr_pkts
+
     def is_ready(self, inputs: list[deque]) -> bool:
         return len(inputs[0]) >= 1
 
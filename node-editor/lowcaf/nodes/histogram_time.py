@@ -13,7 +13,8 @@ import dearpygui.dearpygui as dpg
 
 from lowcaf.nodeeditor.nodebuilder import NodeBuilder
 from lowcaf.nodes.ifaces.inode import INode
-from lowcaf.packetprocessing.bbpacket import BBPacket
+from lowcaf.packetprocessing.bbpacket import BBPacket, META_T_DIFF, \
+    META_LORA_TAP
 from lowcaf.nodes.ifaces.rnode import RNode
 
 
@@ -137,6 +138,8 @@ def compute_time_on_air(
 
 
 class HistTimeN(RNode):
+    gui_bound = True
+
     def __init__(
             self,
             node_id: int,
@@ -159,17 +162,17 @@ class HistTimeN(RNode):
     def process(self, inputs: list[deque], outputs: list[list]):
         pkt: BBPacket = inputs[0].popleft()
 
-        time_to_nxt: float = pkt.metadata['t_diff']
+        time_to_nxt: float = pkt.metadata[META_T_DIFF]
         if self.inode is not None:
             self.inode.update({'inter_pkt_time': time_to_nxt})
 
-        lora_meta = pkt.metadata['lora_tap']
+        lora_meta = pkt.metadata[META_LORA_TAP]
         time_on_air = compute_time_on_air(
             lora_meta['spreading_factor'],
             lora_meta['bandwidth'],
             8,
             True,
-            len(pkt.scapy_pkt),
+            len(pkt),
             lora_meta['bandwidth'] == 125000 and lora_meta[
                 'spreading_factor'] > 10,
             lora_meta['coding_rate']
@@ -3,7 +3,7 @@ from abc import ABC, abstractmethod
 
 from lowcaf.nodes.jgf.jedge import JEdge
 from lowcaf.nodes.jgf.jfgkeys import JEDGE_REL_ATTR_NODE, JEDGE_REL_NODE_ATTR, \
-    JNODE_ATTR_ID
+    JNODE_ATTR_ID, JNODE_STAGE, JNODE_COST
 from lowcaf.nodes.jgf.jnode import JNode
 
 
@@ -24,6 +24,13 @@ class INode(ABC):
         self.inputs: list[int] = inputs
         self.outputs: list[int] = outputs
 
+        # placement hint for pipelined execution: 0 is the main process,
+        # other values are worker processes, None lets lowcaf decide
+        self.stage: int | None = None
+        # processing time per packet in ns measured during the last run,
+        # used to balance the stages
+        self.cost: float | None = None
+
         # bind right click menu for nodes
         dpg.bind_item_handler_registry(self.dpg_id, 'node_handler')
 
@@ -37,6 +44,15 @@ class INode(ABC):
                 callback=self._delete_cb
             )
             dpg.add_separator()
+            self._stage_input = dpg.add_input_int(
+                label="Stage (-1: auto)",
+                default_value=-1,
+                min_value=-1,
+                min_clamped=True,
+                width=100,
+                callback=self._stage_cb
+            )
+            dpg.add_separator()
             dpg.add_button(label="Cancel",
                            callback=self._hide_right_click_cb)
 
@@ -62,6 +78,9 @@ class INode(ABC):
 
         userdata(self.dpg_id)
 
+    def _stage_cb(self, sender, stage):
+        self.stage = stage if stage >= 0 else None
+
     def _hide_right_click_cb(self):
         dpg.configure_item(self._right_click, show=False)
 
@@ -120,8 +139,14 @@ class INode(ABC):
         return {}
 
     def _to_jgf(self) -> tuple[JNode, list[JNode], list[JNode]]:
+        metadata = self._add_meta_data()
+        if self.stage is not None:
+            metadata[JNODE_STAGE] = self.stage
+        if self.cost is not None:
+            metadata[JNODE_COST] = self.cost
+
         main = JNode(self.node_id, self.disp_name(), self.type_name(),
-                     dpg.get_item_pos(self.dpg_id), self._add_meta_data())
+                     dpg.get_item_pos(self.dpg_id), metadata)
 
         in_attrs = []
         for idx, att in enumerate(self.inputs):
@@ -195,6 +220,11 @@ class INode(ABC):
 
         self._from_jgf(node.add_metadata, in_attrs, out_attrs)
 
+        self.stage = node.add_metadata.get(JNODE_STAGE)
+        self.cost = node.add_metadata.get(JNODE_COST)
+        if self.stage is not None:
+            dpg.set_value(self._stage_input, self.stage)
+
         print(self.disp_name())
         print(in_attrs)
         for idx, in_attr in enumerate(in_attrs):
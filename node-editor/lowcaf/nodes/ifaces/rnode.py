@@ -15,6 +15,20 @@ class RNode:
     If a node is only used for external processing then an INode is sufficient
     """
 
+    # Whether PacketProcessor.compile may run this node inline together with
+    # its neighbours. Nodes must only opt out if their behaviour depends on
+    # being scheduled individually.
+    fusable: bool = True
+
+    # Whether the node updates the GUI while processing and must therefore
+    # stay in the main process when the graph is split into stages
+    gui_bound: bool = False
+
+    # Whether the output for a packet does not depend on the packets before,
+    # so replicas of the node may process disjoint parts of the stream, see
+    # PacketProcessor.shard
+    stateless: bool = False
+
     def __init__(
             self,
             own_id: int,
@@ -33,6 +47,10 @@ class RNode:
         assert isinstance(inode, INode | None)
         self.inode: INode | None = inode
 
+        # see INode.stage and INode.cost
+        self.stage: int | None = inode.stage if inode is not None else None
+        self.cost: float | None = inode.cost if inode is not None else None
+
 
     @abstractmethod
     def process(
@@ -48,6 +66,30 @@ class RNode:
         """
         raise NotImplementedError
 
+    def process_batch(
+            self,
+            inputs: list[deque[BBPacket]],
+            outputs: list[list[BBPacket]],
+            budget: int) -> int:
+        """
+        Process up to budget packets in one invocation. By default this calls
+        process as long as the node is ready. Nodes may override this to
+        drain their inputs more efficiently.
+
+        Args:
+            inputs: A list corresponding to the inputs
+            outputs: The list of outputs
+            budget: Maximum number of process steps to perform
+
+        Returns:
+            The number of process steps performed
+        """
+        done = 0
+        while done < budget and self.is_ready(inputs):
+            self.process(inputs, outputs)
+            done += 1
+        return done
+
     @abstractmethod
     def is_ready(
             self,
@@ -57,6 +99,41 @@ class RNode:
         """
         raise NotImplementedError
 
+    def waitable(self) -> list:
+        """
+        Objects the node waits on while it has nothing to process, e.g., the
+        pipe of a socket. Anything multiprocessing.connection.wait accepts
+        can be returned. The processor keeps running and blocks on these
+        objects while no node is ready, instead of the node reporting to be
+        ready and polling. Once an object becomes ready, is_ready is checked
+        again.
+
+        Returns:
+            The objects, an empty list once the node is finished or if it
+            only depends on its inputs
+        """
+        return []
+
+    def horizon(self) -> int | None:
+        """
+        Time synchronization with the simulation, see HorizonMsg. Nodes
+        emitting packets of the simulation return the simulation time in ns
+        before which they emitted everything they will ever emit.
+
+        Returns:
+            The horizon, None if the node does not emit packets of the
+            simulation (anymore)
+        """
+        return None
+
+    def grant(self, horizon: int):
+        """
+        Time synchronization with the simulation, see HorizonMsg. Called on
+        every node once no packet for the simulation before horizon (in ns)
+        will follow. Nodes sending packets to the simulation pass it on.
+        """
+        pass
+
     def setup(self, reg_socks: Callable[[str, int, int], Connection]):
         """
         This method is called once prior to simulation start. Nodes may use
@@ -4,6 +4,8 @@ JNODE_ID = 'id'                       # ID of the node
 JNODE_TYPE = 'type'                   # Type of the node
 JNODE_POSITION = 'position'           # Position of this node in the editor
 JNODE_ADD_METADATA = 'node_metadata'  # Additional node specific metadata
+JNODE_STAGE = 'stage'                 # Process the node runs in, see INode
+JNODE_COST = 'cost'                   # Measured ns per packet of the node
 
 JNODE_ATTR_TYPE = 'attr'
 JNODE_ATTR_ID = 'attr_id'             # Unique identifier for an attr per Node
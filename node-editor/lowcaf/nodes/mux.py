@@ -7,7 +7,6 @@ so on until all outputs have received a packet. Then it starts again from
 the beginning. The multiplexer does the same thing. It will first take a
 packet from the first input, then from the second and so on.
 """
-import copy
 from collections import deque
 from typing import Literal
 
@@ -137,7 +136,7 @@ class DeMuxN(RNode):
                 self.active_output = (self.active_output + 1) % self.nr_outputs
             case 'Duplicate':
                 for output in outputs:
-                    output.append(copy.deepcopy(pkt))
+                    output.append(pkt.clone())
             case _:
                 raise ValueError(f'Invalid mode: {self.mode}')
 
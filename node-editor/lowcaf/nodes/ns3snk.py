@@ -10,6 +10,7 @@ from lowcaf.nodeeditor.nodebuilder import NodeBuilder
 from lowcaf.nodes.ifaces.inode import INode
 from lowcaf.nodes.ifaces.rnode import RNode
 from lowcaf.nodes.jgf.jnode import JNode
+from lowcaf.packetprocessing.bbpacket import HorizonMsg
 
 LOGGER = logging.getLogger(__name__)
 
@@ -45,6 +46,16 @@ class NS3SnkG(INode):
                             min_clamped=True,
                             max_clamped=True,
                         )
+                        self.tcp_nodelay = dpg.add_checkbox(
+                            label='TCP_NODELAY',
+                            default_value=False,
+                        )
+                        self.snd_buf = dpg.add_input_int(
+                            label='Send Buffer (0: OS default)',
+                            default_value=0,
+                            min_value=0,
+                            min_clamped=True,
+                        )
 
         super().__init__(node_id, _id, _staging_container_id,
                          [self.in_attr], [])
@@ -62,7 +73,9 @@ class NS3SnkG(INode):
         if idx == 0:
             return {
                 'ip': dpg.get_value(self.address),
-                'port': dpg.get_value(self.port)
+                'port': dpg.get_value(self.port),
+                'tcp_nodelay': dpg.get_value(self.tcp_nodelay),
+                'snd_buf': dpg.get_value(self.snd_buf),
             }
         else:
             raise ValueError(f'{self.disp_name()} has only one input')
@@ -74,6 +87,8 @@ class NS3SnkG(INode):
         attr = in_attrs[0].add_metadata
         dpg.set_value(self.address, attr['ip'])
         dpg.set_value(self.port, attr['port'])
+        dpg.set_value(self.tcp_nodelay, attr.get('tcp_nodelay', False))
+        dpg.set_value(self.snd_buf, attr.get('snd_buf', 0))
 
     def set_addr_port(self, address: str, port: int):
         ip = list(socket.inet_aton(address))
@@ -92,7 +107,20 @@ class NS3SnkN(RNode):
             address: str,
             port: int,
             inode: NS3SnkG | None = None,
+            tcp_nodelay: bool = False,
+            snd_buf: int | None = None,
     ):
+        """
+        Args:
+            node_id: ID of this node
+            address: Address the socket listens on
+            port: Port the socket listens on
+            inode: The GUI representation of this node
+            tcp_nodelay: Set TCP_NODELAY on the connection to ns-3, False
+                keeps Nagle's algorithm of the OS default
+            snd_buf: SO_SNDBUF of the connection to ns-3, None keeps the
+                default of the OS
+        """
         super().__init__(node_id, 1, 0, inode)
 
         assert isinstance(inode, NS3SnkG | None)
@@ -103,6 +131,8 @@ class NS3SnkN(RNode):
 
         self.address: str = address
         self.port: int = port
+        self.tcp_nodelay: bool = tcp_nodelay
+        self.snd_buf: int | None = snd_buf
 
         self.conn: Optional[Connection] = None
         self.ready: bool = False
@@ -114,7 +144,9 @@ class NS3SnkN(RNode):
             inode.node_id,
             inode.int4_to_ip(),
             dpg.get_value(inode.port),
-            inode
+            inode,
+            dpg.get_value(inode.tcp_nodelay),
+            dpg.get_value(inode.snd_buf) or None
         )
 
     def process(self, inputs: list[deque], outputs: list[list]):
@@ -126,12 +158,31 @@ class NS3SnkN(RNode):
     def is_ready(self, inputs: list[deque]) -> bool:
         return len(inputs[0]) >= 1
 
+    def grant(self, horizon: int):
+        # queued behind the packets sent so far
+        if self.ready:
+            self.conn.send(HorizonMsg(horizon))
+
     def setup(self, reg_socks: Callable[[str, int, int], Connection]):
         self.conn = reg_socks(
             self.address,
             self.port,
-            self.id)
+            self.id,
+            sock_opts=self.sock_opts(),
+            receives=False)
         self.ready = True
 
+    def sock_opts(self) -> dict[tuple[int, int], int]:
+        """
+        The socket options this sink requests for the connection to ns-3
+        """
+        opts = {}
+        if self.tcp_nodelay:
+            opts[(socket.IPPROTO_TCP, socket.TCP_NODELAY)] = 1
+        if self.snd_buf is not None:
+            opts[(socket.SOL_SOCKET, socket.SO_SNDBUF)] = self.snd_buf
+
+        return opts
+
 
 NodeBuilder.register_node(NS3SnkG, NS3SnkN)
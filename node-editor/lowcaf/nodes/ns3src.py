@@ -9,7 +9,7 @@ from lowcaf.nodeeditor.nodebuilder import NodeBuilder
 from lowcaf.nodes.ifaces.inode import INode
 from lowcaf.nodes.ifaces.rnode import RNode
 from lowcaf.nodes.jgf.jnode import JNode
-from lowcaf.packetprocessing.bbpacket import BBPacket, EODMsg
+from lowcaf.packetprocessing.bbpacket import BBPacket, EODMsg, HorizonMsg
 
 
 class NS3SrcG(INode):
@@ -91,8 +91,18 @@ class NS3SrcN(RNode):
             node_id: int,
             address: str,
             port: int,
-            inode: NS3SrcG | None = None
+            inode: NS3SrcG | None = None,
+            read_size: int | None = None
     ):
+        """
+        Args:
+            node_id: ID of this node
+            address: Address the socket listens on
+            port: Port the socket listens on
+            inode: The GUI representation of this node
+            read_size: Bytes read per syscall from the socket. None uses the
+                default of BBSocket
+        """
         super().__init__(node_id, 0, 1, inode)
 
         assert isinstance(inode, NS3SrcG | None)
@@ -103,9 +113,12 @@ class NS3SrcN(RNode):
 
         self.address: str = address
         self.port: int = port
+        self.read_size: int | None = read_size
 
         self.conn: Optional[Connection] = None
         self.ready: bool = False
+        # ns-3 sends no packet before this simulation time, see HorizonMsg
+        self._horizon: int = 0
 
     @staticmethod
     def create_from_inode(inode: NS3SrcG) -> 'RNode':
@@ -121,17 +134,25 @@ class NS3SrcN(RNode):
         """
         A lowcaf has no inputs and thus we don't use them.
         """
-        if not self.conn.poll():
-            # Because we always signal ready to not stop the simulation, there
-            # is the possibility that NS3 has not yet made scapy_pkt available to us
-            # alternatively we could differentiate between being really
-            # ready and just not having scapy_pkt at the moment
-            return
-
-        ret = self.conn.recv()
+        self._handle(self.conn.recv(), outputs)
+
+    def process_batch(self, inputs: list[deque], outputs: list[list],
+                      budget: int) -> int:
+        """
+        Takes everything the socket runner has queued, up to budget packets.
+        """
+        done = 0
+        while done < budget and self.ready and self.conn.poll():
+            self._handle(self.conn.recv(), outputs)
+            done += 1
+        return done
+
+    def _handle(self, ret, outputs: list[list]):
         if isinstance(ret, EODMsg):
             print('Node State changed')
             self.ready = False
+        elif isinstance(ret, HorizonMsg):
+            self._horizon = max(self._horizon, ret.time_ns)
         elif isinstance(ret, BBPacket):
 
             pkt = ret
@@ -143,13 +164,21 @@ class NS3SrcN(RNode):
                 f'Type {type(ret)} is unsupported: {ret}')
 
     def is_ready(self, inputs: list[deque]) -> bool:
-        return self.ready
+        # while NS3 is idle the processor waits on the pipe, see waitable
+        return self.ready and self.conn.poll()
+
+    def waitable(self) -> list:
+        return [self.conn] if self.ready else []
+
+    def horizon(self) -> int | None:
+        return self._horizon if self.ready else None
 
     def setup(self, reg_socks: Callable[[str, int, int], Connection]):
         self.conn = reg_socks(
             self.address,
             self.port,
-            self.id)
+            self.id,
+            read_size=self.read_size)
         self.ready = True
 
 
@@ -1,19 +1,144 @@
+import heapq
+import itertools
+import os
+import struct
 from multiprocessing.connection import Connection
+from typing import Iterable
+
+import numpy as np
 
 import dearpygui.dearpygui as dpg
 from scapy.all import *
-from scapy.contrib.loraphy2wan import PHYPayload
 
 from lowcaf.nodeeditor.nodebuilder import NodeBuilder
 from lowcaf.nodes.ifaces.inode import INode
-from lowcaf.packetprocessing.bbpacket import BBPacket
+from lowcaf.packetprocessing.bbpacket import BBPacket, LINKTYPE_LORATAP, \
+    DECODE_LORA_PHY, META_LORA_TAP, META_SOURCE_FILE, LoRaTapMeta
 from lowcaf.nodes.ifaces.rnode import RNode
 from lowcaf.nodes.jgf.jnode import JNode
+from lowcaf.util.pcapindex import load_index, partition, read_entries, \
+    select_time
+from lowcaf.util.pcapreader import RawReader, Record
+from lowcaf.util.pcapwriter import RawWriter
+from lowcaf.util.prefetch import Prefetcher, WORKERS, WORKER_NONE
 
 dpg.create_context()
 
 LOGGER = logging.getLogger(__name__)
 
+# packets per chunk read from the file
+CHUNK_SIZE: int = 256
+# packets read ahead by default, see Prefetcher
+PREFETCH_DEPTH: int = 16 * CHUNK_SIZE
+
+# files selectable for a merge in the GUI
+MERGE_MAX_FILES: int = 256
+# packets read ahead of every merged file by default
+MERGE_PREFETCH_DEPTH: int = 4 * CHUNK_SIZE
+
+# frequency, bandwidth in 125 kHz steps, spreading factor and coding rate of
+# the fixed size LoRaTap v1 header
+LORATAP_HEADER: struct.Struct = struct.Struct('>4xIBB18xB6x')
+
+
+def split_loratap(data: memoryview | bytes) -> tuple[memoryview | bytes,
+                                                     dict]:
+    """
+    LoRaTap is not implemented in Scapy, so its header is turned into
+    metadata
+
+    Args:
+        data: A packet of link type LINKTYPE_LORATAP
+
+    Returns:
+        payload, metadata: The LoRa PHY payload behind the header and the
+        metadata holding the header
+    """
+    frequency, bandwidth, spreading_factor, coding_rate = \
+        LORATAP_HEADER.unpack_from(data)
+    return data[LORATAP_HEADER.size:], {
+        META_LORA_TAP: LoRaTapMeta(
+            frequency=frequency,
+            bandwidth=bandwidth * 125000,
+            spreading_factor=spreading_factor,
+            coding_rate=coding_rate
+        )
+    }
+
+
+def join_loratap(payload: memoryview | bytes,
+                 meta: LoRaTapMeta | None) -> bytes:
+    """
+    Inverse of split_loratap, the fields not kept in the metadata are zero
+
+    Args:
+        payload: A LoRa PHY payload
+        meta: The LoRaTap metadata of the packet, zero channel fields if None
+
+    Returns:
+        The packet of link type LINKTYPE_LORATAP
+    """
+    header = bytearray(LORATAP_HEADER.size)
+    if meta is not None:
+        LORATAP_HEADER.pack_into(header, 0,
+                                 meta['frequency'],
+                                 meta['bandwidth'] // 125000,
+                                 meta['spreading_factor'],
+                                 meta['coding_rate'])
+    # version 1 and the length of the header
+    header[0] = 1
+    header[2:4] = LORATAP_HEADER.size.to_bytes(2, 'big')
+    return bytes(header) + payload
+
+
+def read_pcap(file_path: str,
+              chunk_size: int = CHUNK_SIZE,
+              entries: np.ndarray | None = None) -> Iterator[list[BBPacket]]:
+    """
+    Read a capture without dissecting the packets
+
+    Args:
+        file_path: See RawReader
+        chunk_size: Maximum number of packets per chunk
+        entries: Entries of the index of the capture to read, see
+            load_index, all records if None
+
+    Returns:
+        The packets in chunks
+    """
+    with RawReader(file_path) as reader:
+        if entries is None:
+            while records := reader.read(chunk_size):
+                yield _to_packets(records)
+        else:
+            for start in range(0, len(entries), chunk_size):
+                yield _to_packets(read_entries(
+                    reader, entries[start:start + chunk_size]))
+
+
+def _to_packets(records: Iterable[Record]) -> list[BBPacket]:
+    pkts = []
+    for data, time_ns, linktype in records:
+        meta = None
+        if linktype == LINKTYPE_LORATAP:
+            data, meta = split_loratap(data)
+            linktype = DECODE_LORA_PHY
+
+        pkts.append(BBPacket.from_raw(
+            data,
+            0,
+            linktype,
+            time_ns,
+            metadata=meta
+        ))
+    return pkts
+
+
+def _to_ns(seconds: float) -> int | None:
+    # 0 leaves the time unbounded
+    return round(seconds * 1_000_000_000) if seconds else None
+
+
 def cancel():
     pass
 
@@ -51,6 +176,40 @@ class PcapSourceG(INode):
                     self.text = dpg.add_button(
                         label="Select a file",
                         callback=lambda: dpg.show_item(self.f_dialog))
+                    self.prefetch = dpg.add_combo(
+                        list(WORKERS),
+                        label='Read-ahead',
+                        default_value=WORKER_NONE,
+                        width=100,
+                    )
+                    self.prefetch_depth = dpg.add_input_int(
+                        label='Prefetch Depth',
+                        default_value=PREFETCH_DEPTH,
+                        min_value=1,
+                        min_clamped=True,
+                        width=100,
+                    )
+                    self.partitions = dpg.add_input_int(
+                        label='Partitions',
+                        default_value=1,
+                        min_value=1,
+                        min_clamped=True,
+                        width=100,
+                    )
+                    self.start_time = dpg.add_input_double(
+                        label='Start [s since epoch] (0: file start)',
+                        default_value=0,
+                        min_value=0,
+                        min_clamped=True,
+                        width=100,
+                    )
+                    self.end_time = dpg.add_input_double(
+                        label='End [s since epoch] (0: file end)',
+                        default_value=0,
+                        min_value=0,
+                        min_clamped=True,
+                        width=100,
+                    )
 
         super().__init__(
             node_id, _id, _staging_container_id, [], [self.att1])
@@ -68,7 +227,12 @@ class PcapSourceG(INode):
         if idx == 0:
             return {
                 'text': dpg.get_item_label(self.text),
-                'file_path': self.file_path
+                'file_path': self.file_path,
+                'prefetch': dpg.get_value(self.prefetch),
+                'prefetch_depth': dpg.get_value(self.prefetch_depth),
+                'partitions': dpg.get_value(self.partitions),
+                'start_time': dpg.get_value(self.start_time),
+                'end_time': dpg.get_value(self.end_time),
             }
         else:
             raise ValueError(f'{self.disp_name()} has only one input')
@@ -80,6 +244,13 @@ class PcapSourceG(INode):
         out = out_attrs[0]
         dpg.set_item_label(self.text, out.add_metadata['text'])
         self.file_path = out.add_metadata['file_path']
+        dpg.set_value(self.prefetch,
+                      out.add_metadata.get('prefetch', WORKER_NONE))
+        dpg.set_value(self.prefetch_depth,
+                      out.add_metadata.get('prefetch_depth', PREFETCH_DEPTH))
+        dpg.set_value(self.partitions, out.add_metadata.get('partitions', 1))
+        dpg.set_value(self.start_time, out.add_metadata.get('start_time', 0))
+        dpg.set_value(self.end_time, out.add_metadata.get('end_time', 0))
 
 
 class PcapSourceN(RNode):
@@ -87,16 +258,48 @@ class PcapSourceN(RNode):
             self,
             node_id: int,
             file_path: str,
-            inode: PcapSourceG | None = None
+            inode: PcapSourceG | None = None,
+            prefetch: str = WORKER_NONE,
+            prefetch_depth: int = PREFETCH_DEPTH,
+            start_ns: int | None = None,
+            end_ns: int | None = None,
+            partitions: int = 1
     ):
+        """
+        Args:
+            node_id: ID of this node
+            file_path: The pcap or pcapng file to read
+            inode: The GUI representation of this node
+            prefetch: Worker reading ahead, one of WORKERS, see Prefetcher
+            prefetch_depth: Packets read ahead by each worker
+            start_ns: Only emit packets captured at or after this time
+            end_ns: Only emit packets captured before this time
+            partitions: Number of parts of the capture that are read ahead
+                in parallel, by one worker each. The packets are emitted in
+                the order of the file nevertheless.
+
+        Time windows and partitions use the sidecar index of the capture, see
+        load_index.
+        """
         assert isinstance(inode, PcapSourceG | None)
         super().__init__(node_id, 0, 1, inode)
 
         self.inode: PcapSourceG | None = inode
 
         assert isinstance(file_path, str)
+        assert prefetch in WORKERS
         self.file_path: str = file_path
-        self.reader: PcapReader | None = None
+        self.prefetch: str = prefetch
+        self.prefetch_depth: int = prefetch_depth
+        self.start_ns: int | None = start_ns
+        self.end_ns: int | None = end_ns
+        assert partitions >= 1
+        self.partitions: int = partitions
+
+        # chunks are read by prefetchers, one per partition, if there are any
+        self.prefetchers: deque[Prefetcher] = deque()
+        self._chunks: Iterator[list[BBPacket]] | None = None
+        self._pending: deque[BBPacket] = deque()
         self._ready = False
 
     @staticmethod
@@ -105,65 +308,341 @@ class PcapSourceN(RNode):
         return PcapSourceN(
             inode.node_id,
             inode.file_path,
-            inode
+            inode,
+            dpg.get_value(inode.prefetch),
+            dpg.get_value(inode.prefetch_depth),
+            _to_ns(dpg.get_value(inode.start_time)),
+            _to_ns(dpg.get_value(inode.end_time)),
+            dpg.get_value(inode.partitions)
         )
 
     def process(self, inputs: list[deque], outputs: list[list]):
-        try:
-            LOGGER.debug("Read a packet")
-
-            meta = {}
-            pkt = self.reader.read_packet()
-
-            if self.reader.linktype == 270:
-                # LoRaTap is not implemented in Scapy
-                pcap_bytes = raw(pkt)
-
-                tap = pcap_bytes[:35]
-                frequency = int.from_bytes(tap[4:8], 'big')
-                bandwidth = int.from_bytes(tap[8:9], 'big') * 125000
-                spread_f = int.from_bytes(tap[9:10], 'big')
-                coding_rate = int.from_bytes(tap[28:29], 'big')
-
-                phy = pcap_bytes[35:]
-
-                # save ts
-                ts = pkt.time
-
-                pkt = PHYPayload(phy)
-                pkt.time = ts
-
-                meta = {
-                    'lora_tap': {
-                        'frequency': frequency,
-                        'bandwidth': bandwidth,
-                        'spreading_factor': spread_f,
-                        'coding_rate': coding_rate
-                    }
-                }
-
-            outputs[0].append(BBPacket(
-                pkt,
-                0,
-                metadata=meta
-            ))
-        except EOFError:
+        self.process_batch(inputs, outputs, 1)
+
+    def process_batch(
+            self,
+            inputs: list[deque[BBPacket]],
+            outputs: list[list[BBPacket]],
+            budget: int) -> int:
+        out = outputs[0]
+        done = 0
+        while done < budget and self._fill():
+            nr_pkts = min(budget - done, len(self._pending))
+            for _ in range(nr_pkts):
+                out.append(self._pending.popleft())
+            done += nr_pkts
+        return done
+
+    def _fill(self) -> bool:
+        """
+        Take the next chunk if no packets are pending
+
+        Returns:
+            Whether packets are pending
+        """
+        if self._pending or not self._ready:
+            return bool(self._pending)
+
+        if self._chunks is not None:
+            chunk = next(self._chunks, None)
+            self._ready = chunk is not None
+        else:
+            chunk = self.prefetchers[0].get()
+            while self.prefetchers and self.prefetchers[0].done:
+                # continue with the next partition
+                self.prefetchers.popleft().close()
+                if chunk is None and self.prefetchers:
+                    chunk = self.prefetchers[0].get()
+            self._ready = bool(self.prefetchers)
+
+        if not self._ready:
             LOGGER.info("PCAP is empty")
-            self.reader.__exit__(None, None, None)
-            self._ready = False
+        if chunk:
+            self._pending.extend(chunk)
+        return bool(self._pending)
 
     def is_ready(self, inputs: list[deque]) -> bool:
-        return self._ready
+        return self._fill()
+
+    def waitable(self) -> list:
+        # while the prefetcher is behind the processor waits on it
+        if not self.prefetchers or self._pending:
+            return []
+        return self.prefetchers[0].waitable()
 
     def setup(self, reg_socks: Callable[[str, int, int], Connection]):
-        try:
-            LOGGER.debug(f'Using path: {self.file_path}')
-            self.reader: PcapReader = PcapReader(self.file_path).__enter__()
-            self._ready = True
-        except TypeError as err:
+        if self.file_path is None:
             raise RuntimeError(
-                f'PCAP Source {self.id} has no file configured'
-            ) from err
+                f'PCAP Source {self.id} has no file configured')
+
+        LOGGER.debug(f'Using path: {self.file_path}')
+        parts = [None]
+        if self.start_ns is not None or self.end_ns is not None or \
+                self.partitions > 1:
+            entries = select_time(
+                load_index(self.file_path), self.start_ns, self.end_ns)
+            LOGGER.info(f'Reading {len(entries)} packets in '
+                        f'{self.partitions} partitions')
+            parts = partition(entries, self.partitions)
+
+        # packets are only dissected if a node asks for them
+        if self.prefetch == WORKER_NONE:
+            self._chunks = itertools.chain.from_iterable(
+                read_pcap(self.file_path, CHUNK_SIZE, part) for part in parts)
+        else:
+            for idx, part in enumerate(parts):
+                prefetcher = Prefetcher(
+                    read_pcap,
+                    (self.file_path, CHUNK_SIZE, part),
+                    -(-self.prefetch_depth // CHUNK_SIZE),
+                    self.prefetch,
+                    f'{type(self).__name__}({self.id}) part {idx}')
+                prefetcher.start()
+                self.prefetchers.append(prefetcher)
+        self._ready = True
+
+    def teardown(self):
+        while self.prefetchers:
+            self.prefetchers.popleft().close()
+        self._chunks = None
+
+
+class PcapMergeG(INode):
+
+    def __init__(
+            self,
+            node_id: int,
+    ):
+        self.file_paths: list[str] = []
+
+        # todo: see PcapSourceG
+        with dpg.file_dialog(
+                directory_selector=False,
+                show=False,
+                callback=self.callback,
+                cancel_callback=cancel,
+                file_count=MERGE_MAX_FILES,
+                height=400,
+                width=600,
+        ) as f_dialog:
+            dpg.add_file_extension(".*")
+            self.f_dialog = f_dialog
+
+        with dpg.stage() as _staging_container_id:
+            with dpg.node(label="Pcap Merge", show=False) as _id:
+                with dpg.node_attribute(
+                        label="Node A2",
+                        attribute_type=dpg.mvNode_Attr_Output) as self.att1:
+                    self.text = dpg.add_button(
+                        label="Select files",
+                        callback=lambda: dpg.show_item(self.f_dialog))
+                    self.prefetch = dpg.add_combo(
+                        list(WORKERS),
+                        label='Read-ahead',
+                        default_value=WORKER_NONE,
+                        width=100,
+                    )
+                    self.prefetch_depth = dpg.add_input_int(
+                        label='Prefetch Depth',
+                        default_value=MERGE_PREFETCH_DEPTH,
+                        min_value=1,
+                        min_clamped=True,
+                        width=100,
+                    )
+
+        super().__init__(
+            node_id, _id, _staging_container_id, [], [self.att1])
+
+    @staticmethod
+    def disp_name():
+        return 'Pcap Merge'
+
+    def callback(self, sender, app_data):
+        self.file_paths = sorted(app_data['selections'].values())
+        dpg.set_item_label(self.text, self._label())
+
+    def _label(self) -> str:
+        return ', '.join(os.path.basename(path) for path in self.file_paths)
+
+    def _add_meta_data_out_attr(self, idx: int) -> dict | None:
+        if idx == 0:
+            return {
+                'file_paths': self.file_paths,
+                'prefetch': dpg.get_value(self.prefetch),
+                'prefetch_depth': dpg.get_value(self.prefetch_depth),
+            }
+        else:
+            raise ValueError(f'{self.disp_name()} has only one input')
+
+    def _from_jgf(self,
+                  metadata: dict,
+                  in_attrs: list[JNode],
+                  out_attrs: list[JNode]):
+        out = out_attrs[0]
+        self.file_paths = out.add_metadata['file_paths']
+        dpg.set_item_label(self.text, self._label())
+        dpg.set_value(self.prefetch,
+                      out.add_metadata.get('prefetch', WORKER_NONE))
+        dpg.set_value(self.prefetch_depth,
+                      out.add_metadata.get('prefetch_depth',
+                                           MERGE_PREFETCH_DEPTH))
+
+
+class PcapMergeN(RNode):
+    """
+    Emits the packets of several captures ordered by their capture time,
+    like mergecap. Every file is read in chunks, so only the current chunk
+    of each file is in memory. The merge is stable, packets with the same
+    time are emitted in the order of the files. Each packet carries the
+    path of its file as META_SOURCE_FILE.
+    """
+
+    def __init__(
+            self,
+            node_id: int,
+            file_paths: list[str],
+            inode: PcapMergeG | None = None,
+            prefetch: str = WORKER_NONE,
+            prefetch_depth: int = MERGE_PREFETCH_DEPTH
+    ):
+        """
+        Args:
+            node_id: ID of this node
+            file_paths: The pcap or pcapng files to merge
+            inode: The GUI representation of this node
+            prefetch: Worker reading ahead, one per file, see PcapSourceN
+            prefetch_depth: Packets read ahead of each file
+        """
+        assert isinstance(inode, PcapMergeG | None)
+        super().__init__(node_id, 0, 1, inode)
+
+        self.inode: PcapMergeG | None = inode
+
+        assert all(isinstance(path, str) for path in file_paths)
+        assert prefetch in WORKERS
+        self.file_paths: list[str] = list(file_paths)
+        self.prefetch: str = prefetch
+        self.prefetch_depth: int = prefetch_depth
+
+        # per file, its chunks are either read by a prefetcher or directly
+        self.prefetchers: list[Prefetcher | None] = []
+        self._chunks: list[Iterator[list[BBPacket]] | None] = []
+        # per file, the rest of its current chunk
+        self._pending: list[deque[BBPacket]] = []
+        # (time_ns, file, packet) of the next packet of every file whose
+        # next packet is known
+        self._heap: list[tuple[int, int, BBPacket]] = []
+        # files whose next chunk has not been read yet
+        self._starved: set[int] = set()
+
+    @staticmethod
+    def create_from_inode(inode: PcapMergeG) -> 'RNode':
+        assert isinstance(inode, PcapMergeG)
+        return PcapMergeN(
+            inode.node_id,
+            inode.file_paths,
+            inode,
+            dpg.get_value(inode.prefetch),
+            dpg.get_value(inode.prefetch_depth)
+        )
+
+    def process(self, inputs: list[deque], outputs: list[list]):
+        self.process_batch(inputs, outputs, 1)
+
+    def process_batch(
+            self,
+            inputs: list[deque[BBPacket]],
+            outputs: list[list[BBPacket]],
+            budget: int) -> int:
+        out = outputs[0]
+        heap = self._heap
+        done = 0
+        while done < budget and heap and not self._starved:
+            _, idx, pkt = heapq.heappop(heap)
+            pkt.set_meta(META_SOURCE_FILE, self.file_paths[idx])
+            out.append(pkt)
+            done += 1
+            self._advance(idx)
+        return done
+
+    def _advance(self, idx: int):
+        """
+        Push the next packet of file idx onto the heap, the file is starved
+        if its current chunk is used up
+        """
+        pending = self._pending[idx]
+        if pending:
+            pkt = pending.popleft()
+            heapq.heappush(self._heap, (pkt.time_ns, idx, pkt))
+        else:
+            self._starved.add(idx)
+            self._refill(idx)
+
+    def _refill(self, idx: int):
+        """
+        Take the next chunk of a starved file if it is available
+        """
+        prefetcher = self.prefetchers[idx]
+        if prefetcher is None:
+            chunk = next(self._chunks[idx], None)
+            finished = chunk is None
+        else:
+            chunk = prefetcher.get()
+            finished = prefetcher.done and not chunk
+
+        if finished:
+            LOGGER.info(f'{self.file_paths[idx]} is empty')
+            self._starved.discard(idx)
+            self._close(idx)
+        elif chunk:
+            self._starved.discard(idx)
+            self._pending[idx].extend(chunk)
+            self._advance(idx)
+
+    def is_ready(self, inputs: list[deque]) -> bool:
+        # the smallest time is only known once every file has a packet
+        for idx in list(self._starved):
+            self._refill(idx)
+        return bool(self._heap) and not self._starved
+
+    def waitable(self) -> list:
+        return [obj for idx in self._starved
+                if (prefetcher := self.prefetchers[idx]) is not None
+                for obj in prefetcher.waitable()]
+
+    def setup(self, reg_socks: Callable[[str, int, int], Connection]):
+        if not self.file_paths:
+            raise RuntimeError(
+                f'PCAP Merge {self.id} has no files configured')
+
+        for idx, path in enumerate(self.file_paths):
+            LOGGER.debug(f'Using path: {path}')
+            prefetcher = None
+            chunks = None
+            if self.prefetch == WORKER_NONE:
+                chunks = read_pcap(path)
+            else:
+                prefetcher = Prefetcher(
+                    read_pcap,
+                    (path,),
+                    -(-self.prefetch_depth // CHUNK_SIZE),
+                    self.prefetch,
+                    f'{type(self).__name__}({self.id}) file {idx}')
+                prefetcher.start()
+            self.prefetchers.append(prefetcher)
+            self._chunks.append(chunks)
+            self._pending.append(deque())
+            self._starved.add(idx)
+
+    def _close(self, idx: int):
+        if self.prefetchers[idx] is not None:
+            self.prefetchers[idx].close()
+            self.prefetchers[idx] = None
+        self._chunks[idx] = iter(())
+
+    def teardown(self):
+        for idx in range(len(self.prefetchers)):
+            self._close(idx)
 
 
 class PcapSinkG(INode):
@@ -245,7 +724,9 @@ class PcapSinkN(RNode):
         self.inode: PcapSinkG | None = inode
 
         self.file_path = file_path
-        self.writer: None | PcapWriter = None
+        self.writer: None | RawWriter = None
+        # link types written to a file of a different one, warned about once
+        self._mismatched: set[int] = set()
 
     @staticmethod
     def create_from_inode(inode: PcapSinkG) -> 'RNode':
@@ -260,10 +741,42 @@ class PcapSinkN(RNode):
             self,
             inputs: list[deque[BBPacket]],
             outputs: list[list[BBPacket]]):
-        pkt: BBPacket = inputs[0].popleft()
+        self._write(inputs[0].popleft())
 
-        LOGGER.debug(f"Writing a packet with time {pkt.scapy_pkt.time}")
-        self.writer.write(pkt.scapy_pkt)
+    def process_batch(
+            self,
+            inputs: list[deque[BBPacket]],
+            outputs: list[list[BBPacket]],
+            budget: int) -> int:
+        nr_pkts = min(budget, len(inputs[0]))
+        for _ in range(nr_pkts):
+            self._write(inputs[0].popleft())
+        return nr_pkts
+
+    def _write(self, pkt: BBPacket):
+        LOGGER.debug(f"Writing a packet with time {pkt.time_ns}")
+        linktype = pkt.linktype
+        if pkt.dissected:
+            # the packet may have been replaced by a different layer
+            linktype = conf.l2types.layer2num.get(
+                type(pkt.scapy_pkt), linktype)
+
+        # the original bytes unless the packet was dissected
+        data = pkt.to_bytes()
+        if linktype == DECODE_LORA_PHY:
+            data = join_loratap(data, pkt.get_meta(META_LORA_TAP))
+            linktype = LINKTYPE_LORATAP
+        elif not isinstance(linktype, int):
+            linktype = DLT_EN10MB
+
+        if self.writer.linktype not in (None, linktype) and \
+                linktype not in self._mismatched:
+            LOGGER.warning(f'{self.file_path} has link type '
+                           f'{self.writer.linktype}, writing packets of link '
+                           f'type {linktype} anyway')
+            self._mismatched.add(linktype)
+
+        self.writer.write(data, pkt.time_ns, linktype)
         # todo: Check what we actually mean with our timestamps
 
     def is_ready(self, inputs: list[deque]) -> bool:
@@ -271,16 +784,19 @@ class PcapSinkN(RNode):
 
     def setup(self, reg_socks: Callable[[str, int, int], Connection]):
         try:
-            self.writer = PcapWriter(self.file_path).__enter__()
+            self.writer = RawWriter(self.file_path)
         except TypeError as err:
             raise RuntimeError(
                 f'PCAP Source {self.id} has no file configured'
             ) from err
 
     def teardown(self):
-        self.writer.__exit__(None, None, None)
+        # writes everything still buffered before the run ends
+        if self.writer is not None:
+            self.writer.close()
 
 
 NodeBuilder.register_node(PcapSourceG, PcapSourceN)
+NodeBuilder.register_node(PcapMergeG, PcapMergeN)
 NodeBuilder.register_node(PcapSinkG, PcapSinkN)
 dpg.destroy_context()
@@ -1,5 +1,3 @@
-from copy import deepcopy
-
 import dearpygui.dearpygui as dpg
 from collections import deque
 
@@ -71,8 +69,7 @@ class RepeaterN(RNode):
         pkt: BBPacket = inputs[0].popleft()
 
         for _ in range(self.repeats):
-            cpy = deepcopy(pkt)
-            outputs[0].append(cpy)
+            outputs[0].append(pkt.clone())
 
     def is_ready(self, inputs: list[deque]) -> bool:
         return len(inputs[0]) > 0
@@ -129,6 +129,8 @@ class SwitchG(INode):
 
 
 class SwitchN(RNode):
+    stateless = True
+
     def __init__(
             self,
             node_id: int,
@@ -169,10 +171,23 @@ class SwitchN(RNode):
             self,
             inputs: list[deque[BBPacket]],
             outputs: list[list[BBPacket]]):
-        pkt: BBPacket = inputs[0].popleft()
+        import scapy.contrib.loraphy2wan
+
+        self._route(inputs[0].popleft(), outputs)
 
+    def process_batch(
+            self,
+            inputs: list[deque[BBPacket]],
+            outputs: list[list[BBPacket]],
+            budget: int) -> int:
         import scapy.contrib.loraphy2wan
 
+        nr_pkts = min(budget, len(inputs[0]))
+        for _ in range(nr_pkts):
+            self._route(inputs[0].popleft(), outputs)
+        return nr_pkts
+
+    def _route(self, pkt: BBPacket, outputs: list[list[BBPacket]]):
         ssp = pkt.scapy_pkt
         scapy_pkt = ssp.getlayer(self.layer)
 
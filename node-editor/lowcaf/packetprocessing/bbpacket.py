@@ -1,88 +1,480 @@
+import pickle
+import struct
+import time
 from abc import ABC, abstractmethod
 from datetime import datetime
-from typing import Optional
+from types import MappingProxyType
+from typing import Optional, TypedDict
 
 from scapy.packet import Packet
 from scapy.all import *
 
 BYTE_ORDER: Literal['big', 'little'] = 'big'
 
+PROTOCOL_VERSION: int = 1  # Announced in HelloMsg
+CAP_BATCH: int = 0x01  # Peer understands CMD_BATCH frames
+CAP_SYNC: int = 0x02  # Peer understands CMD_HORIZON frames
+CAPS: int = CAP_BATCH | CAP_SYNC  # Capabilities supported by this version
+
+HORIZON_END: int = 2 ** 64 - 1  # Horizon granted once time no longer matters
+
 
 class MsgIncompleteError(RuntimeError):
     pass
 
 
+LINKTYPE_LORATAP: int = 270  # Pcap link type of LoRaTap captures
+DECODE_LORA_PHY: str = 'lora_phy'  # LoRa PHY payload without tap header
+
+
+def _decode_lora_phy(data: bytes) -> Packet:
+    from scapy.contrib.loraphy2wan import PHYPayload
+    return PHYPayload(data)
+
+
+# Decoders for link types scapy does not know (or decodes differently). Any
+# other int is looked up in scapy's conf.l2types.
+DECODERS: dict[int | str, Callable[[bytes], Packet]] = {
+    DECODE_LORA_PHY: _decode_lora_phy,
+}
+
+
+def decode_raw(data: bytes, linktype: int | str) -> Packet:
+    """
+    Dissect raw bytes into a scapy packet
+
+    Args:
+        data: The raw bytes of the packet
+        linktype: Pcap link type (DLT) or a key of DECODERS
+
+    Returns:
+        The dissected packet, conf.raw_layer if the link type is unknown
+    """
+    decoder = DECODERS.get(linktype)
+    if decoder is None:
+        decoder = conf.l2types.get(linktype, conf.raw_layer)
+    return decoder(data)
+
+
+# Well-known metadata keys
+META_T_DIFF: str = 't_diff'  # float, time difference set by CompN
+META_LORA_TAP: str = 'lora_tap'  # LoRaTapMeta, set by PcapSourceN
+META_SEQ: str = 'seq'  # int, position in the stream of a sharded stage
+META_SOURCE_FILE: str = 'source_file'  # str, capture read by PcapMergeN
+
+
+class LoRaTapMeta(TypedDict):
+    frequency: int
+    bandwidth: int
+    spreading_factor: int
+    coding_rate: int
+
+
+class PacketMeta(TypedDict, total=False):
+    t_diff: float
+    lora_tap: LoRaTapMeta
+    seq: int
+    source_file: str
+
+
+# Shared by all packets without metadata, replaced by a dict on first write
+_EMPTY_META: MappingProxyType = MappingProxyType({})
+
+
 class BBPacket:
     """
     This is how packets are internally represented within BB and thus how the
     nodes will interact with packets.
+
+    Packets created from raw bytes (see from_raw) are only dissected once
+    scapy_pkt is accessed. Until then, length, time and the bytes themselves
+    are served from the raw data, so nodes that do not look into the packet
+    never pay for scapy.
+
+    Packets are slotted and share one empty metadata mapping until metadata
+    is written, as a lot of them may be queued at once. Prefer get_meta and
+    set_meta over the metadata property, which always materializes a dict.
+
+    clone() creates a copy that shares the scapy packet and the metadata with
+    the original. Shared objects are copied the first time one side writes
+    to them, i.e., through edit(), the time setter or the metadata
+    accessors. scapy_pkt must therefore be treated as read-only, nodes that
+    modify the packet use edit().
     """
 
+    __slots__ = ('_pkt', '_raw', '_time_ns', 'linktype', 'timestamp',
+                 'dropped', '_meta', '_pkt_shared', '_meta_shared')
+
     def __init__(self,
-                 data: Packet,
+                 data: Packet | None,
                  timestamp: int,
                  dropped: bool = False,
-                 metadata: Optional[dict] = None):
-        self.scapy_pkt: Packet = data
+                 metadata: Optional[PacketMeta] = None):
+        self._pkt: Packet | None = data
+        self._raw: bytes | None = None
+        self._time_ns: int | None = None
+        self.linktype: int | str = DLT_EN10MB
         self.timestamp: int = timestamp
         self.dropped: bool = dropped
-        self.metadata: dict = metadata if metadata is not None else {}
+        self._meta: PacketMeta | MappingProxyType = \
+            metadata if metadata is not None else _EMPTY_META
+        self._pkt_shared: bool = False
+        self._meta_shared: bool = False
+
+    @classmethod
+    def from_raw(cls,
+                 data: bytes,
+                 timestamp: int,
+                 linktype: int | str = DLT_EN10MB,
+                 time_ns: int | None = None,
+                 metadata: Optional[PacketMeta] = None) -> 'BBPacket':
+        """
+        Create a packet that is dissected on first access of scapy_pkt
+
+        Args:
+            data: The raw bytes of the packet
+            timestamp: See BBPacket
+            linktype: Pcap link type (DLT) or a key of DECODERS
+            time_ns: Capture time in ns since epoch, defaults to now
+            metadata: See BBPacket
+
+        Returns:
+            The new packet
+        """
+        pkt = cls(None, timestamp, metadata=metadata)
+        pkt._raw = bytes(data)
+        pkt.linktype = linktype
+        pkt._time_ns = time_ns if time_ns is not None else time.time_ns()
+        return pkt
+
+    @property
+    def metadata(self) -> PacketMeta:
+        """
+        The metadata as a mutable dict, allocated on first access
+        """
+        if self._meta is _EMPTY_META:
+            self._meta = {}
+        elif self._meta_shared:
+            self._meta = dict(self._meta)
+            self._meta_shared = False
+        return self._meta
+
+    @metadata.setter
+    def metadata(self, metadata: PacketMeta):
+        self._meta = metadata
+        self._meta_shared = False
+
+    def get_meta(self, key: str, default=None):
+        """
+        Read a metadata entry without allocating a dict
+
+        Args:
+            key: The key, preferably one of the META_* constants
+            default: Returned if the entry does not exist
+
+        Returns:
+            The stored value or default
+        """
+        return self._meta.get(key, default)
+
+    def set_meta(self, key: str, value):
+        """
+        Write a metadata entry
+
+        Args:
+            key: The key, preferably one of the META_* constants
+            value: The value to store
+        """
+        if self._meta is _EMPTY_META:
+            self._meta = {key: value}
+        else:
+            self.metadata[key] = value
+
+    def get_meta_mapping(self) -> PacketMeta | MappingProxyType:
+        """
+        All metadata for reading, without allocating a dict
+        """
+        return self._meta
+
+    def clone(self) -> 'BBPacket':
+        """
+        Cheap copy that shares the packet and the metadata with this one
+        until either of them is modified
+
+        Returns:
+            The clone
+        """
+        cpy = BBPacket.__new__(BBPacket)
+        cpy._pkt = self._pkt
+        cpy._raw = self._raw
+        cpy._time_ns = self._time_ns
+        cpy.linktype = self.linktype
+        cpy.timestamp = self.timestamp
+        cpy.dropped = self.dropped
+        cpy._meta = self._meta
+
+        # raw bytes are immutable and the empty metadata is never written
+        shared_pkt = self._pkt is not None
+        shared_meta = self._meta is not _EMPTY_META
+        self._pkt_shared = cpy._pkt_shared = \
+            self._pkt_shared or shared_pkt
+        self._meta_shared = cpy._meta_shared = \
+            self._meta_shared or shared_meta
+        return cpy
+
+    def edit(self) -> Packet:
+        """
+        The scapy packet for modification, copied first if it is shared with
+        a clone
+
+        Returns:
+            A scapy packet owned by this BBPacket
+        """
+        pkt = self.scapy_pkt
+        if self._pkt_shared:
+            pkt = pkt.copy()
+            self._pkt = pkt
+            self._pkt_shared = False
+        return pkt
+
+    def __getstate__(self):
+        meta = None if self._meta is _EMPTY_META else self._meta
+        return (self._pkt, self._raw, self._time_ns, self.linktype,
+                self.timestamp, self.dropped, meta)
+
+    def __setstate__(self, state):
+        (self._pkt, self._raw, self._time_ns, self.linktype,
+         self.timestamp, self.dropped, meta) = state
+        self._meta = meta if meta is not None else _EMPTY_META
+        self._pkt_shared = self._meta_shared = False
+
+    @property
+    def scapy_pkt(self) -> Packet:
+        if self._pkt is None:
+            pkt = decode_raw(self._raw, self.linktype)
+            pkt.time = EDecimal(self._time_ns) / 1_000_000_000
+            # the caller may modify the packet from now on, so the raw bytes
+            # can no longer be trusted
+            self._pkt = pkt
+            self._raw = None
+        return self._pkt
+
+    @scapy_pkt.setter
+    def scapy_pkt(self, pkt: Packet):
+        self._pkt = pkt
+        self._raw = None
+        self._pkt_shared = False
+
+    @property
+    def dissected(self) -> bool:
+        """
+        Whether the scapy representation has been built
+        """
+        return self._pkt is not None
 
+    @property
+    def time(self) -> EDecimal | float:
+        """
+        Capture time in seconds since epoch, like scapy's Packet.time
+        """
+        if self._pkt is not None:
+            return self._pkt.time
+        return EDecimal(self._time_ns) / 1_000_000_000
+
+    @time.setter
+    def time(self, value: EDecimal | float):
+        if self._pkt is not None:
+            self.edit().time = value
+        else:
+            self._time_ns = round(value * 1_000_000_000)
+
+    @property
+    def time_ns(self) -> int:
+        """
+        Capture time in ns since epoch
+        """
+        if self._pkt is not None:
+            return round(self._pkt.time * 1_000_000_000)
+        return self._time_ns
+
+    def to_bytes(self) -> bytes:
+        """
+        The packet in serialized form. Returns the original bytes if the
+        packet was never dissected.
+        """
+        if self._pkt is None:
+            return self._raw
+        return raw(self._pkt)
 
-class DecoderSim2BB:
+    def __len__(self) -> int:
+        if self._pkt is None:
+            return len(self._raw)
+        return len(self._pkt)
+
+
+# Compact representation of packets passed between processes, i.e., the raw
+# bytes plus the few fields of a BBPacket instead of a pickled scapy object.
+# Batch: count (I), then per packet a record header followed by the link type
+# name (if the link type is a str), the pickled metadata (if any) and the data
+PACKED_COUNT: struct.Struct = struct.Struct('>I')
+# time_ns, timestamp, dropped, linktype, name_len, meta_len, data_len
+PACKED_RECORD: struct.Struct = struct.Struct('>qqBHBII')
+
+
+def pack_packets(pkts: list[BBPacket],
+                 buff: bytearray | None = None) -> bytearray:
     """
-    This class provides an overall handler for all messages received from the
-    simulation application
+    Serialize packets for another process, see unpack_packets
+
+    Args:
+        pkts: The packets to serialize
+        buff: Buffer to append the batch to, e.g., after a message header
+
+    Returns:
+        The serialized batch
+    """
+    if buff is None:
+        buff = bytearray()
+    buff += PACKED_COUNT.pack(len(pkts))
+    for pkt in pkts:
+        linktype = pkt.linktype
+        if pkt.dissected:
+            # the packet may have been replaced by a different layer
+            linktype = conf.l2types.layer2num.get(
+                type(pkt.scapy_pkt), linktype)
+
+        if isinstance(linktype, str):
+            name = linktype.encode()
+            linktype = 0
+        else:
+            name = b''
+
+        meta = pkt.get_meta_mapping()
+        meta = pickle.dumps(meta) if meta else b''
+        data = pkt.to_bytes()
+
+        buff += PACKED_RECORD.pack(pkt.time_ns, pkt.timestamp, pkt.dropped,
+                                   linktype, len(name), len(meta), len(data))
+        buff += name
+        buff += meta
+        buff += data
+    return buff
+
+
+def unpack_packets(buff: bytes | bytearray | memoryview) -> list[BBPacket]:
+    """
+    Deserialize a batch created by pack_packets. The packets are not
+    dissected until they are accessed.
+
+    Args:
+        buff: The serialized batch
+
+    Returns:
+        The packets
+    """
+    view = memoryview(buff)
+    count, = PACKED_COUNT.unpack_from(view, 0)
+    ptr = PACKED_COUNT.size
+
+    pkts = []
+    for _ in range(count):
+        time_ns, timestamp, dropped, linktype, name_len, meta_len, data_len = \
+            PACKED_RECORD.unpack_from(view, ptr)
+        ptr += PACKED_RECORD.size
+
+        if name_len:
+            linktype = bytes(view[ptr:ptr + name_len]).decode()
+            ptr += name_len
+
+        meta = None
+        if meta_len:
+            meta = pickle.loads(view[ptr:ptr + meta_len])
+            ptr += meta_len
+
+        pkt = BBPacket.from_raw(view[ptr:ptr + data_len], timestamp,
+                                linktype, time_ns, meta)
+        pkt.dropped = bool(dropped)
+        ptr += data_len
+        pkts.append(pkt)
+    return pkts
+
+
+class FrameDecoder:
+    """
+    Common frame loop of both decoders. Frames are parsed in place from a
+    memoryview, i.e., the payloads of the returned messages are views into
+    the passed buffer and are only copied once a consumer needs them.
     """
 
     CMD_PKT: int = 0x01  # BBPacket Message
     CMD_EOD: int = 0x02  # End-of-Data Message
+    # 0x03 is the ns-3 connector's "currently no data" command
+    CMD_HELLO: int = 0x04  # Version and capability exchange
+    CMD_BATCH: int = 0x05  # Several packets behind one header
+    CMD_HORIZON: int = 0x06  # Time synchronization, see HorizonMsg
 
     @classmethod
-    def buff2msgs(cls, buff: bytes) -> tuple[list, bytes]:
+    def pkt_msg(cls) -> type['Msg']:
         """
-        Extract RcvMessages from a buffer
+        The message class used for CMD_PKT frames in this direction
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def decode(cls,
+               buff: bytes | bytearray | memoryview,
+               ptr: int = 0,
+               end: int | None = None) -> tuple[list, int]:
+        """
+        Extract all complete messages from buff[ptr:end] without copying.
+        The payloads of the messages are views into buff, so callers must
+        copy whatever they keep (e.g., BBPacket.from_raw does) before buff is
+        written again.
 
         Args:
-            buff: The buffer containing RcvMessages in serialized form
+            buff: The buffer containing messages in serialized form
+            ptr: Offset of the first frame within buff
+            end: Offset after the last valid byte, defaults to len(buff)
 
         Returns:
-            msgs, rem: A list of RcvMessages and remaining bytes that were
-            not part of the last RcvMessage, but belong to the next one which
-            was only partially present in the buffer
+            msgs, ptr: A list of messages and the offset of the first byte
+            that was not consumed, i.e., the start of a partial message or end.
+            Batches are flattened into the packet messages they contain.
         """
+        view = buff if isinstance(buff, memoryview) else memoryview(buff)
+        if end is None:
+            end = len(view)
+
+        pkt_msg = cls.pkt_msg()
         out = []
-        ptr = 0
-        while ptr < len(buff):
-            cmd: int = int.from_bytes(
-                buff[ptr:ptr + 1], BYTE_ORDER, signed=False)
+        while ptr < end:
+            cmd: int = view[ptr]
 
             try:
                 match cmd:
                     case cls.CMD_EOD:
-                        msg, ptr = EODMsg.buff2msg(buff, ptr)
+                        msg, ptr = EODMsg.buff2msg(view, ptr, end)
                         out.append(msg)
                     case cls.CMD_PKT:
-                        msg, ptr = MsgSim2BB.buff2msg(buff, ptr)
+                        msg, ptr = pkt_msg.buff2msg(view, ptr, end)
+                        out.append(msg)
+                    case cls.CMD_BATCH:
+                        msg, ptr = MsgBatch.buff2msg(view, ptr, end, pkt_msg)
+                        out.extend(msg.msgs)
+                    case cls.CMD_HELLO:
+                        msg, ptr = HelloMsg.buff2msg(view, ptr, end)
+                        out.append(msg)
+                    case cls.CMD_HORIZON:
+                        msg, ptr = HorizonMsg.buff2msg(view, ptr, end)
                         out.append(msg)
                     case _:
                         raise NotImplementedError(
                             f'Command {cmd} is unknown'
                         )
             except MsgIncompleteError:
-                return out, buff[ptr:]
-
-        return out, bytes()
-
-
-class DecoderBB2Sim:
-    """
-    This class provides an overall handler for all messages received from the
-    simulation application
-    """
+                break
 
-    CMD_PKT: int = 0x01  # BBPacket Message
-    CMD_EOD: int = 0x02  # End-of-Data Message
+        return out, ptr
 
     @classmethod
     def buff2msgs(cls, buff: bytes) -> tuple[list, bytes]:
@@ -97,28 +489,30 @@ class DecoderBB2Sim:
             not part of the last RcvMessage, but belong to the next one which
             was only partially present in the buffer
         """
-        out = []
-        ptr = 0
-        while ptr < len(buff):
-            cmd: int = int.from_bytes(
-                buff[ptr:ptr + 1], BYTE_ORDER, signed=False)
+        msgs, ptr = cls.decode(buff)
+        return msgs, bytes(buff[ptr:])
 
-            try:
-                match cmd:
-                    case cls.CMD_EOD:
-                        msg, ptr = EODMsg.buff2msg(buff, ptr)
-                        out.append(msg)
-                    case cls.CMD_PKT:
-                        msg, ptr = MsgBB2Sim.buff2msg(buff, ptr)
-                        out.append(msg)
-                    case _:
-                        raise NotImplementedError(
-                            f'Command {cmd} is unknown'
-                        )
-            except MsgIncompleteError:
-                return out, buff[ptr:]
 
-        return out, bytes()
+class DecoderSim2BB(FrameDecoder):
+    """
+    This class provides an overall handler for all messages received from the
+    simulation application
+    """
+
+    @classmethod
+    def pkt_msg(cls) -> type['Msg']:
+        return MsgSim2BB
+
+
+class DecoderBB2Sim(FrameDecoder):
+    """
+    This class provides an overall handler for all messages sent to the
+    simulation application
+    """
+
+    @classmethod
+    def pkt_msg(cls) -> type['Msg']:
+        return MsgBB2Sim
 
 
 class Msg(ABC):
@@ -130,8 +524,9 @@ class Msg(ABC):
     @classmethod
     @abstractmethod
     def buff2msg(cls,
-                 buff: bytes,
-                 ptr: int) -> tuple['Msg', int]:
+                 buff: bytes | memoryview,
+                 ptr: int,
+                 end: int | None = None) -> tuple['Msg', int]:
         raise NotImplementedError
 
 
@@ -140,10 +535,168 @@ class EODMsg(Msg):
         return DecoderSim2BB.CMD_EOD.to_bytes(1, BYTE_ORDER, signed=False)
 
     @classmethod
-    def buff2msg(cls, buff: bytes, ptr: int) -> tuple['Msg', int]:
+    def buff2msg(cls,
+                 buff: bytes | memoryview,
+                 ptr: int,
+                 end: int | None = None) -> tuple['Msg', int]:
         return EODMsg(), ptr + 1
 
 
+class HelloMsg(Msg):
+    """
+    Version and capability exchange. The ns-3 connector sends its hello right
+    after connecting and we answer with the capabilities both sides support.
+    Peers that never send a hello only receive single CMD_PKT frames.
+    """
+
+    HEADER: struct.Struct = struct.Struct('>BHI')  # cmd, version, caps
+
+    def __init__(self, version: int = PROTOCOL_VERSION, caps: int = CAPS):
+        self.version: int = version
+        self.caps: int = caps
+
+    def __eq__(self, other):
+        if isinstance(other, HelloMsg):
+            return self.__dict__ == other.__dict__
+        else:
+            return NotImplemented
+
+    def serialize(self) -> bytes:
+        return self.HEADER.pack(FrameDecoder.CMD_HELLO, self.version,
+                                self.caps)
+
+    @classmethod
+    def buff2msg(cls,
+                 buff: bytes | memoryview,
+                 ptr: int,
+                 end: int | None = None) -> tuple['HelloMsg', int]:
+        if end is None:
+            end = len(buff)
+
+        if ptr + cls.HEADER.size > end:
+            raise MsgIncompleteError
+
+        _, version, caps = cls.HEADER.unpack_from(buff, ptr)
+        return HelloMsg(version, caps), ptr + cls.HEADER.size
+
+
+class HorizonMsg(Msg):
+    """
+    Null message of the conservative time synchronization, only exchanged
+    with peers announcing CAP_SYNC. The sender promises that it will not
+    send a packet belonging to a simulation time before time_ns.
+
+    ns-3 announces its current time whenever it waits for lowcaf. lowcaf
+    grants a horizon once it processed everything ns-3 sent before, see
+    PacketProcessor.grant_horizon, and ns-3 runs up to it without polling.
+    """
+
+    HEADER: struct.Struct = struct.Struct('>BQ')  # cmd, time_ns
+
+    def __init__(self, time_ns: int):
+        self.time_ns: int = time_ns
+
+    def __eq__(self, other):
+        if isinstance(other, HorizonMsg):
+            return self.time_ns == other.time_ns
+        else:
+            return NotImplemented
+
+    def serialize(self) -> bytes:
+        return self.HEADER.pack(FrameDecoder.CMD_HORIZON, self.time_ns)
+
+    @classmethod
+    def buff2msg(cls,
+                 buff: bytes | memoryview,
+                 ptr: int,
+                 end: int | None = None) -> tuple['HorizonMsg', int]:
+        if end is None:
+            end = len(buff)
+
+        if ptr + cls.HEADER.size > end:
+            raise MsgIncompleteError
+
+        _, time_ns = cls.HEADER.unpack_from(buff, ptr)
+        return HorizonMsg(time_ns), ptr + cls.HEADER.size
+
+
+class MsgBatch(Msg):
+    """
+    Carries several packet messages behind a single header. The body consists
+    of the packet records, i.e., the packet frames without their command byte.
+    """
+
+    HEADER: struct.Struct = struct.Struct('>BII')  # cmd, count, body length
+
+    def __init__(self, msgs: list['MsgSim2BB'] | list['MsgBB2Sim']):
+        self.msgs: list['MsgSim2BB'] | list['MsgBB2Sim'] = msgs
+
+    def serialize(self) -> bytes:
+        body = b''.join([msg.serialize_record() for msg in self.msgs])
+        return self.HEADER.pack(
+            FrameDecoder.CMD_BATCH, len(self.msgs), len(body)) + body
+
+    def size(self) -> int:
+        return self.HEADER.size + sum(
+            [msg.size(record=True) for msg in self.msgs])
+
+    def serialize_into(self, buff: bytearray, ptr: int) -> int:
+        """
+        Writes this batch into buff starting at ptr, which must provide at
+        least size() bytes
+
+        Returns:
+            ptr: The offset after the written batch
+        """
+        start = ptr + self.HEADER.size
+        ptr = start
+        for msg in self.msgs:
+            ptr = msg.serialize_into(buff, ptr, record=True)
+
+        self.HEADER.pack_into(buff, start - self.HEADER.size,
+                              FrameDecoder.CMD_BATCH, len(self.msgs),
+                              ptr - start)
+        return ptr
+
+    @classmethod
+    def buff2msg(cls,
+                 buff: bytes | memoryview,
+                 ptr: int,
+                 end: int | None = None,
+                 pkt_msg: type['MsgSim2BB'] | type['MsgBB2Sim'] | None = None
+                 ) -> tuple['MsgBatch', int]:
+        if end is None:
+            end = len(buff)
+        if pkt_msg is None:
+            pkt_msg = MsgSim2BB
+
+        start = ptr + cls.HEADER.size
+        if start > end:
+            raise MsgIncompleteError
+
+        _, count, length = cls.HEADER.unpack_from(buff, ptr)
+        stop = start + length
+        if stop > end:
+            raise MsgIncompleteError
+
+        msgs = []
+        ptr = start
+        try:
+            for _ in range(count):
+                msg, ptr = pkt_msg.record2msg(buff, ptr, stop)
+                msgs.append(msg)
+        except MsgIncompleteError:
+            # the body is complete, waiting for more bytes would not help
+            raise ValueError(
+                f'Batch length {length} does not match its {count} records')
+
+        if ptr != stop:
+            raise ValueError(
+                f'Batch length {length} does not match its {count} records')
+
+        return MsgBatch(msgs), stop
+
+
 class MsgSim2BB(Msg):
     """
     This defines the message format which we receive from NS3 instances. Before
@@ -151,15 +704,20 @@ class MsgSim2BB(Msg):
     transformed into a BBPacket.
     """
 
+    # cmd, ns3_node_id, node_id, delay_ns, length
+    HEADER: struct.Struct = struct.Struct('>BIIQI')
+    # the same without cmd, used within batches
+    RECORD: struct.Struct = struct.Struct('>IIQI')
+
     def __init__(self,
                  ns3_node_id: int,
                  node_id: int,
                  delay_ns: int,
-                 data: bytes):
+                 data: bytes | memoryview):
         self.node_id: int = node_id
         self.ns3_node_id: int = ns3_node_id
         self.delay_ns: int = delay_ns
-        self.data: bytes = data
+        self.data: bytes | memoryview = data
 
     def __eq__(self, other):
         if isinstance(other, MsgSim2BB):
@@ -168,52 +726,84 @@ class MsgSim2BB(Msg):
             return NotImplemented
 
     def serialize(self) -> bytes:
-        buf = bytes()
-        buf += b'\x01'
-        buf += self.ns3_node_id.to_bytes(4, BYTE_ORDER, signed=False)
-        buf += self.node_id.to_bytes(4, BYTE_ORDER, signed=False)
-        buf += self.delay_ns.to_bytes(8, BYTE_ORDER, signed=False)
-        buf += len(self.data).to_bytes(4, BYTE_ORDER, signed=False)
-        buf += self.data
-
-        return buf
-
-    @classmethod
-    def buff2msg(cls,
-                 buff: bytes,
-                 ptr: int) -> tuple['MsgSim2BB', int]:
+        return self.HEADER.pack(
+            DecoderSim2BB.CMD_PKT,
+            self.ns3_node_id,
+            self.node_id,
+            self.delay_ns,
+            len(self.data)) + self.data
+
+    def serialize_record(self) -> bytes:
+        return self.RECORD.pack(
+            self.ns3_node_id,
+            self.node_id,
+            self.delay_ns,
+            len(self.data)) + self.data
+
+    def size(self, record: bool = False) -> int:
+        size = self.RECORD.size if record else self.HEADER.size
+        return size + len(self.data)
+
+    def serialize_into(self,
+                       buff: bytearray,
+                       ptr: int,
+                       record: bool = False) -> int:
+        """
+        Writes this message into buff starting at ptr, which must provide at
+        least size(record) bytes
 
-        cmd: int = int.from_bytes(
-            buff[ptr:ptr + 1], BYTE_ORDER, signed=False)
-        ptr += 1
+        Args:
+            buff: The target buffer
+            ptr: Offset to write to
+            record: Omit the command byte, as done within batches
 
-        ns3_node_id: int = int.from_bytes(
-            buff[ptr:ptr + 4], BYTE_ORDER, signed=False)
-        ptr += 4
+        Returns:
+            ptr: The offset after the written message
+        """
+        if not record:
+            buff[ptr] = DecoderSim2BB.CMD_PKT
+            ptr += 1
 
-        node_id: int = int.from_bytes(
-            buff[ptr:ptr + 4], BYTE_ORDER, signed=False)
-        ptr += 4
+        self.RECORD.pack_into(buff, ptr, self.ns3_node_id, self.node_id,
+                              self.delay_ns, len(self.data))
+        ptr += self.RECORD.size
 
-        delay_ns: int = int.from_bytes(
-            buff[ptr: ptr + 8], BYTE_ORDER, signed=False)
-        ptr += 8
+        end = ptr + len(self.data)
+        buff[ptr:end] = self.data
+        return end
 
-        print(delay_ns)
+    @classmethod
+    def buff2msg(cls,
+                 buff: bytes | memoryview,
+                 ptr: int,
+                 end: int | None = None) -> tuple['MsgSim2BB', int]:
+        if end is None:
+            end = len(buff)
+
+        if ptr + cls.HEADER.size > end:
+            # not even the header is fully contained
+            raise MsgIncompleteError
 
-        length = int.from_bytes(
-            buff[ptr:ptr + 4], BYTE_ORDER, signed=False)
-        ptr += 4
+        return cls.record2msg(buff, ptr + 1, end)
 
-        print(length)
+    @classmethod
+    def record2msg(cls,
+                   buff: bytes | memoryview,
+                   ptr: int,
+                   end: int) -> tuple['MsgSim2BB', int]:
+        start = ptr + cls.RECORD.size
+        if start > end:
+            raise MsgIncompleteError
 
-        data: bytes = buff[ptr: ptr + length]
-        ptr += length
+        ns3_node_id, node_id, delay_ns, length = cls.RECORD.unpack_from(
+            buff, ptr)
 
-        if ptr > len(buff):
+        ptr = start + length
+        if ptr > end:
             # this message was not fully contained
             raise MsgIncompleteError
 
+        data = memoryview(buff)[start:ptr]
         return MsgSim2BB(ns3_node_id, node_id, delay_ns, data), ptr
 
     def __str__(self):
@@ -221,72 +811,118 @@ class MsgSim2BB(Msg):
                 f'\tNode ID: {self.node_id}\n'
                 f'\tNS3 Node ID: {self.ns3_node_id}\n'
                 f'\tDelay: {self.delay_ns}\n'
-                f'\tData: {self.data}\n'
+                f'\tData: {bytes(self.data)}\n'
                 f'\tLength: {len(self.data)}\n')
 
 
 class MsgBB2Sim(Msg):
     """
     The message format when sending scapy_pkt back to an NS3 instance.
+
+    The MAC address is currently not part of the wire format, the ns-3
+    connector takes it from the Ethernet header of the payload.
     """
 
+    # cmd, delay_ns, proto, length
+    HEADER: struct.Struct = struct.Struct('>BQ2sI')
+    # the same without cmd, used within batches
+    RECORD: struct.Struct = struct.Struct('>Q2sI')
+
     def __init__(self,
                  delay_ns: int,
-                 data: bytes,
+                 data: bytes | memoryview,
                  mac: bytes,
                  proto: bytes):
         self.delay_ns: int = delay_ns
-        self.data: bytes = data
+        self.data: bytes | memoryview = data
         self.mac: bytes = mac
         self.proto: bytes = proto
 
     def serialize(self) -> bytes:
-        buf = bytes()
-        buf += b'\x01'
-        buf += self.delay_ns.to_bytes(8, BYTE_ORDER, signed=False)
-        # buf += self.mac
-        buf += self.proto
-        buf += len(self.data).to_bytes(4, BYTE_ORDER, signed=False)
-        buf += self.data
+        return self.HEADER.pack(
+            DecoderBB2Sim.CMD_PKT,
+            self.delay_ns,
+            self.proto,
+            len(self.data)) + self.data
+
+    def serialize_record(self) -> bytes:
+        return self.RECORD.pack(
+            self.delay_ns,
+            self.proto,
+            len(self.data)) + self.data
+
+    def size(self, record: bool = False) -> int:
+        size = self.RECORD.size if record else self.HEADER.size
+        return size + len(self.data)
+
+    def serialize_into(self,
+                       buff: bytearray,
+                       ptr: int,
+                       record: bool = False) -> int:
+        """
+        Writes this message into buff starting at ptr, which must provide at
+        least size(record) bytes
 
-        return buf
+        Args:
+            buff: The target buffer
+            ptr: Offset to write to
+            record: Omit the command byte, as done within batches
 
-    @classmethod
-    def buff2msg(cls, buff: bytes, ptr: int) -> tuple['Msg', int]:
-        cmd: int = int.from_bytes(
-            buff[ptr:ptr + 1], BYTE_ORDER, signed=False)
-        ptr += 1
+        Returns:
+            ptr: The offset after the written message
+        """
+        if not record:
+            buff[ptr] = DecoderBB2Sim.CMD_PKT
+            ptr += 1
 
-        delay_ns: int = int.from_bytes(
-            buff[ptr:ptr + 8], BYTE_ORDER, signed=False)
-        ptr += 8
+        self.RECORD.pack_into(buff, ptr, self.delay_ns, self.proto,
+                              len(self.data))
+        ptr += self.RECORD.size
 
-        mac: bytes = buff[ptr:ptr + 17]
-        ptr += 17
+        end = ptr + len(self.data)
+        buff[ptr:end] = self.data
+        return end
 
-        proto: bytes = buff[ptr: ptr + 2]
-        ptr += 2
+    @classmethod
+    def buff2msg(cls,
+                 buff: bytes | memoryview,
+                 ptr: int,
+                 end: int | None = None) -> tuple['MsgBB2Sim', int]:
+        if end is None:
+            end = len(buff)
+
+        if ptr + cls.HEADER.size > end:
+            # not even the header is fully contained
+            raise MsgIncompleteError
 
-        length = int.from_bytes(
-            buff[ptr:ptr + 4], BYTE_ORDER, signed=False)
-        ptr += 4
+        return cls.record2msg(buff, ptr + 1, end)
+
+    @classmethod
+    def record2msg(cls,
+                   buff: bytes | memoryview,
+                   ptr: int,
+                   end: int) -> tuple['MsgBB2Sim', int]:
+        start = ptr + cls.RECORD.size
+        if start > end:
+            raise MsgIncompleteError
 
-        data: bytes = buff[ptr: ptr + length]
-        ptr += length
+        delay_ns, proto, length = cls.RECORD.unpack_from(buff, ptr)
 
-        if ptr > len(buff):
+        ptr = start + length
+        if ptr > end:
             # this message was not fully contained
             raise MsgIncompleteError
 
-        return MsgBB2Sim(delay_ns, data, mac, proto), ptr
+        data = memoryview(buff)[start:ptr]
+        return MsgBB2Sim(delay_ns, data, b'', proto), ptr
 
     def __str__(self):
-        data = self.serialize()
+        _, delay_ns, proto, length = self.HEADER.unpack_from(
+            self.serialize())
 
         return ('TxMessage Content:\n'
-                f'\tCommand: {data[0:1]}\n'
-                f'\tDelay [ns]: {data[1:9]}\n'
-                f'\tMAC address: {data[9:26]}\n'
-                f'\tProto: {data[26:28]} {int.from_bytes(data[26:28], "little")}\n'
-                f'\tLength: {data[28:32]} {int.from_bytes(data[28:32], "little")}\n'
-                f'\tPayload: {data[32:32 + len(self.data)]}\n')
+                f'\tCommand: {DecoderBB2Sim.CMD_PKT}\n'
+                f'\tDelay [ns]: {delay_ns}\n'
+                f'\tProto: {proto}\n'
+                f'\tLength: {length}\n'
+                f'\tPayload: {bytes(self.data)}\n')
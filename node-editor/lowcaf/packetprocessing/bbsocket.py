@@ -1,14 +1,18 @@
+import fcntl
 import logging
 import selectors
 import socket
+import struct
+import termios
+import time
 from multiprocessing.connection import Connection
 from typing import Optional
 
-from scapy.compat import raw
-from scapy.layers.l2 import Ether
+from scapy.data import DLT_EN10MB
 
 from lowcaf.packetprocessing.bbpacket import EODMsg, BBPacket, MsgSim2BB, \
-    DecoderSim2BB, MsgBB2Sim
+    DecoderSim2BB, MsgBB2Sim, HelloMsg, HorizonMsg, MsgBatch, CAPS, \
+    CAP_BATCH, CAP_SYNC, PROTOCOL_VERSION
 
 LOGGER = logging.getLogger(__name__)
 
@@ -19,19 +23,83 @@ class EndOfDataError(RuntimeError):
         self.sock: 'BBSocket' = sock
 
 
+class FlushMsg:
+    """
+    Sent by a node through its pipe after its last packet. The socket answers
+    with ('Flushed', node_id) on the command channel once everything before
+    it has been acknowledged by the peer, see BBSocket.flush.
+    """
+
+
 class BBSocket:
+    DEFAULT_READ_SIZE: int = 64 * 1024
+    # maximum number of packets taken from a pipe for a single send
+    MAX_COALESCE: int = 1024
+    # seconds to wait for the peer to acknowledge outstanding data on flush
+    FLUSH_TIMEOUT: float = 10.0
+    # seconds between checks of the send queue while a flush is pending
+    FLUSH_POLL: float = 1e-3
+
     def __init__(self,
                  sock: socket.socket,
                  node_id: int,
-                 conn: Connection):
+                 conn: Connection,
+                 read_size: int | None = None,
+                 sock_opts: dict[tuple[int, int], int] | None = None,
+                 receives: bool = True):
+        """
+        Args:
+            sock: The listening server socket
+            node_id: ID of the first node attached to this socket
+            conn: Pipe towards this node
+            read_size: Maximum number of bytes read per recv_into call
+            sock_opts: Options set on the accepted connection, as
+                {(level, option): value}
+            receives: Whether the node reads from its pipe, see receivers
+        """
         self.sock: socket.socket = sock
 
         # if conn is present then this socket is connected
         self.conn: Optional[socket.socket] = None
-        self.conn_in_buff: bytes = bytes()
         self.pipes: dict[int, Connection] = {node_id: conn}
+        # nodes that read from their pipe and get the horizons of the peer
+        self.receivers: set[int] = {node_id} if receives else set()
+
+        self.read_size: int = (read_size if read_size is not None
+                               else self.DEFAULT_READ_SIZE)
+
+        # Receive buffer. Bytes in [_in_start, _in_end) belong to frames that
+        # have not been fully received yet. The buffer is only compacted or
+        # grown when less than read_size bytes are free at its end.
+        self._in_buff: bytearray = bytearray(4 * self.read_size)
+        self._in_start: int = 0
+        self._in_end: int = 0
+
+        # Send buffer, all packets drained from a pipe are serialized into it
+        # and sent at once. Bytes in [_out_start, _out_end) have not been
+        # sent yet, see _send.
+        self._out_buff: bytearray = bytearray(self.read_size)
+        self._out_start: int = 0
+        self._out_end: int = 0
+        # whether the connection is watched for writability
+        self._writing: bool = False
+        # deadline of every node waiting for a flush, see check_flushed
+        self._flushing: dict[int, float] = {}
+
+        self.sock_opts: dict[tuple[int, int], int] = (
+            dict(sock_opts) if sock_opts is not None else {})
+
+        # capabilities offered to the peer and those negotiated with it, see
+        # HelloMsg
+        self.caps: int = CAPS
+        self.peer_caps: int = 0
+        # last horizon granted to the peer in ns, see HorizonMsg
+        self.horizon: int | None = None
 
         self._terminated = False
+        # command channel and selector of the runner, known once connected
+        self._cmd: Connection | None = None
+        self._sel: selectors.BaseSelector | None = None
 
     def accept(
             self, sel: selectors.BaseSelector,
@@ -43,7 +111,11 @@ class BBSocket:
         conn, addr = self.sock.accept()
         LOGGER.info(f'Received Connection Request from {addr}')
         conn.setblocking(False)
+        for (level, option), value in self.sock_opts.items():
+            conn.setsockopt(level, option, value)
         self.conn = conn
+        self._cmd = cmd
+        self._sel = sel
 
         LOGGER.debug(
             f'Selector: Registering client for {addr}'
@@ -59,40 +131,262 @@ class BBSocket:
         if self.is_terminated():
             return
 
+        self._reserve(self.read_size)
+        view = memoryview(self._in_buff)
+
         # todo: conn can be None here
-        received = self.conn.recv(1000)  # Should be ready
+        received = self.conn.recv_into(
+            view[self._in_end:], self.read_size)  # Should be ready
         if not received:
             LOGGER.info("Received Data was None")
             raise ConnectionResetError
 
-        data = self.conn_in_buff + received
+        self._in_end += received
         LOGGER.debug('Received Data from socket------------')
-        msgs, rem = DecoderSim2BB.buff2msgs(data)
-        self.conn_in_buff = rem
+        msgs, self._in_start = DecoderSim2BB.decode(
+            view, self._in_start, self._in_end)
+
+        if self._in_start == self._in_end:
+            # everything was consumed, start again at the front
+            self._in_start = self._in_end = 0
 
         for msg in msgs:
             match msg:
                 case MsgSim2BB():
                     msg: MsgSim2BB
 
-                    pkt = BBPacket(Ether(msg.data), msg.delay_ns)
+                    pkt = BBPacket.from_raw(
+                        msg.data, msg.delay_ns, DLT_EN10MB)
                     self.pipes[msg.node_id].send(pkt)
                 case EODMsg():
                     for pipe in self.pipes.values():
                         pipe.send(msg)
+                case HorizonMsg():
+                    for node_id in self.receivers:
+                        self.pipes[node_id].send(msg)
+                case HelloMsg():
+                    msg: HelloMsg
+
+                    self.peer_caps = msg.caps & self.caps
+                    LOGGER.info(f'Peer speaks version {msg.version}, '
+                                f'using capabilities {self.peer_caps:#x}')
+                    self._queue(
+                        HelloMsg(PROTOCOL_VERSION, self.peer_caps).serialize())
+                    if self.peer_caps & CAP_SYNC and self.horizon is not None:
+                        # granted before the capabilities were known
+                        self._queue(HorizonMsg(self.horizon).serialize())
+                    self._send()
                 case _:
                     err_msg = f'Type {type(msg)} is not supported'
                     raise NotImplementedError(err_msg)
 
+    def _reserve(self, nbytes: int):
+        """
+        Makes sure that at least nbytes are free at the end of the receive
+        buffer. Pending bytes are moved to the front if this creates enough
+        space, otherwise the buffer is replaced by a larger one.
+
+        Moving the pending bytes overwrites the frames decoded before. This
+        is safe as the messages of a recv are handled, and their payloads
+        copied, before the next one, see FrameDecoder.decode. The bytearray
+        itself is never resized, which would fail while views on it exist.
+        """
+        if len(self._in_buff) - self._in_end >= nbytes:
+            return
+
+        pending = self._in_end - self._in_start
+        if len(self._in_buff) - pending >= nbytes:
+            self._in_buff[:pending] = self._in_buff[
+                                      self._in_start:self._in_end]
+        else:
+            size = max(2 * len(self._in_buff), pending + nbytes)
+            LOGGER.debug(f'Growing receive buffer to {size} bytes')
+            buff = bytearray(size)
+            buff[:pending] = self._in_buff[self._in_start:self._in_end]
+            self._in_buff = buff
+
+        self._in_start = 0
+        self._in_end = pending
+
     def process_outgoing(self, pipe: Connection):
         if self._terminated:
             return
 
-        LOGGER.debug("Transmitting scapy_pkt to NS3")
-        pkt: BBPacket = pipe.recv()
+        # take everything that is currently waiting in the pipe, up to the
+        # next FlushMsg or HorizonMsg
+        pkts: list[BBPacket] = []
+        ctrl: FlushMsg | HorizonMsg | None = None
+        while True:
+            obj = pipe.recv()
+            if isinstance(obj, FlushMsg | HorizonMsg):
+                ctrl = obj
+                break
+            pkts.append(obj)
+            if len(pkts) >= self.MAX_COALESCE or not pipe.poll():
+                break
+
+        if pkts:
+            LOGGER.debug(f"Transmitting {len(pkts)} packets to NS3")
+            msgs = [MsgBB2Sim(10, pkt.to_bytes(), b'ab', b'ab')
+                    for pkt in pkts]
+            self.encode(msgs)
+            self._send()
+
+        if isinstance(ctrl, FlushMsg):
+            self.flush(pipe)
+        elif isinstance(ctrl, HorizonMsg) and \
+                (self.horizon is None or ctrl.time_ns > self.horizon):
+            # several nodes on this socket pass on the same grants
+            self.horizon = ctrl.time_ns
+            if self.peer_caps & CAP_SYNC:
+                LOGGER.debug(f'Granting horizon {ctrl.time_ns} to NS3')
+                self._queue(ctrl.serialize())
+                self._send()
+
+    def flush(self, pipe: Connection):
+        """
+        Report the node behind pipe as flushed once the peer acknowledged all
+        data sent so far, i.e., the send buffer and the kernel send queue
+        are empty. Only the deadline is recorded here, the runner keeps
+        serving all sockets and calls check_flushed until it passed.
+        """
+        node_id = next(key for key, conn in self.pipes.items()
+                       if conn is pipe)
+        self._flushing.setdefault(node_id,
+                                  time.monotonic() + self.FLUSH_TIMEOUT)
+        self.check_flushed()
+
+    def check_flushed(self) -> float | None:
+        """
+        Report the nodes waiting for a flush as flushed once nothing is
+        unacknowledged anymore, giving up after FLUSH_TIMEOUT
+
+        Returns:
+            Seconds until the next check, None if no node is waiting
+        """
+        if not self._flushing:
+            return None
+
+        unacked = self.unacked() + self._out_end - self._out_start
+        now = time.monotonic()
+        for node_id, deadline in list(self._flushing.items()):
+            if unacked > 0:
+                if now < deadline:
+                    continue
+                LOGGER.warning(f'{unacked} bytes for node {node_id} are '
+                               f'still unacknowledged')
+            del self._flushing[node_id]
+            self._cmd.send(('Flushed', node_id))
+        return self.FLUSH_POLL if self._flushing else None
+
+    def unacked(self) -> int:
+        """
+        Returns:
+            Bytes sent to the peer that it has not acknowledged yet, 0 where
+            the platform does not tell
+        """
+        if self.conn is None or not hasattr(termios, 'TIOCOUTQ'):
+            return 0
+        buff = fcntl.ioctl(self.conn.fileno(), termios.TIOCOUTQ,
+                           bytes(4))
+        return struct.unpack('i', buff)[0]
+
+    def encode(self, msgs: list[MsgBB2Sim]):
+        """
+        Serializes msgs for the peer to the end of the send buffer, as one
+        batch frame if the peer announced support for it and as single
+        frames otherwise.
+        """
+        if len(msgs) > 1 and self.peer_caps & CAP_BATCH:
+            batch = MsgBatch(msgs)
+            self._reserve_out(batch.size())
+
+            self._out_end = batch.serialize_into(self._out_buff,
+                                                 self._out_end)
+        else:
+            self._reserve_out(sum([msg.size() for msg in msgs]))
+
+            for msg in msgs:
+                self._out_end = msg.serialize_into(self._out_buff,
+                                                   self._out_end)
+
+    def _queue(self, frame: bytes):
+        """
+        Appends a serialized frame to the send buffer
+        """
+        self._reserve_out(len(frame))
+        self._out_buff[self._out_end:self._out_end + len(frame)] = frame
+        self._out_end += len(frame)
+
+    def _reserve_out(self, nbytes: int):
+        """
+        Makes sure that at least nbytes are free at the end of the send
+        buffer, see _reserve
+        """
+        if len(self._out_buff) - self._out_end >= nbytes:
+            return
+
+        pending = self._out_end - self._out_start
+        if len(self._out_buff) - pending >= nbytes:
+            self._out_buff[:pending] = self._out_buff[
+                                       self._out_start:self._out_end]
+        else:
+            buff = bytearray(max(2 * len(self._out_buff), pending + nbytes))
+            buff[:pending] = self._out_buff[self._out_start:self._out_end]
+            self._out_buff = buff
+
+        self._out_start = 0
+        self._out_end = pending
+
+    def _send(self):
+        """
+        Sends as much of the send buffer as the connection takes without
+        blocking. If bytes are left, the connection is watched for
+        writability until the rest is sent, see process_writable. Both the
+        connection and the pipes are still read meanwhile, so neither the
+        peer nor the nodes wait on us while we wait on the peer. Packets
+        arriving in between are appended to the send buffer.
+        """
+        view = memoryview(self._out_buff)
+        while self._out_start < self._out_end:
+            try:
+                sent = self.conn.send(view[self._out_start:self._out_end])
+            except BlockingIOError:
+                break
+            self._out_start += sent
+
+        pending = self._out_start < self._out_end
+        if not pending:
+            self._out_start = self._out_end = 0
+        if pending != self._writing:
+            self._writing = pending
+            events = selectors.EVENT_READ
+            if pending:
+                LOGGER.debug(f'{self._out_end - self._out_start} bytes '
+                             f'wait for the connection')
+                events |= selectors.EVENT_WRITE
+            self._sel.modify(self.conn, events,
+                             (self, self.process_incoming, [self._sel]))
 
-        msg = MsgBB2Sim(10, raw(pkt.scapy_pkt), b'ab', b'ab')
-        self.conn.sendall(msg.serialize())
+    def process_writable(self):
+        """
+        Continue sending once the connection became writable again
+        """
+        self._send()
+
+    def finish(self):
+        """
+        Sends what is left in the send buffer and the fin byte, blocking for
+        up to FLUSH_TIMEOUT. Called on shutdown, when nothing is read anymore.
+        """
+        self.conn.settimeout(self.FLUSH_TIMEOUT)
+        try:
+            self.conn.sendall(
+                memoryview(self._out_buff)[self._out_start:self._out_end])
+            self.conn.sendall(b'\x02')
+        except OSError as err:
+            LOGGER.warning(f'Could not finish the stream: {err}')
+        self._out_start = self._out_end = 0
 
     def is_terminated(self) -> bool:
         """
@@ -102,6 +396,7 @@ class BBSocket:
 
     def cleanup(self, sel: selectors.BaseSelector):
         self._terminated = True
+        self._flushing.clear()
 
         print('Client disconnected')
         sel.unregister(self.sock)
@@ -109,8 +404,11 @@ class BBSocket:
         self.sock.close()
 
         print('Indicating shutdown to all clients')
-        for conn in self.pipes.values():
+        for node_id, conn in self.pipes.items():
             sel.unregister(conn)
 
             conn.send(EODMsg())
             conn.close()
+            # nothing further can be delivered
+            if self._cmd is not None:
+                self._cmd.send(('Flushed', node_id))
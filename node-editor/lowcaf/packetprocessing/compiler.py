@@ -0,0 +1,193 @@
+"""
+Static optimizations of the processing graph that are applied once before
+the simulation starts, see PacketProcessor.compile.
+"""
+import logging
+from collections import deque
+from multiprocessing.connection import Connection
+from typing import Callable
+
+from lowcaf.nodeeditor.portid import PortID
+from lowcaf.nodes.ifaces.rnode import RNode
+from lowcaf.packetprocessing.bbpacket import BBPacket
+from lowcaf.packetprocessing.graph import topo_rank
+
+LOGGER = logging.getLogger(__name__)
+
+
+class FusedNode(RNode):
+    """
+    A linear chain of nodes executed as a single node. Every member runs
+    inline on a queue shared with its predecessor, i.e., packets never pass
+    through the selector between members. The fused node takes the ID and
+    inputs of the first member and the outputs of the last one.
+    """
+
+    def __init__(self, nodes: list[RNode]):
+        assert len(nodes) >= 2
+        head, tail = nodes[0], nodes[-1]
+        super().__init__(head.id, head.nr_inputs, tail.nr_outputs)
+
+        self.nodes: list[RNode] = nodes
+
+        # the chain stays in the main process if any member has to
+        self.gui_bound = any(node.gui_bound for node in nodes)
+        self.stateless = all(node.stateless for node in nodes)
+        self.stage = next(
+            (node.stage for node in nodes if node.stage is not None), None)
+
+        # queue i is output of member i and input of member i + 1
+        self._queues: list[list[deque[BBPacket]]] = [
+            [deque()] for _ in nodes[:-1]
+        ]
+
+    def __str__(self):
+        return ' -> '.join(f'{type(n).__name__}({n.id})' for n in self.nodes)
+
+    def process(
+            self,
+            inputs: list[deque[BBPacket]],
+            outputs: list[list[BBPacket]]):
+        self.process_batch(inputs, outputs, 1)
+
+    def process_batch(
+            self,
+            inputs: list[deque[BBPacket]],
+            outputs: list[list[BBPacket]],
+            budget: int) -> int:
+        done = 0
+        if self.nodes[0].is_ready(inputs):
+            done = self.nodes[0].process_batch(
+                inputs, self._queues[0], budget)
+
+        # pass the packets along the chain, members only ever see their
+        # predecessor's output. Every member gets the budget, which is
+        # limited by the headroom downstream of the tail, so members that
+        # emit several packets per step overshoot it no more than unfused.
+        # What is left in between is processed on the next call.
+        last = len(self.nodes) - 1
+        for idx in range(1, last + 1):
+            node_in = self._queues[idx - 1]
+            node_out = outputs if idx == last else self._queues[idx]
+            if self.nodes[idx].is_ready(node_in):
+                self.nodes[idx].process_batch(node_in, node_out, budget)
+        return done
+
+    def is_ready(self, inputs: list[deque[BBPacket]]) -> bool:
+        if self.nodes[0].is_ready(inputs):
+            return True
+
+        # members that could not consume everything during the last call
+        return any(node.is_ready(queues) for node, queues in
+                   zip(self.nodes[1:], self._queues))
+
+    def waitable(self) -> list:
+        return [obj for node in self.nodes for obj in node.waitable()]
+
+    def horizon(self) -> int | None:
+        return min((horizon for node in self.nodes
+                    if (horizon := node.horizon()) is not None),
+                   default=None)
+
+    def grant(self, horizon: int):
+        for node in self.nodes:
+            node.grant(horizon)
+
+    def setup(self, reg_socks: Callable[[str, int, int], Connection]):
+        for node in self.nodes:
+            node.setup(reg_socks)
+
+    def teardown(self):
+        for node in self.nodes:
+            node.teardown()
+
+    @staticmethod
+    def create_from_inode(inode) -> 'RNode':
+        raise NotImplementedError('Fused nodes only exist at runtime')
+
+
+def find_chains(
+        nodes: dict[int, RNode],
+        links: dict[int, dict[int, PortID]]) -> list[list[int]]:
+    """
+    Find the maximal chains of nodes that can be fused. Two nodes are
+    fused if the first has a single output, which is connected to the second
+    node, and the second has a single input. Nodes with fusable set to False
+    are never fused, neither are nodes placed in different stages.
+
+    Args:
+        nodes: The nodes of the graph by ID
+        links: The links of the graph
+
+    Returns:
+        The IDs of the members of each chain with at least two members, in
+        processing order. Chains are ordered topologically by their heads.
+    """
+    nxt: dict[int, int] = {}
+    prv: dict[int, int] = {}
+    for src_id, ports in links.items():
+        src = nodes[src_id]
+        if src.nr_outputs != 1 or 0 not in ports:
+            continue
+
+        tgt = nodes[ports[0].obj_id]
+        if tgt.nr_inputs != 1 or tgt is src:
+            continue
+        if not (src.fusable and tgt.fusable):
+            continue
+        if src.stage is not None and tgt.stage is not None and \
+                src.stage != tgt.stage:
+            continue
+
+        nxt[src.id] = tgt.id
+        prv[tgt.id] = src.id
+
+    # chains start at nodes with a successor but no predecessor, which also
+    # leaves out rings of 1-in/1-out nodes
+    rank = topo_rank(nodes.keys(), links)
+    heads = sorted((node_id for node_id in nxt if node_id not in prv),
+                   key=lambda node_id: (rank[node_id], node_id))
+
+    chains = []
+    for head in heads:
+        chain = [head]
+        while chain[-1] in nxt:
+            chain.append(nxt[chain[-1]])
+        chains.append(chain)
+    return chains
+
+
+def fuse_chains(
+        nodes: dict[int, RNode],
+        links: dict[int, dict[int, PortID]]
+) -> tuple[dict[int, RNode], dict[int, dict[int, PortID]], list[list[int]]]:
+    """
+    Replace all fusable chains by FusedNodes
+
+    Args:
+        nodes: The nodes of the graph by ID
+        links: The links of the graph
+
+    Returns:
+        nodes, links, chains: The new graph and the fused chains. Links
+        into a chain keep pointing at its head, whose ID the fused node
+        takes over. Links out of the chain are taken from its tail.
+    """
+    nodes = dict(nodes)
+    links = {node_id: dict(ports) for node_id, ports in links.items()}
+
+    chains = find_chains(nodes, links)
+    for chain in chains:
+        fused = FusedNode([nodes[node_id] for node_id in chain])
+        LOGGER.info(f'Fusing {fused}')
+
+        tail_links = links.get(chain[-1])
+        for node_id in chain:
+            links.pop(node_id, None)
+            del nodes[node_id]
+
+        nodes[fused.id] = fused
+        if tail_links is not None:
+            links[fused.id] = tail_links
+
+    return nodes, links, chains
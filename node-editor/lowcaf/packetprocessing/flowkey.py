@@ -0,0 +1,109 @@
+"""
+Keys to distribute the packets of a stream across the replicas of a sharded
+stage, see PacketProcessor.shard. Packets with the same key are processed by
+the same replica. Keys are computed from the raw bytes, so packets are not
+dissected for it.
+"""
+import zlib
+from typing import Callable
+
+from lowcaf.packetprocessing.bbpacket import BBPacket, LINKTYPE_LORATAP, \
+    DECODE_LORA_PHY
+
+KEY_FLOW: str = 'flow'  # IP 5-tuple, both directions share the key
+KEY_DEVADDR: str = 'devaddr'  # LoRaWAN DevAddr, DevEUI for join requests
+KEY_ROUND_ROBIN: str = 'round_robin'  # No key, packets are dealt in turn
+
+LINKTYPE_ETHERNET: int = 1
+LINKTYPE_RAW: tuple[int, ...] = (12, 101, 228, 229)  # IP without link layer
+
+ETHERTYPES_VLAN: tuple[int, ...] = (0x8100, 0x88a8, 0x9100)
+ETHERTYPES_IP: tuple[int, ...] = (0x0800, 0x86dd)
+PROTOCOLS_WITH_PORTS: tuple[int, ...] = (6, 17, 132)  # TCP, UDP, SCTP
+
+
+def _ip_offset(data: bytes, linktype: int | str) -> int | None:
+    """
+    Returns:
+        Offset of the IP header, None if the packet does not carry IP
+    """
+    if linktype in LINKTYPE_RAW:
+        return 0
+    if linktype != LINKTYPE_ETHERNET:
+        return None
+
+    offset = 12
+    ethertype = int.from_bytes(data[offset:offset + 2], 'big')
+    while ethertype in ETHERTYPES_VLAN:
+        offset += 4
+        ethertype = int.from_bytes(data[offset:offset + 2], 'big')
+    return offset + 2 if ethertype in ETHERTYPES_IP else None
+
+
+def flow_key(pkt: BBPacket) -> int:
+    """
+    Hash of protocol, addresses and ports. Fragmented IPv4 packets are keyed
+    without ports, so all fragments of a datagram end up together. Packets
+    without IP are keyed by their link layer addresses.
+    """
+    data = pkt.to_bytes()
+    offset = _ip_offset(data, pkt.linktype)
+    if offset is None or len(data) <= offset:
+        return zlib.crc32(data[:12])
+
+    version = data[offset] >> 4
+    l4: int | None
+    if version == 4 and len(data) >= offset + 20:
+        proto = data[offset + 9]
+        src = data[offset + 12:offset + 16]
+        dst = data[offset + 16:offset + 20]
+        fragmented = int.from_bytes(data[offset + 6:offset + 8], 'big') \
+            & 0x3fff
+        l4 = None if fragmented else offset + (data[offset] & 0x0f) * 4
+    elif version == 6 and len(data) >= offset + 40:
+        proto = data[offset + 6]
+        src = data[offset + 8:offset + 24]
+        dst = data[offset + 24:offset + 40]
+        l4 = offset + 40
+    else:
+        return zlib.crc32(data[:12])
+
+    if proto in PROTOCOLS_WITH_PORTS and l4 is not None and \
+            len(data) >= l4 + 4:
+        src += data[l4:l4 + 2]
+        dst += data[l4 + 2:l4 + 4]
+
+    if src > dst:
+        src, dst = dst, src
+    return zlib.crc32(bytes([proto]) + src + dst)
+
+
+def devaddr_key(pkt: BBPacket) -> int:
+    """
+    Hash of the DevAddr of LoRaWAN data frames or the DevEUI of join
+    requests. All other frames get key 0.
+    """
+    data = pkt.to_bytes()
+    if pkt.linktype == LINKTYPE_LORATAP:
+        # skip the tap header, its length is stored after version and pad
+        data = data[int.from_bytes(data[2:4], 'big'):]
+    elif pkt.linktype != DECODE_LORA_PHY:
+        return 0
+
+    if not data:
+        return 0
+
+    mtype = data[0] >> 5
+    if 2 <= mtype <= 5 and len(data) >= 5:
+        return zlib.crc32(data[1:5])
+    if mtype == 0 and len(data) >= 17:
+        return zlib.crc32(data[9:17])
+    return 0
+
+
+# None deals the packets in turn
+KEYS: dict[str, Callable[[BBPacket], int] | None] = {
+    KEY_FLOW: flow_key,
+    KEY_DEVADDR: devaddr_key,
+    KEY_ROUND_ROBIN: None,
+}
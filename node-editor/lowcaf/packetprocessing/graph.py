@@ -0,0 +1,98 @@
+"""
+Helpers to reason about the topology of the processing graph, i.e., the
+links as stored by the PacketProcessor ({src_id: {out_port: PortID}}).
+"""
+from collections import deque
+from typing import Iterable
+
+from lowcaf.nodeeditor.portid import PortID
+
+
+def successors(
+        node_ids: Iterable[int],
+        links: dict[int, dict[int, PortID]]) -> dict[int, set[int]]:
+    """
+    Args:
+        node_ids: IDs of all nodes in the graph
+        links: The links of the graph
+
+    Returns:
+        For every node the IDs of the nodes directly connected to its outputs
+    """
+    succ = {node_id: set() for node_id in node_ids}
+    for src_id, ports in links.items():
+        for tgt in ports.values():
+            succ[src_id].add(tgt.obj_id)
+    return succ
+
+
+def topo_rank(
+        node_ids: Iterable[int],
+        links: dict[int, dict[int, PortID]]) -> dict[int, int]:
+    """
+    Rank every node by the length of the longest path from a source to it.
+    Downstream nodes therefore always have a higher rank than the nodes
+    feeding them.
+
+    Nodes that are part of a cycle have no topological order. They get a
+    rank above all other nodes.
+
+    Args:
+        node_ids: IDs of all nodes in the graph
+        links: The links of the graph
+
+    Returns:
+        The rank of each node
+    """
+    rank, _ = _longest_paths(successors(node_ids, links))
+    return rank
+
+
+def has_cycle(
+        node_ids: Iterable[int],
+        links: dict[int, dict[int, PortID]]) -> bool:
+    """
+    Args:
+        node_ids: IDs of all nodes in the graph
+        links: The links of the graph
+
+    Returns:
+        Whether the graph contains at least one cycle
+    """
+    rank, done = _longest_paths(successors(node_ids, links))
+    return len(done) < len(rank)
+
+
+def _longest_paths(
+        succ: dict[int, set[int]]) -> tuple[dict[int, int], set[int]]:
+    """
+    Kahn's algorithm, see topo_rank
+
+    Returns:
+        rank, done: The rank of every node and the nodes that are neither
+        part of nor downstream of a cycle
+    """
+    in_deg = {node_id: 0 for node_id in succ}
+    for tgts in succ.values():
+        for tgt in tgts:
+            in_deg[tgt] += 1
+
+    rank = {node_id: 0 for node_id in succ}
+    todo = deque(node_id for node_id, deg in in_deg.items() if deg == 0)
+    done = set()
+    while todo:
+        node_id = todo.popleft()
+        done.add(node_id)
+        for tgt in succ[node_id]:
+            rank[tgt] = max(rank[tgt], rank[node_id] + 1)
+            in_deg[tgt] -= 1
+            if in_deg[tgt] == 0:
+                todo.append(tgt)
+
+    cyclic = rank.keys() - done
+    if cyclic:
+        top = max(rank.values(), default=0) + 1
+        for node_id in cyclic:
+            rank[node_id] = top
+
+    return rank, done
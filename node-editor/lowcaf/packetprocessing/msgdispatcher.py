@@ -52,8 +52,15 @@ def socket_runner(bb_socks: list[BBSocket], cmd: Connection):
     try:
         # actual core loop
         while True:
+            # sockets waiting for a flush are checked again after a timeout
+            timeout = None
+            for bb_sock in bb_socks:
+                delay = bb_sock.check_flushed()
+                if delay is not None and (timeout is None or delay < timeout):
+                    timeout = delay
+
             LOGGER.debug('Waiting on next batch of messages')
-            exec_sel(sel)
+            exec_sel(sel, timeout)
 
     except ShutDownReceivedError:
         print('Terminating Socket Runner')
@@ -64,36 +71,60 @@ def socket_runner(bb_socks: list[BBSocket], cmd: Connection):
             print('Sending fin to all sockets')
             # todo: shutdown received
             if not bb_sock.is_terminated():
-                bb_sock.conn.send(b'\x02')
+                bb_sock.finish()
 
 
-def exec_sel(sel: selectors.BaseSelector):
-    events = sel.select()
+def exec_sel(sel: selectors.BaseSelector, timeout: float | None = None):
+    events = sel.select(timeout)
     LOGGER.debug(f'Received {len(events)} events')
     for key, mask in events:
         LOGGER.debug(f'{key}: {mask}')
-        if key.data == (None, 'Terminate'):
-            LOGGER.debug('Received Terminate --> Shutdown')
-            raise ShutDownReceivedError
-
-        bbsock: BBSocket = key.data[0]
-        callback = key.data[1]
-
-        if callback is None:
-            LOGGER.debug('No Callback --> Shutdown')
-            raise ShutDownReceivedError
-
-        # todo: for some reason the bbsock can be None, maybe we skip this
-        #  case completely
-        if bbsock is None:
-            LOGGER.debug('Socket None --> Continue')
-            continue
-        if not bbsock.is_terminated():
-            LOGGER.debug(f'{key.data[2]}')
-
-            try:
-                callback(*key.data[2])
-            except ConnectionResetError:
-                bbsock.cleanup(sel)
-        else:
-            LOGGER.debug('Socket already terminated')
+        dispatch(sel, key.fileobj, key.data, mask)
+
+
+def dispatch(sel: selectors.BaseSelector,
+             fileobj,
+             data: tuple,
+             mask: int = selectors.EVENT_READ):
+    """
+    Serve an object registered by socket_runner or SocketThread
+
+    Args:
+        sel: The selector the object is registered with
+        fileobj: The ready object
+        data: (BBSocket, callback, args) as registered, the callback is
+            called with args if the object is readable
+        mask: The events the object is ready for. A connection is only
+            watched for writability while its BBSocket has bytes to send,
+            see BBSocket.process_writable.
+    """
+    if data == (None, 'Terminate'):
+        LOGGER.debug('Received Terminate --> Shutdown')
+        raise ShutDownReceivedError
+
+    bbsock: BBSocket = data[0]
+    callback = data[1]
+
+    if callback is None:
+        LOGGER.debug('No Callback --> Shutdown')
+        raise ShutDownReceivedError
+
+    # todo: for some reason the bbsock can be None, maybe we skip this
+    #  case completely
+    if bbsock is None:
+        LOGGER.debug('Socket None --> Continue')
+        return
+    if not bbsock.is_terminated():
+        LOGGER.debug(f'{data[2]}')
+
+        try:
+            if mask & selectors.EVENT_WRITE:
+                bbsock.process_writable()
+            if mask & selectors.EVENT_READ:
+                callback(*data[2])
+        except ConnectionResetError:
+            bbsock.cleanup(sel)
+    else:
+        # e.g. the closed client connection, which stays readable
+        LOGGER.debug('Socket already terminated')
+        sel.unregister(fileobj)
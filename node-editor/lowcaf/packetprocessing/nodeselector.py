@@ -1,7 +1,9 @@
+import heapq
 import logging
 from abc import ABC, abstractmethod
 from collections import deque
 
+from lowcaf.packetprocessing.graph import topo_rank
 from lowcaf.packetprocessing.nodestate import NodeState
 
 from typing import TYPE_CHECKING
@@ -15,12 +17,19 @@ class NodeSelector(ABC):
     """
     The node selector defines the strategy on how the next node to be
     processed is selected.
+
+    A selected node may process up to budget packets before the selector
+    moves its outputs along and selects again.
     """
 
+    DEFAULT_BUDGET: int = 64
+
+    budget: int = DEFAULT_BUDGET
+
     def gen_nodes(self, pp: 'PacketProcessor'):
         while not self.is_finished():
             ns = self.select_next()
-            ns.process()
+            ns.process_batch(self.budget)
             self.update(pp, ns)
 
     @abstractmethod
@@ -43,6 +52,16 @@ class NodeSelector(ABC):
         """
         raise NotImplementedError
 
+    @abstractmethod
+    def wake(self, node_state: 'NodeState'):
+        """
+        Select the node again if it became ready by an event outside of the
+        graph, e.g., data arriving from another process
+        Args:
+            node_state: The NodeState object that might be ready
+        """
+        raise NotImplementedError
+
     @abstractmethod
     def is_finished(self) -> bool:
         """
@@ -56,46 +75,126 @@ class NodeSelector(ABC):
 
 
 class PrioritySelector(NodeSelector):
-    def __init__(self, pp: 'PacketProcessor'):
+    def __init__(self,
+                 pp: 'PacketProcessor',
+                 budget: int = NodeSelector.DEFAULT_BUDGET):
         """
         The priority selector is a simple implementation of a selector
         that will just store the nodes in a priority queue.
 
+        Membership in the ready queue is tracked by NodeState.queued, so
+        checking whether a node is already queued takes constant time.
+
         Args:
             pp: The PacketProcessor obj
+            budget: Packets a node may process per selection
         """
+        self.budget: int = budget
         self.rdy: deque[NodeState] = deque()
 
         LOGGER.info("Initializing PrioritySelector")
         node_state: NodeState
         for node_state in pp.nodes.values():
+            node_state.queued = False
             state = node_state.is_ready()
             # print(node_state.viz())
             if state:
-                self.rdy.append(node_state)
+                self._push(node_state)
+
+    def _push(self, node_state: 'NodeState'):
+        node_state.queued = True
+        self.rdy.append(node_state)
 
     def select_next(self) -> 'NodeState':
-        return self.rdy.popleft()
+        node_state = self.rdy.popleft()
+        node_state.queued = False
+        return node_state
 
     def update(self, pp: 'PacketProcessor', node_state: 'NodeState'):
-        for idx, items in enumerate(node_state.outputs):
-            tgt_port = pp.links[node_state.node.id][idx]
-
-            tgt_in = pp.nodes[tgt_port.obj_id].inputs[tgt_port.port]
-            tgt_in.extend(items)
-            items.clear()
+        # for all nodes to which we pushed new packets check if they are
+        # now ready
+        for nodes_state_tgt in node_state.fed_targets():
+            if not nodes_state_tgt.queued and nodes_state_tgt.is_ready():
+                self._push(nodes_state_tgt)
 
-            # for all nodes to which we pushed new scapy_pkt check if
-            # they are now ready
-            nodes_state_tgt = pp.nodes[tgt_port.obj_id]
-            if (nodes_state_tgt.is_ready() and nodes_state_tgt not in
-                    self.rdy):
-                self.rdy.append(nodes_state_tgt)
+        # nodes stopped by backpressure may continue once we consumed
+        for up in node_state.upstream:
+            if up.blocked and not up.queued and up.is_ready():
+                self._push(up)
 
         # finally check if we are still ready
         # important for sources, as they are not triggered above
-        if node_state.is_ready() and node_state not in self.rdy:
-            self.rdy.append(node_state)
+        if not node_state.queued and node_state.is_ready():
+            self._push(node_state)
+
+    def wake(self, node_state: 'NodeState'):
+        if not node_state.queued and node_state.is_ready():
+            self._push(node_state)
+
+    def is_finished(self) -> bool:
+        return len(self.rdy) <= 0
+
+
+class TopoSelector(NodeSelector):
+    def __init__(self,
+                 pp: 'PacketProcessor',
+                 budget: int = NodeSelector.DEFAULT_BUDGET):
+        """
+        Selects ready nodes by topological rank, nodes closer to the sinks
+        first. Packets are thus drained through the graph before sources
+        produce new ones, which keeps the queues short.
+
+        Membership in the ready queue is tracked by NodeState.queued, so
+        update does not need to search the queue.
+
+        Args:
+            pp: The PacketProcessor obj
+            budget: Packets a node may process per selection
+        """
+        LOGGER.info("Initializing TopoSelector")
+        self.budget: int = budget
+        rank = topo_rank(pp.nodes.keys(), pp.links)
+
+        # heap entries are (-rank, node_id, node_state), the first two
+        # elements are unique so node states are never compared
+        self.rdy: list[tuple[int, int, NodeState]] = []
+        self._keys: dict[int, tuple[int, int]] = {
+            node_id: (-rank[node_id], node_id) for node_id in pp.nodes
+        }
+
+        node_state: NodeState
+        for node_state in pp.nodes.values():
+            node_state.queued = False
+            if node_state.is_ready():
+                self._push(node_state)
+
+    def _push(self, node_state: 'NodeState'):
+        node_state.queued = True
+        heapq.heappush(
+            self.rdy, (*self._keys[node_state.node.id], node_state))
+
+    def select_next(self) -> 'NodeState':
+        node_state = heapq.heappop(self.rdy)[2]
+        node_state.queued = False
+        return node_state
+
+    def update(self, pp: 'PacketProcessor', node_state: 'NodeState'):
+        for tgt in node_state.fed_targets():
+            if not tgt.queued and tgt.is_ready():
+                self._push(tgt)
+
+        # nodes stopped by backpressure may continue once we consumed
+        for up in node_state.upstream:
+            if up.blocked and not up.queued and up.is_ready():
+                self._push(up)
+
+        # sources are not triggered above
+        if not node_state.queued and node_state.is_ready():
+            self._push(node_state)
+
+    def wake(self, node_state: 'NodeState'):
+        if not node_state.queued and node_state.is_ready():
+            self._push(node_state)
 
     def is_finished(self) -> bool:
-        return len(self.rdy) <= 0
\ No newline at end of file
+        return len(self.rdy) <= 0
@@ -1,4 +1,5 @@
 from collections import deque
+from typing import Iterator, Optional
 
 from lowcaf.nodes.ifaces.rnode import RNode
 
@@ -12,15 +13,138 @@ class NodeState:
         for _ in range(self.node.nr_inputs):
             self.inputs.append(deque())
 
-        self.outputs: list[list] = []
+        # connected outputs are the input queues of the downstream nodes,
+        # see connect. Unconnected ones discard what is put into them.
+        self.outputs: list[deque] = []
         for _ in range(self.node.nr_outputs):
-            self.outputs.append([])
+            self.outputs.append(deque())
+
+        # whether the node currently waits in a selector's ready queue
+        self.queued: bool = False
+
+        # (target, input port) for every output, see connect
+        self.targets: list[Optional[tuple['NodeState', int]]] = \
+            [None] * self.node.nr_outputs
+        # nodes feeding this node, to be woken up once its inputs drain
+        self.upstream: list['NodeState'] = []
+
+        # backpressure: a node stops once any of its downstream queues
+        # reaches the high-water mark and resumes once all of them are at or
+        # below the low-water mark again. None means unbounded. The limit is
+        # checked per process step, so nodes emitting several packets per
+        # step may overshoot it.
+        self.high_water: list[Optional[int]] = [None] * self.node.nr_outputs
+        self.low_water: list[Optional[int]] = [None] * self.node.nr_outputs
+        self.blocked: bool = False
+
+        # maximum length every input queue has reached
+        self.peaks: list[int] = [0] * self.node.nr_inputs
+
+    def connect(self,
+                out_port: int,
+                target: 'NodeState',
+                in_port: int,
+                high_water: int | None = None,
+                low_water: int | None = None):
+        """
+        Connect an output of this node to the input of another node
+
+        Args:
+            out_port: The output of this node
+            target: The node receiving the packets
+            in_port: The input of target
+            high_water: Queue length of the target input at which this node
+                stops. None for an unbounded queue
+            low_water: Queue length at which this node resumes, defaults to
+                half of high_water
+        """
+        if high_water is not None:
+            if high_water < 1:
+                raise ValueError(f'Invalid high-water mark: {high_water}')
+            if low_water is None:
+                low_water = high_water // 2
+            if not 0 <= low_water < high_water:
+                raise ValueError(f'Invalid low-water mark: {low_water}')
+
+        self.targets[out_port] = (target, in_port)
+        self.outputs[out_port] = target.inputs[in_port]
+        self.high_water[out_port] = high_water
+        self.low_water[out_port] = low_water
+        if self not in target.upstream:
+            target.upstream.append(self)
+
+    def has_capacity(self) -> bool:
+        """
+        Whether all downstream queues can take more packets. Applies
+        hysteresis between the high- and low-water marks, a blocked node
+        needs all of them at or below the low-water mark. The state is only
+        changed by update_blocked.
+        """
+        if self.blocked:
+            for target, low in zip(self.targets, self.low_water):
+                if low is not None and \
+                        len(target[0].inputs[target[1]]) > low:
+                    return False
+        else:
+            for target, high in zip(self.targets, self.high_water):
+                if high is not None and \
+                        len(target[0].inputs[target[1]]) >= high:
+                    return False
+        return True
+
+    def update_blocked(self):
+        """
+        Block the node after it processed, the only time its downstream
+        queues grow. It could only process with capacity, so it is released
+        until any of them reaches the high-water mark.
+        """
+        self.blocked = any(
+            high is not None and len(target[0].inputs[target[1]]) >= high
+            for target, high in zip(self.targets, self.high_water))
+
+    def headroom(self, budget: int) -> int:
+        """
+        Limit budget to the space left in the downstream queues, but always
+        allow at least one step
+        """
+        for target, high in zip(self.targets, self.high_water):
+            if high is not None:
+                budget = min(budget, high - len(target[0].inputs[target[1]]))
+        return max(budget, 1)
+
+    def fed_targets(self) -> Iterator['NodeState']:
+        """
+        The packets are already in the downstream queues once process
+        returns. This only determines whom to notify.
+
+        Returns:
+            The connected nodes that have packets waiting from this node
+        """
+        for out, target in zip(self.outputs, self.targets):
+            if target is None:
+                out.clear()
+                continue
+            if not out:
+                continue
+
+            tgt, port = target
+            if len(out) > tgt.peaks[port]:
+                tgt.peaks[port] = len(out)
+            yield tgt
 
     def is_ready(self):
-        return self.node.is_ready(self.inputs)
+        return self.has_capacity() and self.node.is_ready(self.inputs)
 
     def process(self) -> list[list]:
-        return self.node.process(self.inputs, self.outputs)
+        result = self.node.process(self.inputs, self.outputs)
+        self.update_blocked()
+        return result
+
+    def process_batch(self, budget: int) -> int:
+        done = self.node.process_batch(
+            self.inputs, self.outputs, self.headroom(budget))
+        self.update_blocked()
+        return done
 
     def viz(self) -> str:
         ts = ('{name}({id}):\n\tinputs: {inputs}\n\toutputs: {'
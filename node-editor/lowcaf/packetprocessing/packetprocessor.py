@@ -7,23 +7,64 @@ import time
 import logging
 
 from multiprocessing import Pipe, Process
-from multiprocessing.connection import Connection
+from multiprocessing.connection import Connection, wait
+from typing import Callable
 
-from lowcaf.packetprocessing.nodeselector import PrioritySelector
+from lowcaf.packetprocessing.nodeselector import NodeSelector, \
+    PrioritySelector
 from lowcaf.packetprocessing.nodestate import NodeState
 from lowcaf.nodeeditor.portid import PortID
 from lowcaf.nodes.ifaces.rnode import RNode
-from lowcaf.packetprocessing.bbsocket import BBSocket
+from lowcaf.packetprocessing.bbpacket import BBPacket, CAP_SYNC, \
+    HORIZON_END
+from lowcaf.packetprocessing.bbsocket import BBSocket, FlushMsg
 from lowcaf.packetprocessing.msgdispatcher import socket_runner
+from lowcaf.packetprocessing.compiler import FusedNode, fuse_chains
+from lowcaf.packetprocessing.flowkey import KEY_FLOW, KEYS
+from lowcaf.packetprocessing.pipeline import MAIN_STAGE, Pipeline, \
+    Sharding, partition, split
+from lowcaf.packetprocessing.shmring import ShmRing, shm_pipe
+from lowcaf.packetprocessing.transport import TRANSPORT_ASYNCIO, \
+    TRANSPORT_PROCESS, TRANSPORT_SHM, TRANSPORTS, SocketThread, local_pipe
 
 LOGGER = logging.getLogger(__name__)
 
 
 class PacketProcessor:
+    IDLE_TIMEOUT: float = 1.0  # Seconds to block on idle nodes per wait
+    # Seconds to wait for the sockets to deliver everything after the run
+    FLUSH_TIMEOUT: float = 30.0
+    # Simulation time in ns ns-3 may run ahead of the packets it sent us,
+    # see grant_horizon
+    LOOKAHEAD_NS: int = 1_000_000
+
     def __init__(
             self,
             nodes: dict[int, RNode],
-            links: dict[int, dict[int, PortID]]):
+            links: dict[int, dict[int, PortID]],
+            capacity: int | None = None,
+            transport: str = TRANSPORT_PROCESS):
+        """
+        Args:
+            nodes: The nodes of the graph by ID
+            links: For every node a mapping of its outputs to the connected
+                inputs
+            capacity: Default high-water mark of every link, i.e., the
+                number of packets queued at an input before the feeding node
+                is stopped. None, the default, for unbounded queues. Bounded
+                queues stall graphs that wait for packets on one input while
+                another one is full, see check_stalled and set_capacity.
+            transport: How packets get between the sockets and the nodes.
+                TRANSPORT_PROCESS serves the sockets from a separate process
+                and pickles the packets through pipes. TRANSPORT_ASYNCIO
+                serves them from an event loop thread of this process and
+                passes the packets by reference. TRANSPORT_SHM serves them
+                from a separate process and copies the raw packets through
+                shared memory, see transport.
+        """
+        if transport not in TRANSPORTS:
+            raise ValueError(f'Unknown transport: {transport}')
+        self.transport: str = transport
 
         self.nodes: dict[int, NodeState] = {}
 
@@ -36,9 +77,26 @@ class PacketProcessor:
             self.nodes[key] = NodeState(rnode)
 
         self.links: dict[int, dict[int, PortID]] = links
+        self.capacity: int | None = capacity
+        self._connect({})
 
         self.socks: list[BBSocket] = []
 
+        # the graph before compile, which pipeline splits up instead
+        self._unfused: tuple[dict[int, RNode], dict[int, dict[int, PortID]],
+                             dict[tuple[int, int], tuple[int, int]]] | None \
+            = None
+        # replicated stages by ID, see shard
+        self._shards: dict[int, Sharding] = {}
+        # nodes run by worker processes during the last drive
+        self._remote: set[int] = set()
+        # shared memory behind the socket connections, see TRANSPORT_SHM
+        self._rings: list[ShmRing] = []
+        # the nodes' ends of the socket connections by node ID
+        self._sock_conns: dict[int, Connection] = {}
+        # last horizon passed to grant
+        self._granted: int = -1
+
     @staticmethod
     def new_socket(
             ip_address: str,
@@ -54,23 +112,233 @@ class PacketProcessor:
     def register_socket(self,
                         ip_address: str,
                         port: int,
-                        node_id: int) -> Connection:
+                        node_id: int,
+                        read_size: int | None = None,
+                        sock_opts: dict[tuple[int, int], int] | None = None,
+                        receives: bool = True
+                        ) -> Connection:
+        """
+        Registers a node for the socket at ip_address:port. Nodes sharing the
+        same address also share the socket.
+
+        Args:
+            ip_address: Address to listen on
+            port: Port to listen on
+            node_id: ID of the registering node
+            read_size: Number of bytes to read per syscall on this socket.
+                If several nodes request a size, the largest is used.
+            sock_opts: Options for the accepted connection as
+                {(level, option): value}. Options of all nodes sharing the
+                socket are merged.
+            receives: Whether the node reads packets from the socket. Only
+                those nodes are passed the horizons of ns-3, see HorizonMsg.
+
+        Returns:
+            conn: The node's end of the pipe to the socket
+        """
 
-        pp_conn, node_conn = Pipe()
+        if self.transport == TRANSPORT_ASYNCIO:
+            pp_conn, node_conn = local_pipe()
+        elif self.transport == TRANSPORT_SHM:
+            pp_conn, node_conn, rings = shm_pipe(node_id)
+            self._rings.extend(rings)
+        else:
+            pp_conn, node_conn = Pipe()
+        self._sock_conns[node_id] = node_conn
 
         for bbsock in self.socks:
             if bbsock.sock.getsockname() == (ip_address, port):
                 LOGGER.info(f'Reusing existing socket for {ip_address}:{port}')
                 bbsock.pipes[node_id] = pp_conn
+                if receives:
+                    bbsock.receivers.add(node_id)
+                if read_size is not None:
+                    bbsock.read_size = max(bbsock.read_size, read_size)
+                if sock_opts is not None:
+                    bbsock.sock_opts |= sock_opts
                 break
         else:
             # socket does not yet exist
             sock = self.new_socket(ip_address, port)
-            bbsock = BBSocket(sock, node_id, pp_conn)
+            bbsock = BBSocket(sock, node_id, pp_conn, read_size, sock_opts,
+                              receives)
             self.socks.append(bbsock)
 
         return node_conn
 
+    def _connect(self, limits: dict[tuple[int, int], tuple[int, int]]):
+        """
+        Wire the node states according to the links
+
+        Args:
+            limits: High- and low-water marks by (node_id, out_port), links
+                not contained use the default capacity
+        """
+        for node_id, ports in self.links.items():
+            for out_port, tgt in ports.items():
+                high, low = limits.get(
+                    (node_id, out_port), (self.capacity, None))
+                self.nodes[node_id].connect(
+                    out_port, self.nodes[tgt.obj_id], tgt.port, high, low)
+
+    def _limits(self) -> dict[tuple[int, int], tuple[int, int]]:
+        """
+        Returns:
+            The high- and low-water marks of all links by (node_id, out_port)
+        """
+        return {
+            (node_id, out_port): (node_state.high_water[out_port],
+                                  node_state.low_water[out_port])
+            for node_id, node_state in self.nodes.items()
+            for out_port in self.links.get(node_id, {})
+        }
+
+    def compile(self) -> list[list[int]]:
+        """
+        Fuse linear chains of nodes into single nodes, see
+        compiler.fuse_chains. Packets then pass through a chain within one
+        selection instead of one per member. Call this after setup and
+        before drive.
+
+        Returns:
+            The IDs of the fused chains
+        """
+        limits = self._limits()
+
+        rnodes = {node_id: node_state.node
+                  for node_id, node_state in self.nodes.items()}
+        self._unfused = (rnodes, self.links, dict(limits))
+        rnodes, self.links, chains = fuse_chains(rnodes, self.links)
+
+        for chain in chains:
+            # the fused node feeds what the tail fed before
+            for out_port in self.links.get(chain[0], {}):
+                limits[(chain[0], out_port)] = limits[(chain[-1], out_port)]
+
+        self.nodes = {node_id: NodeState(rnode)
+                      for node_id, rnode in rnodes.items()}
+        self._connect(limits)
+
+        LOGGER.info(f'Fused {len(chains)} chains with '
+                    f'{sum(len(chain) for chain in chains)} nodes')
+        return chains
+
+    def set_capacity(self,
+                     node_id: int,
+                     out_port: int,
+                     high_water: int | None,
+                     low_water: int | None = None):
+        """
+        Set the queue limits of a single link
+
+        Args:
+            node_id: ID of the node feeding the link
+            out_port: Output of that node
+            high_water: Queue length at which the feeding node stops, None
+                for an unbounded queue
+            low_water: Queue length at which it resumes, defaults to half of
+                high_water
+        """
+        tgt = self.links[node_id][out_port]
+        self.nodes[node_id].connect(
+            out_port, self.nodes[tgt.obj_id], tgt.port, high_water,
+            low_water)
+
+    def queue_peaks(self) -> dict[tuple[int, int], int]:
+        """
+        Returns:
+            The maximum queue length of every link during the run as
+            {(src_node_id, out_port): peak}
+        """
+        return {
+            (node_id, out_port): self.nodes[tgt.obj_id].peaks[tgt.port]
+            for node_id, ports in self.links.items()
+            for out_port, tgt in ports.items()
+        }
+
+    def report_queues(self):
+        print('Peak queue depth per link:')
+        for (node_id, out_port), peak in self.queue_peaks().items():
+            node_state = self.nodes[node_id]
+            tgt = self.links[node_id][out_port]
+            high = node_state.high_water[out_port]
+            print(f'\t{type(node_state.node).__name__}({node_id}).{out_port}'
+                  f' -> {type(self.nodes[tgt.obj_id].node).__name__}'
+                  f'({tgt.obj_id}).{tgt.port}: {peak}'
+                  f' / {high if high is not None else "unbounded"}')
+
+    def waitables(self) -> dict[object, list[NodeState]]:
+        """
+        Returns:
+            The objects idle nodes wait on and the nodes waiting on each, see
+            RNode.waitable
+        """
+        waiting: dict[object, list[NodeState]] = {}
+        for node_state in self.nodes.values():
+            for obj in node_state.node.waitable():
+                waiting.setdefault(obj, []).append(node_state)
+        return waiting
+
+    def grant_horizon(self):
+        """
+        Conservative time synchronization with ns-3, to be called whenever no
+        node is ready. Everything the nodes emitted before the smallest
+        horizon of any node (see RNode.horizon) has been processed then, so
+        ns-3 is granted that horizon plus LOOKAHEAD_NS, see HorizonMsg. Once
+        no node emits packets of the simulation anymore, HORIZON_END is
+        granted.
+
+        Not used for graphs split into stages, whose workers may still
+        process packets while the main stage is idle, see drive.
+        """
+        horizons = [horizon for node_state in self.nodes.values()
+                    if (horizon := node_state.node.horizon()) is not None]
+        horizon = min(horizons) + self.LOOKAHEAD_NS if horizons \
+            else HORIZON_END
+        if horizon <= self._granted:
+            return
+
+        self._granted = horizon
+        for node_state in self.nodes.values():
+            node_state.node.grant(horizon)
+
+    def run_until_idle(self, ps: NodeSelector):
+        """
+        Process until no node is ready and no node waits for data from
+        outside of the graph. While only waiting nodes are left, the process
+        blocks on their objects instead of polling them.
+
+        Args:
+            ps: The selector to process the nodes with
+        """
+        while True:
+            ps.gen_nodes(self)
+            self.grant_horizon()
+
+            waiting = self.waitables()
+            if not waiting:
+                self.check_stalled()
+                break
+
+            ready = wait(list(waiting), self.IDLE_TIMEOUT)
+            for obj in ready:
+                for node_state in waiting[obj]:
+                    ps.wake(node_state)
+
+    def check_stalled(self):
+        """
+        Raise if backpressure still stops a node once nothing is left to
+        process, its queued packets would be lost. This is a deadlock, e.g.,
+        of a node waiting for packets on one input while the other one is
+        full.
+        """
+        stalled = [node_id for node_id, node_state in self.nodes.items()
+                   if not node_state.has_capacity()]
+        if stalled:
+            raise RuntimeError(
+                f'Nodes {stalled} are stopped by backpressure while nothing '
+                f'else can be processed, raise the capacity of their links')
+
     def viz_state(self):
         for node_state in self.nodes.values():
             print(node_state.viz())
@@ -85,45 +353,151 @@ class PacketProcessor:
             node_state.node.setup(self.register_socket)
         print("OK")
 
-    def drive(self):
+    def shard(self,
+              stage: int,
+              replicas: int,
+              key: str | Callable[[BBPacket], int] = KEY_FLOW,
+              ordered: bool = False):
+        """
+        Run a stage in several processes, each processing a part of the
+        packets. All nodes of the stage must be stateless, see RNode. Place
+        the nodes with stage hints, see INode.stage.
+
+        Args:
+            stage: ID of the stage, the main stage cannot be sharded
+            replicas: Number of processes running the stage
+            key: Name of a key in flowkey.KEYS or a function returning the
+                key of a packet. Packets with the same key are processed by
+                the same replica
+            ordered: Restore the order in which the packets entered the
+                stage when they leave it. Requires the stage to be fed by a
+                single link
+        """
+        if stage == MAIN_STAGE:
+            raise ValueError('The main stage cannot be sharded')
+        if isinstance(key, str):
+            if key not in KEYS:
+                raise ValueError(f'Unknown shard key: {key}')
+            key = KEYS[key]
+
+        self._shards[stage] = Sharding(replicas, key, ordered)
+
+    def pipeline(self, workers: int) -> Pipeline | None:
+        """
+        Split the graph into stages run by separate processes, see
+        pipeline.partition. Call this after setup and compile. A compiled
+        graph is split before fusion and every stage is compiled on its own,
+        so chains do not keep nodes from being distributed.
+
+        Args:
+            workers: Number of worker stages for nodes without stage hint
+
+        Returns:
+            The stages or None if all nodes end up in the main process
+        """
+        if self._unfused is not None:
+            rnodes, links, limits = self._unfused
+        else:
+            rnodes = {node_id: node_state.node
+                      for node_id, node_state in self.nodes.items()}
+            links, limits = self.links, self._limits()
+
+        placement = partition(rnodes, links, workers)
+        if not any(placement.values()):
+            return None
+
+        stages = split(rnodes, links, placement, limits, self.capacity,
+                       self._unfused is not None, self._shards)
+        for stage in stages.values():
+            print(f'{stage}: ' + ', '.join(
+                f'{type(node).__name__}({node_id})'
+                for node_id, node in stage.nodes.items()))
+        return Pipeline(stages)
+
+    def store_costs(self, costs: dict[int, float]):
+        """
+        Store the measured time per process step of every node in the node
+        and its INode, so the next partition can balance the stages
+
+        Args:
+            costs: See Stage.run
+        """
+        rnodes = self._unfused[0] if self._unfused is not None else \
+            {node_id: node_state.node
+             for node_id, node_state in self.nodes.items()}
+        for node_id, cost in costs.items():
+            if node_id not in rnodes:
+                continue
+
+            rnodes[node_id].cost = cost
+            if rnodes[node_id].inode is not None:
+                rnodes[node_id].inode.cost = cost
+
+    def drive(self,
+              selector: type[NodeSelector] = PrioritySelector,
+              budget: int = NodeSelector.DEFAULT_BUDGET,
+              workers: int = 0):
         """
         This is the main function driving the simulation.
 
-        TODO:
-            Currently this may lead to some queues getting larger and
-            larger. This could be the case if one path can continuously produce
-            values while another path only occasionally produces a value. A
-            potential fix would be to check the target inputs queue size before
-            executing process
+        Queues are bounded by the link capacities, a node is only selected
+        while the queues it feeds are below their high-water mark. After the
+        run the peak queue depth of every link is reported.
+
+        The graph is split into stages run by worker processes if workers is
+        positive or nodes carry a stage hint, see pipeline. ns-3 is not
+        offered time synchronization then and keeps polling, as packets
+        may still be in the workers when the main stage grants a horizon.
+
+        Args:
+            selector: The NodeSelector implementation deciding which node is
+                processed next
+            budget: Packets a node may process each time it is selected
+            workers: Number of worker processes for nodes without stage hint
         """
 
-        ps = PrioritySelector(self)
+        pipeline = self.pipeline(workers)
+        if pipeline is not None:
+            self._remote = pipeline.remote_nodes()
+            for bb_sock in self.socks:
+                bb_sock.caps &= ~CAP_SYNC
+            # fork before the socket runner, so workers do not inherit it
+            pipeline.start(selector, budget)
+            ps = pipeline
+        else:
+            ps = selector(self, budget)
 
         if len(self.socks) > 0:
             print('Setup sockets ... ', end='')
             addrs = set([sock.sock.getsockname() for sock in self.socks])
-            cmd, inner = Pipe()
-            p = Process(target=socket_runner, args=(self.socks, inner))
+            if self.transport == TRANSPORT_ASYNCIO:
+                cmd, inner = local_pipe()
+                p = SocketThread(self.socks, inner)
+            else:
+                cmd, inner = Pipe()
+                p = Process(target=socket_runner, args=(self.socks, inner))
             p.start()
             print('OK')
 
             print('Wait for NS3 sockets to come online ... ', end='')
+            # sockets disconnecting early report their nodes as flushed
+            flushed: set[int] = set()
             while len(addrs) > 0:
                 command, val = cmd.recv()
                 if command == 'Connected':
                     addrs.remove(val)
+                elif command == 'Flushed':
+                    flushed.add(val)
             print('OK')
 
             # don't touch self.socks from now on
 
             print('Running Simulation ... ', end='')
-            self.sim_core(ps)
+            self.sim_core(ps, selector, budget)
             print('FINISHED')
 
             print('Cleaning up ... ', end='')
-
-            # wait a bit to allow all pipes/etc. to clear
-            time.sleep(4)
+            self.flush(cmd, flushed)
 
             cmd.send('Terminate')
             p.join()
@@ -131,11 +505,42 @@ class PacketProcessor:
 
         else:
             print('No sockets in graph. Running in offline mode')
-            self.sim_core(ps)
+            self.sim_core(ps, selector, budget)
+
+    def flush(self, cmd: Connection, flushed: set[int]):
+        """
+        Send a FlushMsg through every socket connection and wait until the
+        sockets report that all packets before it reached their peer, see
+        BBSocket.flush
+
+        Args:
+            cmd: Command channel of the socket runner
+            flushed: IDs of nodes already reported as flushed
+        """
+        for node_id, conn in self._sock_conns.items():
+            if node_id not in flushed:
+                conn.send(FlushMsg())
+
+        deadline = time.monotonic() + self.FLUSH_TIMEOUT
+        while not flushed.issuperset(self._sock_conns):
+            timeout = deadline - time.monotonic()
+            if timeout <= 0 or not cmd.poll(timeout):
+                LOGGER.warning(
+                    f'Nodes {set(self._sock_conns) - flushed} were not '
+                    f'flushed within {self.FLUSH_TIMEOUT}s')
+                break
+            command, val = cmd.recv()
+            if command == 'Flushed':
+                flushed.add(val)
 
     def teardown(self):
         for node_state in self.nodes.values():
-            node_state.node.teardown()
+            node = node_state.node
+            members = node.nodes if isinstance(node, FusedNode) else [node]
+            for member in members:
+                # torn down by their worker
+                if member.id not in self._remote:
+                    member.teardown()
 
         # only touch the sockets after the process has joined again
         LOGGER.info('Tearing down')
@@ -146,7 +551,22 @@ class PacketProcessor:
 
             bb_sock.sock.close()
 
-    def sim_core(self, ps):
+        for ring in self._rings:
+            ring.close()
+            ring.unlink()
+        self._rings.clear()
+
+    def sim_core(self,
+                 ps: NodeSelector | Pipeline,
+                 selector: type[NodeSelector],
+                 budget: int):
         # main loop
         LOGGER.info('---------------SIM-CORE----------------')
-        ps.gen_nodes(self)
+        if isinstance(ps, Pipeline):
+            self.store_costs(ps.run(selector, budget))
+            pp = ps.main.pp
+        else:
+            self.run_until_idle(ps)
+            pp = self
+
+        pp.report_queues()
@@ -0,0 +1,866 @@
+"""
+Pipelined execution of the processing graph across several processes.
+
+The graph is partitioned into stages. Stage 0 runs in the main process, every
+other stage in a worker process of its own. Links between stages are
+replaced by a StageSendN in the feeding stage and a StageRecvN in the
+receiving one, which pass batches of packets in the compact format of
+pack_packets over a pipe. Within a stage the packets are scheduled by the
+usual NodeSelector.
+
+Sources, sinks and nodes updating the GUI always stay in the main process.
+The remaining nodes are placed by their stage hint (see INode.stage) or split
+into stages of similar cost. The cost of every node is measured during the
+run and can be used to balance the next one.
+
+Stages of stateless nodes may be sharded, i.e., run by several replicas that
+process disjoint parts of the stream, see Sharding. A ShardSendN deals the
+packets to the replicas by a key and a MergeRecvN collects them again,
+optionally in the original order.
+"""
+import heapq
+import logging
+import queue
+import random
+import struct
+import threading
+import time
+from collections import deque
+from itertools import count
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import Connection, wait
+from typing import Callable, TYPE_CHECKING
+
+import numpy as np
+
+from lowcaf.nodeeditor.portid import PortID
+from lowcaf.nodes.ifaces.rnode import RNode
+from lowcaf.packetprocessing.bbpacket import BBPacket, META_SEQ, \
+    pack_packets, unpack_packets
+from lowcaf.packetprocessing.compiler import FusedNode
+from lowcaf.packetprocessing.graph import has_cycle, topo_rank
+
+if TYPE_CHECKING:
+    from lowcaf.packetprocessing.nodeselector import NodeSelector
+    from lowcaf.packetprocessing.packetprocessor import PacketProcessor
+
+LOGGER = logging.getLogger(__name__)
+
+MAIN_STAGE: int = 0
+
+# Every message between stages starts with its kind and a sequence number,
+# an empty message ends the stream
+MSG_HEADER: struct.Struct = struct.Struct('>cq')
+MSG_PACKETS: bytes = b'P'  # Followed by a batch of pack_packets
+MSG_WATERMARK: bytes = b'W'  # Sender will only send higher sequence numbers
+
+
+def _message(kind: bytes,
+             seq: int,
+             pkts: list[BBPacket] | None = None) -> bytearray:
+    buff = bytearray(MSG_HEADER.pack(kind, seq))
+    if pkts is not None:
+        pack_packets(pkts, buff)
+    return buff
+
+
+class Sharding:
+    """
+    Replication of a stage, see PacketProcessor.shard
+    """
+
+    def __init__(self,
+                 replicas: int,
+                 key: Callable[[BBPacket], int] | None,
+                 ordered: bool):
+        """
+        Args:
+            replicas: Number of processes running the stage
+            key: Packets with the same key go to the same replica, see
+                flowkey. None deals the packets in turn
+            ordered: Whether the packets leave the stage in the order they
+                entered it. Every packet then carries META_SEQ while inside
+                the stage
+        """
+        if replicas < 1:
+            raise ValueError(f'Invalid number of replicas: {replicas}')
+
+        self.replicas: int = replicas
+        self.key: Callable[[BBPacket], int] | None = key
+        self.ordered: bool = ordered
+
+
+class StageSendN(RNode):
+    """
+    Sends the packets of its input to a StageRecvN in another process. Each
+    selection packs up to budget packets into one message. Messages are
+    written by a background thread, so a full pipe does not stall the stage.
+    The node stops accepting packets once max_pending messages per pipe are
+    waiting to be written, which applies backpressure to the nodes feeding
+    it. The thread then wakes the stage through a pipe once it took a
+    message, see waitable.
+    """
+
+    fusable = False
+
+    def __init__(self,
+                 node_id: int,
+                 conns: list[Connection],
+                 max_pending: int = 8):
+        super().__init__(node_id, 1, 0)
+
+        self.conns: list[Connection] = conns
+        self.max_pending: int = max_pending
+
+        # StageRecvNs of the same stage feeding this node. Once all of them
+        # reached the end of their stream, so has this node.
+        self.feeders: list['StageRecvN'] = []
+        self.closed: bool = False
+        # highest watermark sent, see send_watermark
+        self.watermark: int = -1
+
+        # (index of the pipe, message)
+        self._pending: queue.Queue | None = None
+        self._thread: threading.Thread | None = None
+        # the stage waits for room in _pending, see waitable
+        self._waiting: threading.Event = threading.Event()
+        self._room: Connection | None = None
+        self._room_signal: Connection | None = None
+
+    def __str__(self):
+        return f'{type(self).__name__}({self.id})'
+
+    def setup(self, reg_socks: Callable[[str, int, int], Connection]):
+        # started in the process running the stage
+        self._pending = queue.Queue(self.max_pending * len(self.conns))
+        self._room, self._room_signal = Pipe(duplex=False)
+        self._thread = threading.Thread(
+            target=self._send_loop, name=str(self), daemon=True)
+        self._thread.start()
+
+    def _send_loop(self):
+        open_conns = len(self.conns)
+        while open_conns:
+            idx, buff = self._pending.get()
+            if self._waiting.is_set():
+                self._waiting.clear()
+                self._room_signal.send_bytes(b'\0')
+            self.conns[idx].send_bytes(buff)
+            if not buff:
+                open_conns -= 1
+
+    @property
+    def backlogged(self) -> bool:
+        # one selection adds at most one message per pipe
+        return self._pending.qsize() > \
+            self._pending.maxsize - len(self.conns)
+
+    def waitable(self) -> list:
+        """
+        Returns:
+            The pipe signaled once the writer thread took a message, if the
+            node waits for it
+        """
+        if self.closed or not self.backlogged:
+            return []
+        while self._room.poll():
+            self._room.recv_bytes()
+        self._waiting.set()
+        if not self.backlogged:
+            # the thread took a message before it saw the flag
+            self._room_signal.send_bytes(b'\0')
+        return [self._room]
+
+    def close(self):
+        """
+        Signal the end of the stream to the receiving stage
+        """
+        for idx in range(len(self.conns)):
+            self._pending.put((idx, b''))
+        self.closed = True
+
+    def send_watermark(self, seq: int):
+        """
+        Promise the receivers that no packet with a sequence number of seq
+        or below follows, see MergeRecvN
+        """
+        if seq <= self.watermark or self.backlogged:
+            return
+        for idx in range(len(self.conns)):
+            self._pending.put_nowait((idx, _message(MSG_WATERMARK, seq)))
+        self.watermark = seq
+
+    def process(self,
+                inputs: list[deque[BBPacket]],
+                outputs: list[list[BBPacket]]):
+        self.process_batch(inputs, outputs, 1)
+
+    def process_batch(self,
+                      inputs: list[deque[BBPacket]],
+                      outputs: list[list[BBPacket]],
+                      budget: int) -> int:
+        nr_pkts = min(budget, len(inputs[0]))
+        self._pending.put_nowait((0, _message(
+            MSG_PACKETS, -1, [inputs[0].popleft() for _ in range(nr_pkts)])))
+        return nr_pkts
+
+    def is_ready(self, inputs: list[deque[BBPacket]]) -> bool:
+        return len(inputs[0]) > 0 and not self.backlogged
+
+    def teardown(self):
+        if self._thread is not None:
+            self._thread.join()
+            self._room.close()
+            self._room_signal.close()
+        for conn in self.conns:
+            conn.close()
+
+    @staticmethod
+    def create_from_inode(inode) -> 'RNode':
+        raise NotImplementedError('Stage nodes only exist at runtime')
+
+
+class ShardSendN(StageSendN):
+    """
+    Deals the packets of its input to the replicas of a sharded stage, one
+    pipe per replica. If the stage is ordered, every packet is numbered and
+    replicas that got no packet of a batch are sent a watermark instead, so
+    the MergeRecvN behind the stage never waits for an idle replica.
+    """
+
+    def __init__(self,
+                 node_id: int,
+                 conns: list[Connection],
+                 sharding: Sharding,
+                 max_pending: int = 8):
+        super().__init__(node_id, conns, max_pending)
+
+        self.key: Callable[[BBPacket], int] | None = sharding.key
+        self.ordered: bool = sharding.ordered
+
+        self._seq: int = 0
+        self._next: int = 0
+
+    def process_batch(self,
+                      inputs: list[deque[BBPacket]],
+                      outputs: list[list[BBPacket]],
+                      budget: int) -> int:
+        nr_pkts = min(budget, len(inputs[0]))
+        replicas = len(self.conns)
+        shards: list[list[BBPacket]] = [[] for _ in range(replicas)]
+        for _ in range(nr_pkts):
+            pkt = inputs[0].popleft()
+            if self.ordered:
+                pkt.set_meta(META_SEQ, self._seq)
+                self._seq += 1
+
+            if self.key is None:
+                idx = self._next
+                self._next = (idx + 1) % replicas
+            else:
+                idx = self.key(pkt) % replicas
+            shards[idx].append(pkt)
+
+        # every replica learns that it has seen all packets up to here
+        seq = self._seq - 1 if self.ordered else -1
+        for idx, pkts in enumerate(shards):
+            if pkts:
+                self._pending.put_nowait(
+                    (idx, _message(MSG_PACKETS, seq, pkts)))
+            elif self.ordered:
+                self._pending.put_nowait((idx, _message(MSG_WATERMARK, seq)))
+        return nr_pkts
+
+
+class StageRecvN(RNode):
+    """
+    Emits the packets sent by StageSendNs in other processes. With several
+    pipes, e.g., one per replica of a sharded stage, messages are taken in
+    the order they arrive.
+    """
+
+    fusable = False
+
+    def __init__(self, node_id: int, conns: list[Connection]):
+        super().__init__(node_id, 0, 1)
+
+        self.conns: list[Connection] = conns
+        self._eof: list[bool] = [False] * len(conns)
+        # highest sequence number in a message header, see ShardSendN
+        self.last_seq: int = -1
+
+        # received packets that did not fit the budget yet
+        self._pending: deque[BBPacket] = deque()
+
+    def __str__(self):
+        return f'{type(self).__name__}({self.id})'
+
+    @property
+    def eof(self) -> bool:
+        return all(self._eof)
+
+    @property
+    def pending(self) -> int:
+        """
+        Number of received packets not emitted yet
+        """
+        return len(self._pending)
+
+    @property
+    def done(self) -> bool:
+        """
+        Whether all packets of the stream have been emitted
+        """
+        return self.eof and not self.pending
+
+    def waitable(self) -> list:
+        return [conn for conn, eof in zip(self.conns, self._eof) if not eof]
+
+    def _receive(self):
+        """
+        Take one message from every pipe that has one
+        """
+        for idx, conn in enumerate(self.conns):
+            if self._eof[idx] or not conn.poll():
+                continue
+
+            try:
+                buff = conn.recv_bytes()
+            except EOFError:
+                LOGGER.error(f'{self}: sending stage terminated early')
+                buff = b''
+
+            if not buff:
+                self._eof[idx] = True
+                continue
+
+            kind, seq = MSG_HEADER.unpack_from(buff)
+            self.last_seq = max(self.last_seq, seq)
+            pkts = unpack_packets(memoryview(buff)[MSG_HEADER.size:]) \
+                if kind == MSG_PACKETS else []
+            self._accept(idx, seq, pkts)
+
+    def _accept(self, idx: int, seq: int, pkts: list[BBPacket]):
+        self._pending.extend(pkts)
+
+    def process(self,
+                inputs: list[deque[BBPacket]],
+                outputs: list[list[BBPacket]]):
+        self.process_batch(inputs, outputs, 1)
+
+    def process_batch(self,
+                      inputs: list[deque[BBPacket]],
+                      outputs: list[list[BBPacket]],
+                      budget: int) -> int:
+        if not self._pending:
+            self._receive()
+
+        nr_pkts = min(budget, len(self._pending))
+        for _ in range(nr_pkts):
+            outputs[0].append(self._pending.popleft())
+        return nr_pkts
+
+    def is_ready(self, inputs: list[deque[BBPacket]]) -> bool:
+        return len(self._pending) > 0 or any(
+            not eof and conn.poll() for conn, eof in
+            zip(self.conns, self._eof))
+
+    def teardown(self):
+        for conn in self.conns:
+            conn.close()
+
+    @staticmethod
+    def create_from_inode(inode) -> 'RNode':
+        raise NotImplementedError('Stage nodes only exist at runtime')
+
+
+class MergeRecvN(StageRecvN):
+    """
+    Emits the packets of the replicas of an ordered sharded stage in the
+    order of META_SEQ. A packet is released once every other replica has
+    sent a higher sequence number, either with a packet or a watermark, or
+    has ended its stream.
+    """
+
+    def __init__(self, node_id: int, conns: list[Connection]):
+        super().__init__(node_id, conns)
+
+        # highest sequence number seen from every replica
+        self._bounds: list[int] = [-1] * len(conns)
+        self._heap: list[tuple[int, int, BBPacket]] = []
+        self._tie = count()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending) + len(self._heap)
+
+    def _accept(self, idx: int, seq: int, pkts: list[BBPacket]):
+        bound = max(self._bounds[idx], seq)
+        for pkt in pkts:
+            pkt_seq = pkt.get_meta(META_SEQ, -1)
+            bound = max(bound, pkt_seq)
+            heapq.heappush(self._heap, (pkt_seq, next(self._tie), pkt))
+        self._bounds[idx] = bound
+
+    def _receive(self):
+        super()._receive()
+
+        limit = min((bound for bound, eof in zip(self._bounds, self._eof)
+                     if not eof), default=None)
+        while self._heap and (limit is None or self._heap[0][0] <= limit):
+            pkt = heapq.heappop(self._heap)[2]
+            pkt.metadata.pop(META_SEQ, None)
+            self._pending.append(pkt)
+
+
+def is_pinned(node: RNode) -> bool:
+    """
+    Returns:
+        Whether the node has to run in the main process
+    """
+    return node.nr_inputs == 0 or node.nr_outputs == 0 or node.gui_bound
+
+
+def partition(
+        nodes: dict[int, RNode],
+        links: dict[int, dict[int, PortID]],
+        workers: int) -> dict[int, int]:
+    """
+    Assign every node to a stage. Pinned nodes (see is_pinned) go to the
+    main stage and nodes with a stage hint to the hinted stage. The other
+    nodes are taken in topological order and cut into workers stages of
+    roughly equal cost, so packets flow through the stages in order. Nodes
+    without a measured cost count as the average of the measured ones.
+
+    Args:
+        nodes: The nodes of the graph by ID
+        links: The links of the graph
+        workers: Number of stages to split the unplaced nodes into
+
+    Returns:
+        The stage of every node
+    """
+    placement = {}
+    free = []
+    for node_id, node in nodes.items():
+        if is_pinned(node):
+            if node.stage not in (None, MAIN_STAGE):
+                LOGGER.warning(f'Node {node_id} has to run in the main '
+                               f'process, ignoring stage {node.stage}')
+            placement[node_id] = MAIN_STAGE
+        elif node.stage is not None:
+            placement[node_id] = node.stage
+        else:
+            free.append(node_id)
+
+    if not free:
+        return placement
+    if workers < 1:
+        for node_id in free:
+            placement[node_id] = MAIN_STAGE
+        return placement
+
+    costs = [node.cost for node in nodes.values() if node.cost is not None]
+    default = sum(costs) / len(costs) if costs else 1.0
+    cost = {node_id: nodes[node_id].cost
+            if nodes[node_id].cost is not None else default
+            for node_id in free}
+
+    # worker stages come after the hinted ones
+    first = max(placement.values(), default=MAIN_STAGE) + 1
+    rank = topo_rank(nodes.keys(), links)
+    free.sort(key=lambda node_id: (rank[node_id], node_id))
+
+    share = sum(cost.values()) / workers
+    spent = 0.0
+    for node_id in free:
+        # place the node where the middle of its cost falls
+        idx = min(int((spent + cost[node_id] / 2) / share), workers - 1)
+        placement[node_id] = first + idx
+        spent += cost[node_id]
+    return placement
+
+
+class Stage:
+    """
+    The part of the graph run by one process, or by several replicas if the
+    stage is sharded
+    """
+
+    def __init__(self, stage_id: int, sharding: Sharding | None = None):
+        self.id: int = stage_id
+        self.sharding: Sharding | None = sharding
+        self.nodes: dict[int, RNode] = {}
+        self.links: dict[int, dict[int, PortID]] = {}
+        # high- and low-water marks by (node_id, out_port)
+        self.limits: dict[tuple[int, int], tuple[int | None, int | None]] = {}
+
+        self.sends: list[StageSendN] = []
+        self.recvs: list[StageRecvN] = []
+        # pipe of every replica by boundary node ID, see Pipeline.start
+        self.replica_conns: dict[int, list[Connection]] = {}
+
+        # set by build
+        self.pp: 'PacketProcessor | None' = None
+
+    def __str__(self):
+        replicas = f' x {self.sharding.replicas}' \
+            if self.sharding is not None else ''
+        return f'Stage {self.id} ({len(self.nodes)} nodes{replicas})'
+
+    @property
+    def replicas(self) -> int:
+        return self.sharding.replicas if self.sharding is not None else 1
+
+    def connections(self) -> list[Connection]:
+        """
+        Returns:
+            The pipe ends of all boundary nodes of all replicas
+        """
+        conns = [conn for node in self.sends + self.recvs
+                 for conn in node.conns]
+        for replica_conns in self.replica_conns.values():
+            conns += [conn for conn in replica_conns if conn not in conns]
+        return conns
+
+    def use_replica(self, replica: int):
+        """
+        Let the boundary nodes use the pipes of one replica
+        """
+        for node_id, conns in self.replica_conns.items():
+            self.nodes[node_id].conns = [conns[replica]]
+
+    def build(self, capacity: int | None, fuse: bool):
+        """
+        Wire the nodes of the stage, see PacketProcessor
+
+        Args:
+            capacity: Default capacity of the links
+            fuse: Whether to compile the stage
+        """
+        # both modules need each other
+        from lowcaf.packetprocessing.packetprocessor import PacketProcessor
+
+        self.pp = PacketProcessor(self.nodes, self.links, capacity)
+        for (node_id, out_port), (high, low) in self.limits.items():
+            self.pp.set_capacity(node_id, out_port, high, low)
+        if fuse:
+            self.pp.compile()
+
+        # the receivers upstream of every sender
+        for send in self.sends:
+            todo = [self.pp.nodes[send.id]]
+            seen = set()
+            while todo:
+                node_state = todo.pop()
+                for up in node_state.upstream:
+                    if up.node.id not in seen:
+                        seen.add(up.node.id)
+                        todo.append(up)
+            send.feeders = [recv for recv in self.recvs if recv.id in seen]
+
+    def _drained(self) -> bool:
+        return not any(recv.pending for recv in self.recvs) and \
+            not any(inp for node_state in self.pp.nodes.values()
+                    for inp in node_state.inputs)
+
+    def run(self,
+            selector: type['NodeSelector'],
+            budget: int) -> dict[int, float]:
+        """
+        Process packets until all StageRecvNs reached the end of their
+        streams and nothing is left to process. The senders are closed as
+        soon as their input is finished.
+
+        Args:
+            selector: The NodeSelector implementation to use
+            budget: Packets a node may process per selection
+
+        Returns:
+            The average time per process step in ns of every node that
+            processed packets. The time of a fused chain is attributed to
+            its members evenly.
+        """
+        pp = self.pp
+        ordered = self.sharding is not None and self.sharding.ordered
+        boundary = [pp.nodes[node.id] for node in self.recvs + self.sends]
+        for node_state in boundary:
+            node_state.node.setup(pp.register_socket)
+
+        busy = {node_id: 0 for node_id in pp.nodes}
+        steps = {node_id: 0 for node_id in pp.nodes}
+        ps = selector(pp, budget)
+        while True:
+            while not ps.is_finished():
+                node_state = ps.select_next()
+                start = time.perf_counter_ns()
+                done = node_state.process_batch(budget)
+                busy[node_state.node.id] += time.perf_counter_ns() - start
+                steps[node_state.node.id] += done
+                ps.update(pp, node_state)
+
+            if ordered and self._drained():
+                # everything received so far has left the stage
+                seq = max(recv.last_seq for recv in self.recvs)
+                for send in self.sends:
+                    send.send_watermark(seq)
+
+            for send in self.sends:
+                if not send.closed and not pp.nodes[send.id].inputs[0] and \
+                        all(recv.done for recv in send.feeders):
+                    send.close()
+
+            waiting = pp.waitables()
+            if not waiting and all(send.closed for send in self.sends):
+                pp.check_stalled()
+                break
+
+            # senders with a full backlog wait for their writer thread
+            for obj in wait(list(waiting), pp.IDLE_TIMEOUT):
+                for node_state in waiting[obj]:
+                    ps.wake(node_state)
+
+            for node_state in boundary:
+                ps.wake(node_state)
+
+        for node_state in boundary:
+            node_state.node.teardown()
+
+        costs = {}
+        for node_id, node_state in pp.nodes.items():
+            if steps[node_id] == 0:
+                continue
+            node = node_state.node
+            members = node.nodes if isinstance(node, FusedNode) else [node]
+            for member in members:
+                costs[member.id] = busy[node_id] / steps[node_id] / \
+                    len(members)
+        return costs
+
+
+def split(
+        nodes: dict[int, RNode],
+        links: dict[int, dict[int, PortID]],
+        placement: dict[int, int],
+        limits: dict[tuple[int, int], tuple[int | None, int | None]],
+        capacity: int | None,
+        fuse: bool = False,
+        shards: dict[int, Sharding] | None = None) -> dict[int, Stage]:
+    """
+    Split the graph into stages. Every link between two stages is replaced
+    by pipes with a StageSendN and a StageRecvN at their ends. Links into a
+    sharded stage start at a ShardSendN, links out of an ordered one end at
+    a MergeRecvN. All of them keep the limits of the original link.
+
+    Args:
+        nodes: The nodes of the graph by ID
+        links: The links of the graph
+        placement: The stage of every node, see partition
+        limits: High- and low-water marks by (node_id, out_port)
+        capacity: Default capacity of the links
+        fuse: Whether to fuse chains within every stage, see
+            PacketProcessor.compile
+        shards: Stages to replicate by ID
+
+    Returns:
+        The stages by ID
+
+    Raises:
+        ValueError: If the placement lets stages wait on each other in a
+            cycle or a sharded stage cannot be replicated
+    """
+    shards = shards or {}
+    stages: dict[int, Stage] = {MAIN_STAGE: Stage(MAIN_STAGE)}
+    for node_id, node in nodes.items():
+        stage_id = placement[node_id]
+        if stage_id not in stages:
+            stages[stage_id] = Stage(stage_id, shards.get(stage_id))
+        if stages[stage_id].sharding is not None and not node.stateless:
+            raise ValueError(f'{type(node).__name__}({node_id}) keeps state '
+                             f'and cannot be replicated')
+        stages[stage_id].nodes[node_id] = node
+
+    next_id = max(nodes, default=0) + 1
+    # receiver ID to sender ID
+    channel: dict[int, int] = {}
+    for src_id, ports in links.items():
+        src_stage = stages[placement[src_id]]
+        for out_port, tgt in ports.items():
+            limit = limits.get((src_id, out_port), (capacity, None))
+            tgt_stage = stages[placement[tgt.obj_id]]
+            if src_stage is tgt_stage:
+                src_stage.links.setdefault(src_id, {})[out_port] = tgt
+                src_stage.limits[(src_id, out_port)] = limit
+                continue
+
+            if src_stage.sharding is not None and \
+                    tgt_stage.sharding is not None:
+                raise ValueError(f'Sharded {src_stage} cannot feed sharded '
+                                 f'{tgt_stage} directly')
+
+            pipes = [Pipe(duplex=False) for _ in
+                     range(max(src_stage.replicas, tgt_stage.replicas))]
+            recv_conns = [recv_conn for recv_conn, _ in pipes]
+            send_conns = [send_conn for _, send_conn in pipes]
+            send_id, recv_id = next_id, next_id + 1
+            next_id += 2
+
+            if tgt_stage.sharding is not None:
+                send = ShardSendN(send_id, send_conns, tgt_stage.sharding)
+                recv = StageRecvN(recv_id, recv_conns[:1])
+                tgt_stage.replica_conns[recv_id] = recv_conns
+            elif src_stage.sharding is not None:
+                send = StageSendN(send_id, send_conns[:1])
+                src_stage.replica_conns[send_id] = send_conns
+                if src_stage.sharding.ordered:
+                    recv = MergeRecvN(recv_id, recv_conns)
+                else:
+                    recv = StageRecvN(recv_id, recv_conns)
+            else:
+                send = StageSendN(send_id, send_conns)
+                recv = StageRecvN(recv_id, recv_conns)
+
+            src_stage.nodes[send.id] = send
+            src_stage.sends.append(send)
+            src_stage.links.setdefault(src_id, {})[out_port] = \
+                PortID(send.id, 0)
+            src_stage.limits[(src_id, out_port)] = limit
+
+            tgt_stage.nodes[recv.id] = recv
+            tgt_stage.recvs.append(recv)
+            tgt_stage.links[recv.id] = {0: tgt}
+            tgt_stage.limits[(recv.id, 0)] = limit
+            channel[recv.id] = send.id
+
+    for stage in stages.values():
+        if stage.sharding is not None and stage.sharding.ordered and \
+                len(stage.recvs) != 1:
+            # sequence numbers are only comparable within one stream
+            raise ValueError(f'Ordered {stage} must be fed by exactly one '
+                             f'link, not {len(stage.recvs)}')
+        stage.build(capacity, fuse)
+
+    # a sender closes once its feeders reached the end of their streams,
+    # which must not depend on the sender itself. Channels are identified by
+    # the ID of their StageSendN.
+    deps: dict[int, dict[int, PortID]] = {
+        send.id: {} for stage in stages.values() for send in stage.sends}
+    for stage in stages.values():
+        for send in stage.sends:
+            for recv in send.feeders:
+                waiting = deps[channel[recv.id]]
+                waiting[len(waiting)] = PortID(send.id, 0)
+    if has_cycle(deps.keys(), deps):
+        raise ValueError('Stage placement lets stages wait on each other')
+
+    return stages
+
+
+def _run_worker(stage: Stage,
+                others: list[Connection],
+                selector: type['NodeSelector'],
+                budget: int,
+                results: Connection):
+    # drop the pipes of the other stages and replicas, so their receivers
+    # notice if a stage dies
+    for conn in others:
+        conn.close()
+
+    # forked replicas would otherwise draw the same random numbers
+    random.seed()
+    np.random.seed()
+
+    costs = stage.run(selector, budget)
+    for node in stage.nodes.values():
+        if not isinstance(node, StageSendN | StageRecvN):
+            node.teardown()
+
+    results.send(('Costs', costs))
+    results.close()
+
+
+class Pipeline:
+    """
+    Runs the stages of a split graph, stage 0 in the calling process and all
+    others in worker processes
+    """
+
+    def __init__(self, stages: dict[int, Stage]):
+        self.stages: dict[int, Stage] = stages
+        self.workers: list[tuple[Process, Connection]] = []
+
+    @property
+    def main(self) -> Stage:
+        return self.stages[MAIN_STAGE]
+
+    def remote_nodes(self) -> set[int]:
+        """
+        Returns:
+            The IDs of the graph nodes run by workers
+        """
+        return {node_id for stage in self.stages.values()
+                if stage.id != MAIN_STAGE
+                for node_id, node in stage.nodes.items()
+                if not isinstance(node, StageSendN | StageRecvN)}
+
+    def start(self, selector: type['NodeSelector'], budget: int):
+        """
+        Fork a worker for every replica of every stage but the main one
+
+        Args:
+            selector: The NodeSelector implementation used by every stage
+            budget: Packets a node may process per selection
+        """
+        conns = [conn for stage in self.stages.values()
+                 for conn in stage.connections()]
+
+        for stage in self.stages.values():
+            if stage.id == MAIN_STAGE:
+                continue
+
+            for replica in range(stage.replicas):
+                stage.use_replica(replica)
+                own = {id(conn) for node in stage.sends + stage.recvs
+                       for conn in node.conns}
+                others = [conn for conn in conns if id(conn) not in own]
+
+                results, child = Pipe(duplex=False)
+                proc = Process(target=_run_worker,
+                               name=f'lowcaf-stage-{stage.id}.{replica}',
+                               args=(stage, others, selector, budget, child))
+                proc.start()
+                child.close()
+                self.workers.append((proc, results))
+                LOGGER.info(f'Started worker {replica} for {stage}')
+
+        for stage in self.stages.values():
+            if stage.id != MAIN_STAGE:
+                for conn in stage.connections():
+                    conn.close()
+
+    def run(self,
+            selector: type['NodeSelector'],
+            budget: int) -> dict[int, float]:
+        """
+        Run the main stage and collect the results of the workers
+
+        Args:
+            selector: The NodeSelector implementation to use
+            budget: Packets a node may process per selection
+
+        Returns:
+            The cost of the nodes of all stages, see Stage.run. Replicas
+            report the same nodes, the last report wins.
+        """
+        costs = self.main.run(selector, budget)
+        for proc, results in self.workers:
+            try:
+                command, val = results.recv()
+                if command == 'Costs':
+                    costs |= val
+            except EOFError:
+                LOGGER.error(f'Worker {proc.name} died with exit code '
+                             f'{proc.exitcode}')
+            proc.join()
+            results.close()
+        return costs
@@ -0,0 +1,327 @@
+"""
+Shared-memory transport between socket_runner and the nodes.
+
+Every connection consists of two single-producer single-consumer rings in
+multiprocessing.shared_memory, one per direction. A packet is stored as a
+fixed-layout record with its raw bytes instead of being pickled, and the
+receiver rebuilds it lazily with BBPacket.from_raw. A readable pipe signals
+that a ring is not empty, so the connections work with selectors and
+multiprocessing.connection.wait. A second pipe wakes a writer waiting for
+space. The rings are created before socket_runner is forked and shared by
+inheritance.
+
+Only the fields of the record cross the rings, metadata is not carried.
+"""
+import logging
+import os
+import select
+import struct
+from multiprocessing.shared_memory import SharedMemory
+
+from scapy.all import conf
+
+from lowcaf.packetprocessing.bbpacket import BBPacket, EODMsg, HorizonMsg
+from lowcaf.packetprocessing.bbsocket import FlushMsg
+
+LOGGER = logging.getLogger(__name__)
+
+KIND_PAD: int = 0  # Rest of the ring is unused, continue at its start
+KIND_PACKET: int = 1  # A BBPacket
+KIND_EOD: int = 2  # An EODMsg
+KIND_FLUSH: int = 3  # A FlushMsg
+KIND_HORIZON: int = 4  # A HorizonMsg, its time is stored as time_ns
+
+# kind, dropped, linktype, node_id, timestamp, time_ns, name_len, data_len.
+# Followed by the link type name (if it is a str) and the data, padded to
+# ALIGN bytes.
+RECORD: struct.Struct = struct.Struct('<BBHIqQII')
+# write and read offset, both only ever grow, and whether the writer waits
+# for space
+INDEX: struct.Struct = struct.Struct('<QQQ')
+OFFSET: struct.Struct = struct.Struct('<Q')
+ALIGN: int = 8
+RING_SIZE: int = 1 << 20  # Default bytes per direction of a connection
+MAX_PACKET_SIZE: int = 0x40000  # Largest packet carried, the pcap snaplen
+MAX_NAME_SIZE: int = 0xff  # Longest link type name carried
+
+
+def _aligned(nbytes: int) -> int:
+    return (nbytes + ALIGN - 1) & ~(ALIGN - 1)
+
+
+def max_record() -> int:
+    """
+    Returns:
+        Bytes of the largest record, a ring has to hold two of them
+    """
+    return _aligned(RECORD.size + MAX_NAME_SIZE + MAX_PACKET_SIZE)
+
+
+class ShmRing:
+    """
+    A ring of records in shared memory with a single writer and a single
+    reader process
+    """
+
+    def __init__(self, size: int):
+        """
+        Args:
+            size: Bytes available for records, rounded up to ALIGN. At
+                least twice max_record, records never wrap.
+        """
+        self.size: int = _aligned(size)
+        if self.size < 2 * max_record():
+            raise ValueError(
+                f'A ring of {self.size} bytes cannot hold packets of '
+                f'{MAX_PACKET_SIZE} bytes, it needs {2 * max_record()} bytes')
+        self.shm: SharedMemory = SharedMemory(
+            create=True, size=INDEX.size + self.size)
+        self.buf: memoryview = self.shm.buf
+        INDEX.pack_into(self.buf, 0, 0, 0, 0)
+
+        # holds at least one byte while records are waiting
+        self.rfd, self.wfd = os.pipe()
+        os.set_blocking(self.rfd, False)
+        # written by the reader once it freed space for a waiting writer
+        self.space_rfd, self.space_wfd = os.pipe()
+        os.set_blocking(self.space_rfd, False)
+
+    def put(self,
+            kind: int,
+            node_id: int,
+            timestamp: int = 0,
+            time_ns: int = 0,
+            linktype: int = 0,
+            dropped: bool = False,
+            name: bytes = b'',
+            data: bytes | memoryview = b''):
+        """
+        Append a record, blocks while the ring is full. Name and data must
+        not exceed MAX_NAME_SIZE and MAX_PACKET_SIZE.
+        """
+        need = _aligned(RECORD.size + len(name) + len(data))
+        assert need <= max_record()
+
+        buf = self.buf
+        while True:
+            start, read, _ = INDEX.unpack_from(buf, 0)
+            pos = start % self.size
+            tail = self.size - pos
+            pad = tail if tail < need else 0
+            if start + pad + need - read <= self.size:
+                break
+            self._wait_space(read)
+
+        write = start
+        if pad:
+            # records never wrap, the reader skips to the start as well
+            if pad >= RECORD.size:
+                RECORD.pack_into(buf, INDEX.size + pos, KIND_PAD,
+                                 0, 0, 0, 0, 0, 0, 0)
+            write += pad
+            pos = 0
+
+        off = INDEX.size + pos
+        RECORD.pack_into(buf, off, kind, dropped, linktype, node_id,
+                         timestamp, time_ns, len(name), len(data))
+        off += RECORD.size
+        buf[off:off + len(name)] = name
+        off += len(name)
+        buf[off:off + len(data)] = data
+
+        # publish, then wake the reader if it may have seen an empty ring
+        OFFSET.pack_into(buf, 0, write + need)
+        if OFFSET.unpack_from(buf, 8)[0] == start:
+            os.write(self.wfd, b'\0')
+
+    def _wait_space(self, read: int):
+        """
+        Block until the reader moved past read. The reader is asked for a
+        wakeup first, so space freed before the wait is not missed.
+        """
+        OFFSET.pack_into(self.buf, 16, 1)
+        try:
+            while os.read(self.space_rfd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        if OFFSET.unpack_from(self.buf, 8)[0] == read:
+            select.select([self.space_rfd], [], [])
+
+    def readable(self) -> bool:
+        write, read, _ = INDEX.unpack_from(self.buf, 0)
+        return write != read
+
+    def get(self) -> tuple[tuple, bytes, bytes] | None:
+        """
+        Take the next record
+
+        Returns:
+            fields, name, data: The fields of RECORD and the copied bytes
+            behind it, None if the ring is empty
+        """
+        buf = self.buf
+        write, read, _ = INDEX.unpack_from(buf, 0)
+        rec = None
+        while read != write:
+            pos = read % self.size
+            tail = self.size - pos
+            if tail < RECORD.size:
+                read += tail
+                continue
+
+            off = INDEX.size + pos
+            fields = RECORD.unpack_from(buf, off)
+            if fields[0] == KIND_PAD:
+                read += tail
+                continue
+
+            name_len, data_len = fields[6], fields[7]
+            off += RECORD.size
+            name = bytes(buf[off:off + name_len])
+            off += name_len
+            data = bytes(buf[off:off + data_len])
+            read += _aligned(RECORD.size + name_len + data_len)
+            rec = (fields, name, data)
+            break
+
+        OFFSET.pack_into(buf, 8, read)
+        if OFFSET.unpack_from(buf, 16)[0]:
+            # the writer waits for the space just freed
+            OFFSET.pack_into(buf, 16, 0)
+            os.write(self.space_wfd, b'\0')
+        if read == write:
+            self._drain()
+        return rec
+
+    def _drain(self):
+        """
+        Consume the wakeups once the ring looked empty
+        """
+        try:
+            while os.read(self.rfd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+        # a record published in between may have lost its wakeup
+        if self.readable():
+            os.write(self.wfd, b'\0')
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+
+    def unlink(self):
+        """
+        Free the shared memory and the pipe, call once after all processes
+        using the ring are done
+        """
+        self.shm.unlink()
+        for fd in (self.rfd, self.wfd, self.space_rfd, self.space_wfd):
+            os.close(fd)
+
+
+class ShmConnection:
+    """
+    One end of a connection over two ShmRings with the interface of a
+    multiprocessing Connection. Carries BBPackets, EODMsgs, FlushMsgs and
+    HorizonMsgs.
+    """
+
+    def __init__(self, rx: ShmRing, tx: ShmRing, node_id: int):
+        """
+        Args:
+            rx: Ring this end reads from
+            tx: Ring this end writes to
+            node_id: ID of the node the connection belongs to, stored in
+                every record
+        """
+        self.rx: ShmRing = rx
+        self.tx: ShmRing = tx
+        self.node_id: int = node_id
+
+    def fileno(self) -> int:
+        return self.rx.rfd
+
+    def send(self, obj: BBPacket | EODMsg | FlushMsg | HorizonMsg):
+        if isinstance(obj, EODMsg):
+            self.tx.put(KIND_EOD, self.node_id)
+            return
+        if isinstance(obj, FlushMsg):
+            self.tx.put(KIND_FLUSH, self.node_id)
+            return
+        if isinstance(obj, HorizonMsg):
+            self.tx.put(KIND_HORIZON, self.node_id, time_ns=obj.time_ns)
+            return
+        if not isinstance(obj, BBPacket):
+            raise TypeError(f'Type {type(obj)} cannot be sent over shared '
+                            f'memory')
+
+        linktype = obj.linktype
+        if obj.dissected:
+            # the packet may have been replaced by a different layer
+            linktype = conf.l2types.layer2num.get(
+                type(obj.scapy_pkt), linktype)
+        name = b''
+        if isinstance(linktype, str):
+            name, linktype = linktype.encode(), 0
+
+        data = obj.to_bytes()
+        if len(data) > MAX_PACKET_SIZE or len(name) > MAX_NAME_SIZE:
+            # raising would stop the socket runner and with it every socket
+            LOGGER.error(f'Dropping a packet of {len(data)} bytes for node '
+                         f'{self.node_id}, the limit is {MAX_PACKET_SIZE}')
+            return
+        self.tx.put(KIND_PACKET, self.node_id, obj.timestamp, obj.time_ns,
+                    linktype, obj.dropped, name, data)
+
+    def poll(self, timeout: float | None = 0.0) -> bool:
+        if self.rx.readable():
+            return True
+        if timeout is None or timeout > 0:
+            select.select([self.rx.rfd], [], [], timeout)
+        return self.rx.readable()
+
+    def recv(self) -> BBPacket | EODMsg | FlushMsg | HorizonMsg:
+        while True:
+            rec = self.rx.get()
+            if rec is not None:
+                break
+            select.select([self.rx.rfd], [], [])
+
+        (kind, dropped, linktype, _, timestamp, time_ns, _, _), name, data = \
+            rec
+        if kind == KIND_EOD:
+            return EODMsg()
+        if kind == KIND_FLUSH:
+            return FlushMsg()
+        if kind == KIND_HORIZON:
+            return HorizonMsg(time_ns)
+
+        pkt = BBPacket.from_raw(data, timestamp,
+                                name.decode() if name else linktype, time_ns)
+        pkt.dropped = bool(dropped)
+        return pkt
+
+    def close(self):
+        pass
+
+
+def shm_pipe(node_id: int,
+             size: int = RING_SIZE) -> tuple[ShmConnection, ShmConnection, list[ShmRing]]:
+    """
+    Counterpart of multiprocessing.Pipe over shared memory
+
+    Args:
+        node_id: See ShmConnection
+        size: Bytes of each of the two rings
+
+    Returns:
+        conn1, conn2, rings: The two ends and the rings, which have to be
+        unlinked by the creator once the connection is no longer used
+    """
+    ring1, ring2 = ShmRing(size), ShmRing(size)
+    return (ShmConnection(ring1, ring2, node_id),
+            ShmConnection(ring2, ring1, node_id),
+            [ring1, ring2])
@@ -0,0 +1,202 @@
+"""
+Transports between the ns-3 sockets and the nodes.
+
+By default the BBSockets are served by socket_runner in a separate process
+and every packet is pickled through a multiprocessing Pipe in each
+direction. With the asyncio transport the BBSockets are served by an asyncio
+event loop in a thread of the processing process instead. Nodes and sockets
+are connected by LocalConnections, which pass the packets by reference. The
+shm transport keeps the socket_runner process but replaces the pipes by
+ring buffers in shared memory, see shmring. Nodes use all kinds of
+connection the same way.
+"""
+import asyncio
+import logging
+import os
+import select
+import selectors
+import threading
+from collections import deque
+from multiprocessing.connection import Connection
+
+from lowcaf.packetprocessing.bbsocket import BBSocket
+from lowcaf.packetprocessing.msgdispatcher import ShutDownReceivedError, \
+    dispatch
+
+LOGGER = logging.getLogger(__name__)
+
+TRANSPORT_PROCESS: str = 'process'  # socket_runner process and pipes
+TRANSPORT_ASYNCIO: str = 'asyncio'  # event loop thread and LocalConnections
+TRANSPORT_SHM: str = 'shm'  # socket_runner process and shared memory rings
+TRANSPORTS: tuple[str, ...] = (TRANSPORT_PROCESS, TRANSPORT_ASYNCIO,
+                               TRANSPORT_SHM)
+
+
+class LocalConnection:
+    """
+    One end of a connection between two threads of the same process with the
+    interface of a multiprocessing Connection. Objects are passed by
+    reference. fileno is readable while objects are waiting, so the
+    connection works with selectors and multiprocessing.connection.wait.
+    """
+
+    def __init__(self):
+        self.peer: LocalConnection | None = None
+
+        self._inbox: deque = deque()
+        # the pipe holds a single byte while _signaled is set
+        self._rfd, self._wfd = os.pipe()
+        os.set_blocking(self._rfd, False)
+        self._signaled: bool = False
+        self._lock: threading.Lock = threading.Lock()
+        self.closed: bool = False
+
+    def fileno(self) -> int:
+        return self._rfd
+
+    def send(self, obj):
+        self.peer._put(obj)
+
+    def _put(self, obj):
+        self._inbox.append(obj)
+        with self._lock:
+            if not self._signaled and not self.closed:
+                self._signaled = True
+                os.write(self._wfd, b'\0')
+
+    def poll(self, timeout: float | None = 0.0) -> bool:
+        if self._inbox:
+            return True
+        if timeout is None or timeout > 0:
+            select.select([self._rfd], [], [], timeout)
+        return len(self._inbox) > 0
+
+    def recv(self):
+        while True:
+            try:
+                obj = self._inbox.popleft()
+                break
+            except IndexError:
+                select.select([self._rfd], [], [])
+
+        if not self._inbox:
+            with self._lock:
+                # the writer signals again for anything appended after this
+                if not self._inbox and self._signaled:
+                    os.read(self._rfd, 1)
+                    self._signaled = False
+        return obj
+
+    def close(self):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            os.close(self._rfd)
+            os.close(self._wfd)
+
+
+def local_pipe() -> tuple[LocalConnection, LocalConnection]:
+    """
+    Counterpart of multiprocessing.Pipe for LocalConnections
+
+    Returns:
+        conn1, conn2: Objects sent on one end are received on the other
+    """
+    conn1, conn2 = LocalConnection(), LocalConnection()
+    conn1.peer, conn2.peer = conn2, conn1
+    return conn1, conn2
+
+
+class LoopSelector:
+    """
+    The part of the selectors interface BBSocket uses, on top of an asyncio
+    event loop. Every registered object is served by dispatch once it
+    becomes readable, or writable if modify asked for it. Sockets waiting
+    for a flush are checked again by a timer, see BBSocket.check_flushed.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop: asyncio.AbstractEventLoop = loop
+        self._timers: dict[BBSocket, asyncio.TimerHandle] = {}
+
+    def register(self, fileobj, events: int, data=None):
+        assert events == selectors.EVENT_READ
+        self.loop.add_reader(fileobj, self._ready, fileobj, data,
+                             selectors.EVENT_READ)
+
+    def modify(self, fileobj, events: int, data=None):
+        """
+        Watch a registered object for writability as well, or not anymore.
+        It stays registered for reading with its original data.
+        """
+        assert events & selectors.EVENT_READ
+        if events & selectors.EVENT_WRITE:
+            self.loop.add_writer(fileobj, self._ready, fileobj, data,
+                                 selectors.EVENT_WRITE)
+        else:
+            self.loop.remove_writer(fileobj)
+
+    def unregister(self, fileobj):
+        self.loop.remove_reader(fileobj)
+        self.loop.remove_writer(fileobj)
+
+    def _ready(self, fileobj, data, mask: int):
+        try:
+            dispatch(self, fileobj, data, mask)
+        except ShutDownReceivedError:
+            self.loop.stop()
+            return
+        if data[0] is not None:
+            self._schedule(data[0])
+
+    def _schedule(self, bb_sock: BBSocket):
+        if bb_sock in self._timers:
+            return
+        delay = bb_sock.check_flushed()
+        if delay is not None:
+            self._timers[bb_sock] = self.loop.call_later(
+                delay, self._recheck, bb_sock)
+
+    def _recheck(self, bb_sock: BBSocket):
+        del self._timers[bb_sock]
+        self._schedule(bb_sock)
+
+
+class SocketThread(threading.Thread):
+    """
+    Serves the BBSockets from an asyncio event loop, the in-process
+    counterpart of running socket_runner in a Process. Like the process it
+    reports connected sockets on cmd and stops once it receives 'Terminate'.
+    """
+
+    def __init__(self, bb_socks: list[BBSocket], cmd: Connection):
+        super().__init__(name='lowcaf-sockets', daemon=True)
+        self.bb_socks: list[BBSocket] = bb_socks
+        self.cmd: Connection = cmd
+
+    def run(self):
+        loop = asyncio.new_event_loop()
+        sel = LoopSelector(loop)
+
+        sel.register(self.cmd, selectors.EVENT_READ, (None, 'Terminate'))
+        for bb_sock in self.bb_socks:
+            LOGGER.debug(
+                f'Loop: Registering Socket {bb_sock.sock.getsockname()}')
+            sel.register(bb_sock.sock, selectors.EVENT_READ,
+                         (bb_sock, bb_sock.accept, [sel, self.cmd]))
+            for node_id, pipe_conn in bb_sock.pipes.items():
+                LOGGER.debug(f'Loop: Registering pipe to node {node_id}')
+                sel.register(pipe_conn, selectors.EVENT_READ,
+                             (bb_sock, bb_sock.process_outgoing, [pipe_conn]))
+            bb_sock.sock.listen(1)
+
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+
+        print('Terminating Socket Thread')
+        for bb_sock in self.bb_socks:
+            if not bb_sock.is_terminated() and bb_sock.conn is not None:
+                bb_sock.finish()
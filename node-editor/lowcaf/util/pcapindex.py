@@ -0,0 +1,138 @@
+"""
+Sidecar index of pcap and pcapng files.
+
+The index holds one entry per record with the offset of its data, its
+timestamp, captured length and link type, so a capture can be read from any
+time on, or in parts, without walking the record headers again. It is stored
+next to the capture as <capture>.idx.npz together with the mtime and size of
+the capture, and rebuilt whenever they changed.
+"""
+import logging
+import os
+from typing import Iterator
+
+import numpy as np
+
+from lowcaf.util.pcapreader import RawReader, Record
+
+LOGGER = logging.getLogger(__name__)
+
+INDEX_DTYPE: np.dtype = np.dtype([
+    ('offset', '<u8'),
+    ('time_ns', '<i8'),
+    ('caplen', '<u4'),
+    ('linktype', '<u2'),
+])
+INDEX_SUFFIX: str = '.idx.npz'
+INDEX_VERSION: int = 1
+NO_TIME: int = -1  # time_ns of records without a timestamp
+
+
+def index_path(file_path: str) -> str:
+    return file_path + INDEX_SUFFIX
+
+
+def build_index(reader: RawReader) -> np.ndarray:
+    """
+    Returns:
+        The index of the records of reader, an array of INDEX_DTYPE
+    """
+    return np.fromiter(
+        ((off, NO_TIME if time_ns is None else time_ns, caplen, linktype)
+         for off, caplen, time_ns, linktype in reader.walk()),
+        INDEX_DTYPE)
+
+
+def _source_stamp(file_path: str) -> np.ndarray:
+    stat = os.stat(file_path)
+    return np.array([INDEX_VERSION, stat.st_mtime_ns, stat.st_size],
+                    dtype=np.int64)
+
+
+def load_index(file_path: str) -> np.ndarray:
+    """
+    Load the index of a capture, it is built and stored first if it is
+    missing or outdated. A capture in a read-only directory is indexed
+    every time.
+
+    Args:
+        file_path: The capture
+
+    Returns:
+        The index, an array of INDEX_DTYPE
+    """
+    path = index_path(file_path)
+    stamp = _source_stamp(file_path)
+    try:
+        with np.load(path) as sidecar:
+            if np.array_equal(sidecar['source'], stamp):
+                return sidecar['index']
+        LOGGER.info(f'{path} is outdated')
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError) as err:
+        LOGGER.warning(f'Ignoring unreadable index {path}: {err}')
+
+    LOGGER.info(f'Indexing {file_path}')
+    with RawReader(file_path) as reader:
+        index = build_index(reader)
+
+    # replaced atomically, readers never see a partial index
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp, 'wb') as file:
+            np.savez(file, index=index, source=stamp)
+        os.replace(tmp, path)
+    except OSError as err:
+        LOGGER.warning(f'Could not store index {path}: {err}')
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+    return index
+
+
+def select_time(index: np.ndarray,
+                start_ns: int | None = None,
+                end_ns: int | None = None) -> np.ndarray:
+    """
+    Returns:
+        The entries of records captured in [start_ns, end_ns), in the order
+        of the file, which does not have to be sorted by time. Records
+        without a timestamp are only kept if there are no bounds.
+    """
+    keep = np.ones(len(index), dtype=bool)
+    if start_ns is not None:
+        keep &= index['time_ns'] >= start_ns
+    if end_ns is not None:
+        keep &= (index['time_ns'] < end_ns) & (index['time_ns'] != NO_TIME)
+    return index[keep]
+
+
+def partition(index: np.ndarray, parts: int) -> list[np.ndarray]:
+    """
+    Split the entries into consecutive parts of about the same number of
+    bytes
+
+    Returns:
+        The parts, some may be empty if there are few entries
+    """
+    ends = np.cumsum(index['caplen'], dtype=np.int64)
+    total = int(ends[-1]) if len(ends) else 0
+    bounds = np.searchsorted(
+        ends, [total * i // parts for i in range(1, parts)], side='right')
+    return np.split(index, bounds)
+
+
+def read_entries(reader: RawReader,
+                 entries: np.ndarray) -> Iterator[Record]:
+    """
+    Read the records of index entries from the capture of the index
+
+    Returns:
+        The records, see RawReader
+    """
+    times_ns = [None if time_ns == NO_TIME else time_ns
+                for time_ns in entries['time_ns'].tolist()]
+    return reader.read_at(entries['offset'].tolist(),
+                          entries['caplen'].tolist(),
+                          times_ns,
+                          entries['linktype'].tolist())
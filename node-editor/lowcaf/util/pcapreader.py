@@ -0,0 +1,281 @@
+"""
+Raw reader for pcap and pcapng files.
+
+The file is memory-mapped and the record headers are walked with struct, no
+packet is dissected. Records are handed out as (data, time_ns, linktype) with
+data being a view into the mapping, so the only copy of a packet is the one
+made by its consumer, e.g., BBPacket.from_raw. Gzip compressed captures are
+decompressed into memory first.
+"""
+import gzip
+import mmap
+import struct
+from typing import Iterator
+
+# (data, time_ns, linktype), time_ns is None if the record has no timestamp
+Record = tuple[memoryview, int | None, int]
+# (offset of the data, captured length, time_ns, linktype), see RawReader.walk
+Position = tuple[int, int, int | None, int]
+
+PCAP_MAGIC_US: int = 0xa1b2c3d4
+PCAP_MAGIC_NS: int = 0xa1b23c4d
+PCAPNG_SHB: int = 0x0a0d0d0a
+PCAPNG_BOM: int = 0x1a2b3c4d
+GZIP_MAGIC: bytes = b'\x1f\x8b'
+
+# pcapng block types
+BLOCK_IDB: int = 0x00000001
+BLOCK_OPB: int = 0x00000002
+BLOCK_SPB: int = 0x00000003
+BLOCK_EPB: int = 0x00000006
+
+# pcapng interface options
+OPT_END: int = 0
+OPT_IF_TSRESOL: int = 9
+OPT_IF_TSOFFSET: int = 14
+
+
+class PcapFormatError(ValueError):
+    pass
+
+
+class RawReader:
+    """
+    Iterates over the records of a pcap or pcapng file
+
+    The data of a record is a read-only view into the file, copy it to keep
+    it around.
+    """
+
+    def __init__(self, file_path: str):
+        """
+        Args:
+            file_path: The capture to read, pcap or pcapng, optionally gzip
+                compressed
+        """
+        self.file_path: str = file_path
+        self._file = open(file_path, 'rb')
+        self._mmap: mmap.mmap | None = None
+
+        if self._file.read(2) == GZIP_MAGIC:
+            self._file.seek(0)
+            with gzip.GzipFile(fileobj=self._file) as gz:
+                self.buf: memoryview | None = memoryview(gz.read())
+        else:
+            self._mmap = mmap.mmap(self._file.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+            self.buf = memoryview(self._mmap)
+
+        if len(self.buf) < 4:
+            self.close()
+            raise PcapFormatError(f'{file_path} is not a capture file')
+
+        magic = int.from_bytes(self.buf[:4], 'little')
+        self.ng: bool = magic == PCAPNG_SHB
+        # link type of the file, of the first interface for pcapng
+        self.linktype: int | None = None
+
+        if not self.ng and magic not in (PCAP_MAGIC_US, PCAP_MAGIC_NS) and \
+                int.from_bytes(self.buf[:4], 'big') not in (PCAP_MAGIC_US,
+                                                             PCAP_MAGIC_NS):
+            self.close()
+            raise PcapFormatError(f'{file_path} is not a capture file, '
+                                  f'magic {magic:#010x}')
+        self._records: Iterator[Record] = self._read(self.walk())
+
+    def __iter__(self) -> Iterator[Record]:
+        return self._records
+
+    def __next__(self) -> Record:
+        return next(self._records)
+
+    def __enter__(self) -> 'RawReader':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def read(self, count: int) -> list[Record]:
+        """
+        Returns:
+            Up to count records, fewer only at the end of the file
+        """
+        records = []
+        for rec in self._records:
+            records.append(rec)
+            if len(records) >= count:
+                break
+        return records
+
+    def walk(self) -> Iterator[Position]:
+        """
+        Walk the record headers of the file from its start, independently of
+        the records read so far
+
+        Returns:
+            The positions of the records
+        """
+        return self._walk_pcapng() if self.ng else self._walk_pcap()
+
+    def _read(self, positions: Iterator[Position]) -> Iterator[Record]:
+        buf = self.buf
+        for off, caplen, time_ns, linktype in positions:
+            yield buf[off:off + caplen], time_ns, linktype
+
+    def read_at(self,
+                offsets: list[int],
+                caplens: list[int],
+                times_ns: list[int | None],
+                linktypes: list[int]) -> Iterator[Record]:
+        """
+        Read records at known positions, e.g., from an index built with walk
+
+        Returns:
+            The records, in the order of the positions
+        """
+        buf = self.buf
+        for off, caplen, time_ns, linktype in zip(offsets, caplens, times_ns,
+                                                  linktypes):
+            yield buf[off:off + caplen], time_ns, linktype
+
+    def _walk_pcap(self) -> Iterator[Position]:
+        buf = self.buf
+        if int.from_bytes(buf[:4], 'little') in (PCAP_MAGIC_US,
+                                                 PCAP_MAGIC_NS):
+            order = '<'
+        else:
+            order = '>'
+        magic, _, _, _, _, _, network = struct.unpack_from(
+            order + 'IHHiIII', buf, 0)
+        # the upper bits may carry the FCS length
+        linktype = network & 0xffff
+        self.linktype = linktype
+        scale = 1 if magic == PCAP_MAGIC_NS else 1_000
+
+        header = struct.Struct(order + 'IIII')
+        unpack_from = header.unpack_from
+        hdr_len = header.size
+        end = len(buf)
+        off = 24
+        while off + hdr_len <= end:
+            sec, frac, caplen, _ = unpack_from(buf, off)
+            off += hdr_len
+            if off + caplen > end:
+                # truncated last record
+                break
+            yield off, caplen, sec * 1_000_000_000 + frac * scale, linktype
+            off += caplen
+
+    def _walk_pcapng(self) -> Iterator[Position]:
+        buf = self.buf
+        end = len(buf)
+        off = 0
+        order = '<'
+        block = struct.Struct('<II')
+        epb = struct.Struct('<IIIII')
+        # per interface of the current section: (linktype, tsmul, tsdiv,
+        # tsoffset in ns), the timestamp in ns is ts * tsmul // tsdiv
+        ifaces: list[tuple[int, int, int, int]] = []
+
+        while off + 12 <= end:
+            btype, blen = block.unpack_from(buf, off)
+            if btype == PCAPNG_SHB:
+                bom = int.from_bytes(buf[off + 8:off + 12], 'little')
+                if bom == PCAPNG_BOM:
+                    order = '<'
+                elif int.from_bytes(buf[off + 8:off + 12], 'big') == \
+                        PCAPNG_BOM:
+                    order = '>'
+                else:
+                    raise PcapFormatError(
+                        f'Invalid section header at offset {off}')
+                block = struct.Struct(order + 'II')
+                epb = struct.Struct(order + 'IIIII')
+                _, blen = block.unpack_from(buf, off)
+                ifaces = []
+            if blen < 12 or off + blen > end:
+                # truncated last block
+                break
+
+            body = off + 8
+            if btype == BLOCK_EPB:
+                if_id, ts_high, ts_low, caplen, _ = epb.unpack_from(buf, body)
+                linktype, tsmul, tsdiv, tsoffset = ifaces[if_id]
+                yield (body + epb.size, caplen,
+                       ((ts_high << 32) | ts_low) * tsmul // tsdiv + tsoffset,
+                       linktype)
+            elif btype == BLOCK_SPB:
+                linktype = ifaces[0][0]
+                # the captured length is bounded by the block
+                caplen = min(struct.unpack_from(order + 'I', buf, body)[0],
+                             blen - 16)
+                yield body + 4, caplen, None, linktype
+            elif btype == BLOCK_IDB:
+                ifaces.append(self._read_idb(order, body, off + blen - 4))
+                if self.linktype is None:
+                    self.linktype = ifaces[-1][0]
+            elif btype == BLOCK_OPB:
+                if_id, _, ts_high, ts_low, caplen, _ = struct.unpack_from(
+                    order + 'HHIIII', buf, body)
+                linktype, tsmul, tsdiv, tsoffset = ifaces[if_id]
+                yield (body + 20, caplen,
+                       ((ts_high << 32) | ts_low) * tsmul // tsdiv + tsoffset,
+                       linktype)
+
+            off += blen
+
+    def _read_idb(self, order: str, body: int,
+                  end: int) -> tuple[int, int, int, int]:
+        """
+        Args:
+            order: Byte order of the section
+            body: Offset of the body of the interface description block
+            end: Offset of the trailing block length
+
+        Returns:
+            The linktype, the multiplier and divisor from timestamps to ns and
+            the offset of the timestamps in ns
+        """
+        buf = self.buf
+        linktype = struct.unpack_from(order + 'H', buf, body)[0]
+        # microseconds unless stated otherwise
+        tsmul, tsdiv, tsoffset = 1_000, 1, 0
+
+        off = body + 8
+        while off + 4 <= end:
+            code, length = struct.unpack_from(order + 'HH', buf, off)
+            off += 4
+            if code == OPT_END:
+                break
+            if code == OPT_IF_TSRESOL:
+                resol = buf[off]
+                if resol & 0x80:
+                    tsmul, tsdiv = 1_000_000_000, 1 << (resol & 0x7f)
+                elif resol <= 9:
+                    tsmul, tsdiv = 10 ** (9 - resol), 1
+                else:
+                    tsmul, tsdiv = 1, 10 ** (resol - 9)
+            elif code == OPT_IF_TSOFFSET:
+                tsoffset = struct.unpack_from(
+                    order + 'q', buf, off)[0] * 1_000_000_000
+            off += (length + 3) & ~3
+
+        return linktype, tsmul, tsdiv, tsoffset
+
+    def close(self):
+        """
+        Release the file. Views handed out before keep the mapping alive
+        until they are garbage collected.
+        """
+        self._records = iter(())
+        if self.buf is not None:
+            self.buf.release()
+            self.buf = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # views are still referenced, the mapping goes with the last
+                pass
+            self._mmap = None
+        self._file.close()
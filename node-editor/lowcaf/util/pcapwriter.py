@@ -0,0 +1,136 @@
+"""
+Buffered writer for pcap files.
+
+Records are appended to a large buffer on the caller's thread. Full buffers
+are written to the file by a background thread, at most max_pending of them
+wait for it, so the memory stays bounded and the caller only blocks if the
+disk falls behind. The file uses nanosecond timestamps.
+"""
+import logging
+import queue
+import struct
+import threading
+
+from scapy.data import DLT_EN10MB
+
+from lowcaf.util.pcapreader import PCAP_MAGIC_NS
+
+LOGGER = logging.getLogger(__name__)
+
+# magic, version major, version minor, thiszone, sigfigs, snaplen, network
+FILE_HEADER: struct.Struct = struct.Struct('<IHHiIII')
+# seconds, nanoseconds, captured length, original length
+RECORD_HEADER: struct.Struct = struct.Struct('<IIII')
+SNAPLEN: int = 0x40000
+
+BUFFER_SIZE: int = 1 << 20  # Bytes collected before they are written
+MAX_PENDING: int = 8  # Full buffers waiting for the writer thread
+
+
+class RawWriter:
+    """
+    Writes raw packets to a pcap file. The link type of the file is the one
+    of the first packet.
+    """
+
+    def __init__(self,
+                 file_path: str,
+                 buffer_size: int = BUFFER_SIZE,
+                 max_pending: int = MAX_PENDING):
+        """
+        Args:
+            file_path: The file to create
+            buffer_size: See BUFFER_SIZE
+            max_pending: See MAX_PENDING
+        """
+        self.file_path: str = file_path
+        self.buffer_size: int = buffer_size
+        self.linktype: int | None = None
+
+        # unbuffered, the records are collected in _buff
+        self._file = open(file_path, 'wb', buffering=0)
+        self._buff: bytearray = bytearray()
+        self._pending: queue.Queue = queue.Queue(max_pending)
+        # raised by the writer thread, re-raised on the caller's thread
+        self._error: Exception | None = None
+        self._thread: threading.Thread | None = threading.Thread(
+            target=self._write_loop, name=f'RawWriter({file_path})',
+            daemon=True)
+        self._thread.start()
+
+    def __enter__(self) -> 'RawWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write(self, data: bytes | memoryview, time_ns: int, linktype: int):
+        """
+        Append a record
+
+        Args:
+            data: The raw bytes of the packet
+            time_ns: Capture time in ns since epoch
+            linktype: Pcap link type of data, the file header is written with
+                the first record
+        """
+        if self.linktype is None:
+            self._write_header(linktype)
+
+        buff = self._buff
+        sec, nsec = divmod(time_ns, 1_000_000_000)
+        buff += RECORD_HEADER.pack(sec, nsec, len(data), len(data))
+        buff += data
+        if len(buff) >= self.buffer_size:
+            self.flush()
+
+    def _write_header(self, linktype: int):
+        self.linktype = linktype
+        self._buff += FILE_HEADER.pack(PCAP_MAGIC_NS, 2, 4, 0, 0, SNAPLEN,
+                                       linktype)
+
+    def flush(self):
+        """
+        Hand the collected records to the writer thread, waits while
+        max_pending buffers are already waiting
+        """
+        if self._error is not None:
+            raise RuntimeError(
+                f'Writing {self.file_path} failed') from self._error
+        if self._buff:
+            self._pending.put(self._buff)
+            self._buff = bytearray()
+
+    def _write_loop(self):
+        while (buff := self._pending.get()) is not None:
+            if self._error is not None:
+                # drop the rest, the caller learns about it on its next flush
+                continue
+            try:
+                view = memoryview(buff)
+                while view:
+                    view = view[self._file.write(view):]
+            except OSError as err:
+                LOGGER.exception(f'Writing {self.file_path} failed')
+                self._error = err
+
+    def close(self):
+        """
+        Write everything and close the file. A file without packets gets
+        the link type Ethernet.
+        """
+        if self._thread is None:
+            return
+        if self.linktype is None:
+            self._write_header(DLT_EN10MB)
+        try:
+            self.flush()
+        finally:
+            self._pending.put(None)
+            self._thread.join()
+            self._thread = None
+            self._file.close()
+
+        if self._error is not None:
+            raise RuntimeError(
+                f'Writing {self.file_path} failed') from self._error
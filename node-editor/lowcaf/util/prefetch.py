@@ -0,0 +1,239 @@
+"""
+Read-ahead for file sources.
+
+A Prefetcher runs a reader, i.e., a generator of chunks of packets, on a
+worker that fills a bounded queue ahead of the node consuming it. The node
+only dequeues, so reading overlaps with processing and with the times the
+processor waits for the simulation. Threads suit readers waiting on I/O,
+processes readers that spend their time decoding. Chunks leave a worker
+process in the format of pack_packets.
+
+Both kinds of workers signal new chunks through a pipe, which the node
+returns as waitable.
+"""
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from multiprocessing.connection import Connection, Pipe
+from typing import Callable, Iterator
+
+from lowcaf.packetprocessing.bbpacket import BBPacket, pack_packets, \
+    unpack_packets
+
+LOGGER = logging.getLogger(__name__)
+
+WORKER_NONE: str = 'none'  # Read synchronously in the scheduler loop
+WORKER_THREAD: str = 'thread'
+WORKER_PROCESS: str = 'process'
+WORKERS: tuple[str, ...] = (WORKER_NONE, WORKER_THREAD, WORKER_PROCESS)
+
+# Every message from a worker process starts with its kind, an empty message
+# ends the stream
+MSG_PACKETS: bytes = b'P'  # Followed by a batch of pack_packets
+MSG_ERROR: bytes = b'E'  # Followed by the description of the error
+
+# Called with the args of the Prefetcher, must be picklable for processes
+ChunkReader = Callable[..., Iterator[list[BBPacket]]]
+
+
+def _fill_pipe(read: ChunkReader,
+               args: tuple,
+               conn: Connection,
+               slots: threading.Semaphore,
+               stop: threading.Event):
+    """
+    Body of a worker process, sends the chunks of read over conn while a
+    slot is free
+    """
+    try:
+        for chunk in read(*args):
+            while not slots.acquire(timeout=Prefetcher.STOP_POLL):
+                if stop.is_set():
+                    return
+            conn.send_bytes(pack_packets(chunk, bytearray(MSG_PACKETS)))
+    except Exception as err:
+        LOGGER.exception('Prefetching failed')
+        conn.send_bytes(MSG_ERROR + repr(err).encode())
+    finally:
+        conn.send_bytes(b'')
+        conn.close()
+
+
+class Prefetcher:
+    """
+    Runs a ChunkReader ahead of its consumer on a thread or a process
+    """
+
+    # seconds between checks whether a blocked worker should stop
+    STOP_POLL: float = 0.1
+    # seconds to wait for a worker on close
+    JOIN_TIMEOUT: float = 5.0
+
+    def __init__(self,
+                 read: ChunkReader,
+                 args: tuple,
+                 depth: int,
+                 worker: str = WORKER_THREAD,
+                 name: str | None = None):
+        """
+        Args:
+            read: Generator of the chunks, called with args on the worker
+            args: Arguments of read
+            depth: Number of chunks the worker reads ahead
+            worker: WORKER_THREAD or WORKER_PROCESS
+            name: Name of the worker in messages, defaults to the one of read
+        """
+        if worker not in (WORKER_THREAD, WORKER_PROCESS):
+            raise ValueError(f'Unknown prefetch worker {worker}')
+        assert depth > 0
+
+        self.read: ChunkReader = read
+        self.args: tuple = args
+        self.depth: int = depth
+        self.worker: str = worker
+        self.name: str = name if name is not None else read.__name__
+        # the end of the stream was received
+        self.done: bool = False
+
+        self._conn: Connection | None = None
+        self._queue: queue.Queue | None = None
+        self._wakeup: Connection | None = None
+        self._stop: threading.Event | None = None
+        self._slots: threading.Semaphore | None = None
+        self._runner: threading.Thread | multiprocessing.Process | None = \
+            None
+
+    def start(self):
+        if self.worker == WORKER_THREAD:
+            self._queue = queue.Queue(self.depth)
+            self._stop = threading.Event()
+            self._conn, self._wakeup = Pipe(duplex=False)
+            self._runner = threading.Thread(
+                target=self._fill_queue, name=self.name, daemon=True)
+        else:
+            self._stop = multiprocessing.Event()
+            self._slots = multiprocessing.Semaphore(self.depth)
+            self._conn, child = Pipe(duplex=False)
+            self._runner = multiprocessing.Process(
+                target=_fill_pipe,
+                args=(self.read, self.args, child, self._slots, self._stop),
+                name=self.name, daemon=True)
+        self._runner.start()
+        if self.worker == WORKER_PROCESS:
+            child.close()
+
+    def _fill_queue(self):
+        """
+        Body of a worker thread. A wakeup is sent whenever a chunk is put
+        into an empty queue. The stream ends with None, or with the exception
+        raised by read.
+        """
+        item = None
+        try:
+            for chunk in self.read(*self.args):
+                if not self._put(chunk):
+                    return
+        except Exception as err:
+            LOGGER.exception('Prefetching failed')
+            item = err
+        self._put(item)
+
+    def _put(self, item: list[BBPacket] | Exception | None) -> bool:
+        while True:
+            try:
+                self._queue.put(item, timeout=self.STOP_POLL)
+                break
+            except queue.Full:
+                if self._stop.is_set():
+                    return False
+        # the consumer only waits after it found the queue empty
+        if self._queue.qsize() <= 1:
+            self._wakeup.send_bytes(b'\0')
+        return True
+
+    def get(self) -> list[BBPacket] | None:
+        """
+        Take the next chunk without blocking
+
+        Returns:
+            The chunk, None if none is available (yet), see done
+        """
+        if self.done:
+            return None
+        if self.worker == WORKER_THREAD:
+            return self._get_queued()
+        return self._get_piped()
+
+    def _get_queued(self) -> list[BBPacket] | None:
+        try:
+            item = self._queue.get_nowait()
+        except queue.Empty:
+            # consume the wakeups of chunks taken before, a chunk put from now
+            # on sends a new one
+            while self._conn.poll():
+                self._conn.recv_bytes()
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return None
+
+        if item is None:
+            self.done = True
+        elif isinstance(item, Exception):
+            self.done = True
+            raise RuntimeError(f'{self.name} failed') from item
+        return item
+
+    def _get_piped(self) -> list[BBPacket] | None:
+        if not self._conn.poll():
+            return None
+        try:
+            buff = self._conn.recv_bytes()
+        except EOFError:
+            LOGGER.error(f'{self.name} terminated early')
+            buff = b''
+
+        if not buff:
+            self.done = True
+            return None
+        self._slots.release()
+        if buff[:1] == MSG_ERROR:
+            self.done = True
+            raise RuntimeError(f'{self.name} failed: {buff[1:].decode()}')
+        return unpack_packets(memoryview(buff)[len(MSG_PACKETS):])
+
+    def waitable(self) -> list:
+        """
+        Returns:
+            The pipe that becomes readable once a chunk may be available,
+            see RNode.waitable
+        """
+        return [] if self.done else [self._conn]
+
+    def close(self):
+        """
+        Stop the worker, chunks not taken yet are dropped
+        """
+        if self._runner is None:
+            return
+        self._stop.set()
+        deadline = time.monotonic() + self.JOIN_TIMEOUT
+        while self._runner.is_alive() and time.monotonic() < deadline:
+            # a process may be blocked on sending its last messages
+            while self.worker == WORKER_PROCESS and self._conn.poll():
+                try:
+                    self._conn.recv_bytes()
+                except EOFError:
+                    break
+            self._runner.join(self.STOP_POLL)
+        if self._runner.is_alive():
+            LOGGER.warning(f'{self.name} did not stop')
+            if isinstance(self._runner, multiprocessing.Process):
+                self._runner.terminate()
+        self._runner = None
+
+        self._conn.close()
+        if self._wakeup is not None:
+            self._wakeup.close()
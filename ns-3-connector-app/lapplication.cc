@@ -14,12 +14,16 @@
 #include "ns3/core-module.h"
 #include "ns3/network-module.h"
 
+#include <algorithm>
 #include <arpa/inet.h>
+#include <limits.h>
 #include <endian.h>
+#include <errno.h>
 #include <iostream>
 #include <malloc.h>
 #include <math.h>
 #include <netinet/in.h>
+#include <sys/mman.h>
 #include <sys/socket.h>
 #include <sys/types.h>
 #include <thread>
@@ -32,6 +36,8 @@ namespace ns3
 
     NS_LOG_COMPONENT_DEFINE("LApplication");
 
+    std::vector<LApplication *> LApplication::LInstances;
+
     /**
      * @brief Helper to convert MAC48 byte representation into string representation
      *
@@ -90,6 +96,18 @@ namespace ns3
     }
 
     LApplication::LApplication()
+        : ClientSocket(-1),
+          LRcvRing(NULL),
+          LRcvStart(0),
+          LServerCommBuffer(NULL),
+          LServerCommBufferLen(0),
+          commactive(false),
+          LPeerCaps(0),
+          LSendBufferCount(0),
+          LFlushScheduled(false),
+          LHorizon(0),
+          LAnnounced(0),
+          LAnnouncedAny(false)
     {
         NS_LOG_DEBUG("Create LApplication");
     }
@@ -97,6 +115,10 @@ namespace ns3
     LApplication::~LApplication()
     {
         NS_LOG_DEBUG("Destruct LApplication");
+        if (LRcvRing != NULL)
+        {
+            munmap(LRcvRing, 2 * RCV_RING_SIZE);
+        }
     }
 
     void
@@ -106,11 +128,8 @@ namespace ns3
 
         if (this->LType == Source)
         {
-            // Schedule data content checking from the Lowcaf framework
-            for (int i = 0; i < (int)m_stopTime.GetMilliSeconds(); i++)
-            {
-                Simulator::Schedule(MilliSeconds(i), &LApplication::LListenForServerData, this);
-            }
+            // Check for data from the Lowcaf framework. Every listen schedules the next one
+            Simulator::ScheduleNow(&LApplication::LListenForServerData, this);
         }
         InitLServerCommunication();
     }
@@ -123,6 +142,9 @@ namespace ns3
         {
             if (ClientSocket >= 0)
             {
+                // Packets that are still waiting for a batch must go out first
+                LFlushSendBuffer();
+
                 NS_LOG_INFO("Sending End of Processing");
                 // Send EndOfProcessing
                 char endofprocessing = END_OF_SIM_CMD;
@@ -138,6 +160,8 @@ namespace ns3
     LApplication::DoDispose(void)
     {
         NS_LOG_DEBUG("Dispose LApplication");
+        LInstances.erase(std::remove(LInstances.begin(), LInstances.end(), this),
+                         LInstances.end());
         Application::DoDispose();
     }
 
@@ -209,6 +233,11 @@ namespace ns3
         LNodeID = lnodeid;
         NS_LOG_INFO("Setting Lowcaf node ID = " << LNodeID);
 
+        if (std::find(LInstances.begin(), LInstances.end(), this) == LInstances.end())
+        {
+            LInstances.push_back(this);
+        }
+
         // Start Server, Listening for Packets
         // Init Callback for Nodes that are NOT Sources
         switch (LType)
@@ -240,6 +269,97 @@ namespace ns3
             return;
         }
 
+        LReceiveServerData(false);
+
+        if (LPeerCaps & CAP_SYNC)
+        {
+            // Lowcaf may still send packets for the current time. Tell it how far all
+            // applications are and wait for its grant
+            while (commactive && LHorizon <= (u_int64_t)Simulator::Now().GetNanoSeconds())
+            {
+                for (LApplication *app : LInstances)
+                {
+                    app->LAnnounceHorizon();
+                }
+                LReceiveServerData(true);
+            }
+        }
+
+        LScheduleListen();
+    }
+
+    void
+    LApplication::LScheduleListen()
+    {
+        if (!commactive)
+        {
+            return;
+        }
+
+        Time now = Simulator::Now();
+        Time next;
+        if (LPeerCaps & CAP_SYNC)
+        {
+            if (LHorizon == HORIZON_END)
+            {
+                NS_LOG_INFO("Lowcaf granted the end of the simulation: Stop Listening");
+                return;
+            }
+            next = NanoSeconds(LHorizon);
+        }
+        else
+        {
+            next = now + MilliSeconds(POLL_INTERVAL_MS);
+        }
+
+        if (next >= m_stopTime)
+        {
+            return;
+        }
+        Simulator::Schedule(next - now, &LApplication::LListenForServerData, this);
+    }
+
+    void
+    LApplication::LAnnounceHorizon()
+    {
+        if (LType == Source || ClientSocket < 0 || !commactive || !(LPeerCaps & CAP_SYNC))
+        {
+            return;
+        }
+
+        u_int64_t now = Simulator::Now().GetNanoSeconds();
+        if (LAnnouncedAny && now <= LAnnounced)
+        {
+            return;
+        }
+
+        // Packets that are still waiting for a batch must arrive before the horizon
+        LFlushSendBuffer();
+
+        u_int8_t horizon[CMD_SIZE + HORIZON_SIZE];
+        u_int64_t nnow = htobe64(now);
+        horizon[0] = HORIZON_CMD;
+        memcpy(horizon + CMD_SIZE, &nnow, HORIZON_SIZE);
+
+        struct iovec iov[1];
+        iov[0].iov_base = horizon;
+        iov[0].iov_len = sizeof(horizon);
+        if (LWriteAll(iov, 1))
+        {
+            NS_LOG_DEBUG("Announced horizon " << now << " to Lowcaf Server");
+            LAnnounced = now;
+            LAnnouncedAny = true;
+        }
+    }
+
+    void
+    LApplication::LReceiveServerData(bool block)
+    {
+        if (!commactive)
+        {
+            return;
+        }
+
         // Check whether Socket is broken
         int error = 0;
         socklen_t len = sizeof(error);
@@ -252,12 +372,13 @@ namespace ns3
         }
 
         struct timeval timeout;
-        timeout.tv_usec = 0.0;
+        timeout.tv_sec = 0;
+        timeout.tv_usec = 0;
         fd_set rfds;
 
         FD_ZERO(&rfds);
         FD_SET(ClientSocket, &rfds);
-        int ret = select(ClientSocket + 1, &rfds, NULL, NULL, &timeout);
+        int ret = select(ClientSocket + 1, &rfds, NULL, NULL, block ? NULL : &timeout);
 
         // Check if data available. If not, return
         if (ret <= 0)
@@ -267,51 +388,51 @@ namespace ns3
 
         NS_LOG_INFO("Got new data from Lowcaf Server");
 
-        char messagebuf[MAX_PACKET_SIZE];
         int rcvlen;
         char command;
 
-        // Do receive
-        rcvlen = recv(ClientSocket, messagebuf, MAX_PACKET_SIZE, 0);
+        u_int32_t space = RCV_RING_SIZE - LServerCommBufferLen;
+        if (space == 0)
+        {
+            NS_LOG_ERROR("Message does not fit into the receive buffer");
+            exit(1);
+        }
+
+        // Receive directly behind the unprocessed data. Thanks to the second mapping, this is
+        // contiguous even if it wraps around the end of the ring
+        rcvlen = recv(ClientSocket, LServerCommBuffer + LServerCommBufferLen, space, 0);
 
         if (rcvlen > 0)
         {
             NS_LOG_DEBUG("Received " << rcvlen << " bytes from Lowcaf Server");
 
-            // Got nonempty data, push onto queue
-            memcpy(LServerCommBuffer + LServerCommBufferLen, messagebuf, rcvlen);
             LServerCommBufferLen = LServerCommBufferLen + rcvlen; // update len
             NS_LOG_DEBUG("Receive Queue Len is " << LServerCommBufferLen);
 
-            while (1)
+            while (commactive && LServerCommBufferLen > 0)
             {
-                // No more data
-                if (LServerCommBufferLen == 0)
-                {
-                    break;
-                }
+                int ret = 0;
 
                 command = LServerCommBuffer[0];
                 NS_LOG_INFO("Got message with command=" << (int)command);
 
                 if (command == PACKET_CMD)
                 {
-                    try
-                    {
-                        while (!LProcessRcvPacket())
-                        {
-                            NS_LOG_DEBUG("Processing another Packet...");
-                        }
-                        NS_LOG_DEBUG("Processing done, Buffer Size is " << LServerCommBufferLen);
-                    }
-                    catch (const char *msg)
-                    {
-                        NS_LOG_WARN("Error interpreting received data: " << msg);
-                    }
-                    continue;
+                    ret = LProcessRcvPacket();
                 }
-
-                if (command == END_OF_SIM_CMD)
+                else if (command == BATCH_CMD)
+                {
+                    ret = LProcessRcvBatch();
+                }
+                else if (command == HELLO_CMD)
+                {
+                    ret = LProcessHello();
+                }
+                else if (command == HORIZON_CMD)
+                {
+                    ret = LProcessHorizon();
+                }
+                else if (command == END_OF_SIM_CMD)
                 {
                     // Received END-OF-SIM-Signal: Shutdown Socket and schedule all received events
                     NS_LOG_INFO("Received End of Sim: Shutting down");
@@ -323,6 +444,7 @@ namespace ns3
                 else if (command == CURRENTLY_NO_DATA)
                 {
                     NS_LOG_DEBUG("Received NOP: Stop Listening for now");
+                    LConsumeBuffer(CMD_SIZE);
                 }
                 else
                 {
@@ -330,6 +452,15 @@ namespace ns3
                     NS_LOG_ERROR("ERROR: Did not recognize command!");
                     // Print first 30 bytes in message buffer
                     bufferprinthelper(LServerCommBuffer, LServerCommBufferLen, 30);
+                    // We cannot find the start of the next message anymore
+                    LServerCommBufferLen = 0;
+                }
+
+                if (ret < 0)
+                {
+                    // Message is incomplete, wait for more data
+                    NS_LOG_DEBUG("Processing done, Buffer Size is " << LServerCommBufferLen);
+                    break;
                 }
             }
         }
@@ -342,18 +473,8 @@ namespace ns3
     int
     LApplication::LProcessRcvPacket()
     {
-        char *dstmac;
-        Mac48Address destinationmac = Mac48Address();
-        u_int16_t prototype;
-        u_int64_t delay;
-        u_int32_t pktlen;
-        u_int8_t *pktdata;
-
-        // The message must at least contain the fixed length fields
-        if (LServerCommBufferLen < CMD_SIZE + DELAY_SIZE + PROTO_TYPE_SIZE + PKT_LEN_SIZE)
+        if (LServerCommBufferLen < CMD_SIZE)
         {
-            NS_LOG_DEBUG("Packet too small for processing, need at least "
-                         << CMD_SIZE + DELAY_SIZE + PROTO_TYPE_SIZE + PKT_LEN_SIZE << " Bytes");
             return -1;
         }
 
@@ -365,49 +486,209 @@ namespace ns3
             return -1;
         }
 
-        memcpy(&delay, LServerCommBuffer + CMD_SIZE, DELAY_SIZE);
-        memcpy(&pktlen, LServerCommBuffer + CMD_SIZE + DELAY_SIZE + PROTO_TYPE_SIZE, PKT_LEN_SIZE);
+        int recordsize = LScheduleRecord(LServerCommBuffer + CMD_SIZE,
+                                         LServerCommBufferLen - CMD_SIZE);
+        if (recordsize < 0)
+        {
+            return -1;
+        }
 
-        pktdata = (u_int8_t *)LServerCommBuffer + CMD_SIZE + DELAY_SIZE + PROTO_TYPE_SIZE + PKT_LEN_SIZE;
+        // Remove packet from buffer and set its Len new
+        LConsumeBuffer(CMD_SIZE + recordsize);
+        return 0;
+    }
 
-        // Get Dst-Mac
-        dstmac = mac48tostr(pktdata);
-        destinationmac = Mac48Address(dstmac);
+    int
+    LApplication::LProcessRcvBatch()
+    {
+        u_int32_t headersize = CMD_SIZE + BATCH_COUNT_SIZE + BATCH_LEN_SIZE;
+        u_int32_t count;
+        u_int32_t bodylen;
 
-        // Get Ethertype
-        memcpy(&prototype, pktdata + ETH_MAC_SIZE * 2, ETH_PROTO_TYPE_SIZE);
+        if (LServerCommBufferLen < headersize)
+        {
+            return -1;
+        }
+
+        memcpy(&count, LServerCommBuffer + CMD_SIZE, BATCH_COUNT_SIZE);
+        memcpy(&bodylen, LServerCommBuffer + CMD_SIZE + BATCH_COUNT_SIZE, BATCH_LEN_SIZE);
+        count = ntohl(count);
+        bodylen = ntohl(bodylen);
+
+        if (headersize + bodylen > RCV_RING_SIZE)
+        {
+            NS_LOG_ERROR("Batch of " << bodylen << " bytes does not fit into the receive buffer");
+            exit(1);
+        }
+
+        if (headersize + bodylen > LServerCommBufferLen)
+        {
+            NS_LOG_DEBUG("Batch seems to be incomplete yet");
+            return -1;
+        }
+
+        NS_LOG_DEBUG("Got batch with " << count << " packets");
+
+        const char *record = LServerCommBuffer + headersize;
+        u_int32_t remaining = bodylen;
+        for (u_int32_t i = 0; i < count; i++)
+        {
+            int recordsize = LScheduleRecord(record, remaining);
+            if (recordsize < 0)
+            {
+                NS_LOG_WARN("Batch is malformed, dropping " << count - i << " packets");
+                break;
+            }
+            record += recordsize;
+            remaining -= recordsize;
+        }
+
+        LConsumeBuffer(headersize + bodylen);
+        return 0;
+    }
+
+    int
+    LApplication::LProcessHello()
+    {
+        u_int16_t version;
+        u_int32_t caps;
+
+        if (LServerCommBufferLen < CMD_SIZE + VERSION_SIZE + CAPS_SIZE)
+        {
+            return -1;
+        }
+
+        memcpy(&version, LServerCommBuffer + CMD_SIZE, VERSION_SIZE);
+        memcpy(&caps, LServerCommBuffer + CMD_SIZE + VERSION_SIZE, CAPS_SIZE);
+
+        LPeerCaps = ntohl(caps) & LOCAL_CAPS;
+        NS_LOG_INFO("Lowcaf Server speaks version " << ntohs(version) << ", using capabilities "
+                                                     << LPeerCaps);
+
+        LConsumeBuffer(CMD_SIZE + VERSION_SIZE + CAPS_SIZE);
+        return 0;
+    }
+
+    int
+    LApplication::LProcessHorizon()
+    {
+        u_int64_t horizon;
+
+        if (LServerCommBufferLen < CMD_SIZE + HORIZON_SIZE)
+        {
+            return -1;
+        }
+
+        memcpy(&horizon, LServerCommBuffer + CMD_SIZE, HORIZON_SIZE);
+        horizon = be64toh(horizon);
+        NS_LOG_DEBUG("Lowcaf Server granted horizon " << horizon);
+
+        // Grants only ever grow
+        LHorizon = std::max(LHorizon, horizon);
+
+        LConsumeBuffer(CMD_SIZE + HORIZON_SIZE);
+        return 0;
+    }
+
+    int
+    LApplication::LScheduleRecord(const char *record, u_int32_t available)
+    {
+        Mac48Address destinationmac = Mac48Address();
+        u_int16_t prototype;
+        u_int64_t delay;
+        u_int32_t pktlen;
+        const u_int8_t *pktdata;
+
+        // The record must at least contain the fixed length fields
+        if (available < DELAY_SIZE + PROTO_TYPE_SIZE + PKT_LEN_SIZE)
+        {
+            NS_LOG_DEBUG("Packet too small for processing, need at least "
+                         << DELAY_SIZE + PROTO_TYPE_SIZE + PKT_LEN_SIZE << " Bytes");
+            return -1;
+        }
+
+        memcpy(&delay, record, DELAY_SIZE);
+        memcpy(&pktlen, record + DELAY_SIZE + PROTO_TYPE_SIZE, PKT_LEN_SIZE);
+        delay = be64toh(delay);
+        pktlen = ntohl(pktlen);
+
+        int recordsize = DELAY_SIZE + PROTO_TYPE_SIZE + PKT_LEN_SIZE + pktlen;
 
         // Not enough data to process next packet
-        if (CMD_SIZE + DELAY_SIZE + PROTO_TYPE_SIZE + PKT_LEN_SIZE + ntohl(pktlen) >
-            LServerCommBufferLen)
+        if ((u_int32_t)recordsize > available)
         {
             NS_LOG_DEBUG("Packet data seems to be incomplete yet");
             return -1;
         }
 
-        NS_LOG_DEBUG("\tDelay: " << htobe64(delay));
-        NS_LOG_DEBUG("\tDst-MAC: " << dstmac);
+        if (pktlen < ETH_HEADER_SIZE)
+        {
+            NS_LOG_WARN("Dropping packet without Ethernet header");
+            return recordsize;
+        }
+
+        pktdata = (const u_int8_t *)record + DELAY_SIZE + PROTO_TYPE_SIZE + PKT_LEN_SIZE;
+
+        // Get Dst-Mac
+        destinationmac.CopyFrom(pktdata);
+
+        // Get Ethertype
+        memcpy(&prototype, pktdata + ETH_MAC_SIZE * 2, ETH_PROTO_TYPE_SIZE);
+
+        NS_LOG_DEBUG("\tDelay: " << delay);
+        NS_LOG_DEBUG("\tDst-MAC: " << destinationmac);
         NS_LOG_DEBUG("\tProtocol type: " << ntohs(prototype));
-        NS_LOG_DEBUG("\tPacket length: " << ntohl(pktlen));
-        NS_LOG_INFO("Got Packet with Delay=" << htobe64(delay) << ", Destination=" << destinationmac);
+        NS_LOG_DEBUG("\tPacket length: " << pktlen);
+        NS_LOG_INFO("Got Packet with Delay=" << delay << ", Destination=" << destinationmac);
 
         // Create packet without ethernet header
-        Ptr<Packet> pktptr = Create<Packet>(pktdata + ETH_HEADER_SIZE, ntohl(pktlen) - ETH_HEADER_SIZE);
+        Ptr<Packet> pktptr = Create<Packet>(pktdata + ETH_HEADER_SIZE, pktlen - ETH_HEADER_SIZE);
 
         // SCHEDULE PACKET
         NS_LOG_DEBUG("Scheduling packet");
         Simulator::Schedule(
-            MicroSeconds(htobe64(delay)),
+            MicroSeconds(delay),
             MakeCallback(&LApplication::LSendPacket, this, pktptr, destinationmac, ntohs(prototype)));
 
         NS_LOG_DEBUG("Scheduling successful");
 
-        // Remove packet from buffer and set its Len new
-        int packetsize = CMD_SIZE + DELAY_SIZE + PROTO_TYPE_SIZE + PKT_LEN_SIZE + ntohl(pktlen);
-        memcpy(LServerCommBuffer, LServerCommBuffer + packetsize, LServerCommBufferLen - packetsize);
-        LServerCommBufferLen = LServerCommBufferLen - packetsize;
+        return recordsize;
+    }
 
-        return 0;
+    void
+    LApplication::LConsumeBuffer(u_int32_t len)
+    {
+        // Nothing is moved, the start just advances around the ring
+        LRcvStart = (LRcvStart + len) % RCV_RING_SIZE;
+        LServerCommBuffer = LRcvRing + LRcvStart;
+        LServerCommBufferLen = LServerCommBufferLen - len;
+    }
+
+    void
+    LApplication::LMapRcvRing()
+    {
+        int fd = memfd_create("lowcaf-rcv", 0);
+        if (fd < 0 || ftruncate(fd, RCV_RING_SIZE) < 0)
+        {
+            NS_LOG_ERROR("Error setting up receive buffer");
+            exit(1);
+        }
+
+        // Reserve twice the size, then map the same memory into both halves
+        char *ring = (char *)mmap(NULL, 2 * RCV_RING_SIZE, PROT_NONE, MAP_PRIVATE | MAP_ANONYMOUS,
+                                  -1, 0);
+        if (ring == MAP_FAILED ||
+            mmap(ring, RCV_RING_SIZE, PROT_READ | PROT_WRITE, MAP_SHARED | MAP_FIXED, fd, 0) ==
+                MAP_FAILED ||
+            mmap(ring + RCV_RING_SIZE, RCV_RING_SIZE, PROT_READ | PROT_WRITE,
+                 MAP_SHARED | MAP_FIXED, fd, 0) == MAP_FAILED)
+        {
+            NS_LOG_ERROR("Error setting up receive buffer: Could not map ring");
+            exit(1);
+        }
+        close(fd);
+
+        LRcvRing = ring;
     }
 
     void
@@ -442,9 +723,31 @@ namespace ns3
             NS_LOG_WARN("Could not connect to Lowcaf Server");
             sleep(5);
         }
+        if (LRcvRing == NULL)
+        {
+            LMapRcvRing();
+        }
+        LRcvStart = 0;
+        LServerCommBuffer = LRcvRing;
         LServerCommBufferLen = 0;
         commactive = true;
         NS_LOG_INFO("Connected to Lowcaf Server");
+
+        // Announce our capabilities. Until the server answers, we only send single packet
+        // messages
+        u_int8_t hello[CMD_SIZE + VERSION_SIZE + CAPS_SIZE];
+        u_int16_t nversion = htons(LOWCAF_PROTOCOL_VERSION);
+        u_int32_t ncaps = htonl(LOCAL_CAPS);
+
+        hello[0] = HELLO_CMD;
+        memcpy(hello + CMD_SIZE, &nversion, VERSION_SIZE);
+        memcpy(hello + CMD_SIZE + VERSION_SIZE, &ncaps, CAPS_SIZE);
+
+        LPeerCaps = 0;
+        if (send(ClientSocket, hello, sizeof(hello), 0) < 0)
+        {
+            NS_LOG_ERROR("Sending hello to Lowcaf Server failed");
+        }
     }
 
     /**
@@ -464,19 +767,18 @@ namespace ns3
             NS_LOG_ERROR("Connection to Lowcaf Server seems broken!");
         }
 
-        u_int8_t serializedpacket[MAX_PACKET_SIZE];
-        u_int32_t packetsize = packet->CopyData(serializedpacket, MAX_PACKET_SIZE);
-        if (packetsize <= 0)
+        u_int32_t packetsize = packet->GetSize();
+        if (packetsize <= 0 || packetsize > MAX_PACKET_SIZE)
         {
             NS_LOG_WARN("Serialized Packet has no size or failed serializing");
             return;
         }
 
-        u_int8_t *buffer;
-        buffer = (u_int8_t *)malloc(CMD_SIZE + HOST_SIZE + LNODE_SIZE + DELAY_SIZE + PKT_LEN_SIZE +
-                                    packetsize);
-
-        u_int16_t cmd = PACKET_CMD;
+        // Append one packet record (a packet message without its command byte)
+        u_int32_t offset = LSendBuffer.size();
+        u_int32_t headersize = HOST_SIZE + LNODE_SIZE + DELAY_SIZE + PKT_LEN_SIZE;
+        LSendBuffer.resize(offset + headersize + packetsize);
+        u_int8_t *record = LSendBuffer.data() + offset;
 
         u_int64_t initdelay = 0;
 
@@ -485,29 +787,102 @@ namespace ns3
         u_int64_t ndelay = htobe64(initdelay);
         u_int32_t npacketsize = htonl(packetsize);
 
-        memcpy(buffer, &cmd, CMD_SIZE);
-        memcpy(buffer + CMD_SIZE, &nlappid, HOST_SIZE);
-        memcpy(buffer + CMD_SIZE + HOST_SIZE, &nlnodeid, LNODE_SIZE);
-        memcpy(buffer + CMD_SIZE + HOST_SIZE + LNODE_SIZE, &ndelay, DELAY_SIZE);
-        memcpy(buffer + CMD_SIZE + HOST_SIZE + LNODE_SIZE + DELAY_SIZE, &npacketsize, PKT_LEN_SIZE);
-        memcpy(buffer + CMD_SIZE + HOST_SIZE + LNODE_SIZE + DELAY_SIZE + PKT_LEN_SIZE,
-               serializedpacket,
-               packetsize);
+        memcpy(record, &nlappid, HOST_SIZE);
+        memcpy(record + HOST_SIZE, &nlnodeid, LNODE_SIZE);
+        memcpy(record + HOST_SIZE + LNODE_SIZE, &ndelay, DELAY_SIZE);
+        memcpy(record + HOST_SIZE + LNODE_SIZE + DELAY_SIZE, &npacketsize, PKT_LEN_SIZE);
+        packet->CopyData(record + headersize, packetsize);
+        LSendBufferCount++;
+        LSendRecordEnds.push_back(LSendBuffer.size());
 
-        int sentbytes = send(ClientSocket,
-                             buffer,
-                             CMD_SIZE + HOST_SIZE + LNODE_SIZE + DELAY_SIZE + PKT_LEN_SIZE + packetsize,
-                             0);
+        // Collect all packets dispatched at the current simulation time into one write
+        if (!LFlushScheduled)
+        {
+            LFlushScheduled = true;
+            Simulator::ScheduleNow(&LApplication::LFlushSendBuffer, this);
+        }
+        LReceiveServerData(false);
+    }
 
-        if (sentbytes < 0)
+    void
+    LApplication::LFlushSendBuffer()
+    {
+        LFlushScheduled = false;
+
+        if (LSendBufferCount == 0)
         {
-            NS_LOG_ERROR("Sending message to Lowcaf Server failed");
+            return;
+        }
+
+        static u_int8_t packetcmd = PACKET_CMD;
+        u_int8_t header[CMD_SIZE + BATCH_COUNT_SIZE + BATCH_LEN_SIZE];
+
+        LSendIov.clear();
+        if (LSendBufferCount > 1 && (LPeerCaps & CAP_BATCH))
+        {
+            u_int32_t ncount = htonl(LSendBufferCount);
+            u_int32_t nbodylen = htonl(LSendBuffer.size());
+
+            header[0] = BATCH_CMD;
+            memcpy(header + CMD_SIZE, &ncount, BATCH_COUNT_SIZE);
+            memcpy(header + CMD_SIZE + BATCH_COUNT_SIZE, &nbodylen, BATCH_LEN_SIZE);
+            LSendIov.push_back({header, sizeof(header)});
+            LSendIov.push_back({LSendBuffer.data(), LSendBuffer.size()});
         }
         else
         {
-            NS_LOG_DEBUG("Sent message with " << sentbytes << " bytes to Lowcaf Server");
+            // One packet message per record, but still a single write
+            u_int32_t start = 0;
+            for (u_int32_t end : LSendRecordEnds)
+            {
+                LSendIov.push_back({&packetcmd, CMD_SIZE});
+                LSendIov.push_back({LSendBuffer.data() + start, end - start});
+                start = end;
+            }
+        }
+
+        if (LWriteAll(LSendIov.data(), LSendIov.size()))
+        {
+            NS_LOG_DEBUG("Sent " << LSendBufferCount << " packets with " << LSendBuffer.size()
+                                 << " bytes to Lowcaf Server");
+        }
+
+        // clear() keeps the allocated memory for the next packets
+        LSendBuffer.clear();
+        LSendRecordEnds.clear();
+        LSendBufferCount = 0;
+    }
+
+    bool
+    LApplication::LWriteAll(struct iovec *iov, int iovcnt)
+    {
+        while (iovcnt > 0)
+        {
+            ssize_t sentbytes = writev(ClientSocket, iov, std::min(iovcnt, IOV_MAX));
+            if (sentbytes < 0)
+            {
+                if (errno == EINTR)
+                {
+                    continue;
+                }
+                NS_LOG_ERROR("Sending message to Lowcaf Server failed");
+                return false;
+            }
+
+            // Skip everything that was written, continue with the rest
+            while (iovcnt > 0 && (size_t)sentbytes >= iov->iov_len)
+            {
+                sentbytes -= iov->iov_len;
+                iov++;
+                iovcnt--;
+            }
+            if (iovcnt > 0)
+            {
+                iov->iov_base = (u_int8_t *)iov->iov_base + sentbytes;
+                iov->iov_len -= sentbytes;
+            }
         }
-        LListenForServerData();
+        return true;
     }
 
     /**
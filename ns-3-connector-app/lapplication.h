@@ -15,6 +15,10 @@
 #include "ns3/core-module.h"
 #include "ns3/network-module.h"
 
+#include <stdint.h>
+#include <sys/uio.h>
+#include <vector>
+
 /*
  * @brief Some protocol field lengths
  *
@@ -29,6 +33,12 @@
 #define ETH_HEADER_SIZE 14 // Ethernet header size
 #define PKT_LEN_SIZE 4 // Packet length field size
 #define MAX_PACKET_SIZE 60000 // Maximum packet size
+#define VERSION_SIZE 2 // Protocol version field size
+#define CAPS_SIZE 4 // Capability flags field size
+#define BATCH_COUNT_SIZE 4 // Number of packets in a batch
+#define BATCH_LEN_SIZE 4 // Length of the batch body
+#define RCV_RING_SIZE (512 * 1024) // Receive buffer size, must be a multiple of the page size
+#define HORIZON_SIZE 8 // Horizon field size
 
 /**
  * @brief Different protocol commands
@@ -37,6 +47,25 @@
 #define PACKET_CMD 1 // Command: New Packet
 #define END_OF_SIM_CMD 2 // Command: End of simulation
 #define CURRENTLY_NO_DATA 3 // Command: Currently no data available
+#define HELLO_CMD 4 // Command: Version and capability exchange
+#define BATCH_CMD 5 // Command: Several packets behind one header
+#define HORIZON_CMD 6 // Command: Time synchronization
+
+/**
+ * @brief Protocol version and capabilities announced in the hello message
+ *
+ */
+#define LOWCAF_PROTOCOL_VERSION 1
+#define CAP_BATCH 0x01 // Peer understands BATCH_CMD frames
+#define CAP_SYNC 0x02 // Peer understands HORIZON_CMD frames
+#define LOCAL_CAPS (CAP_BATCH | CAP_SYNC) // Capabilities supported by this application
+
+/**
+ * @brief Time synchronization
+ *
+ */
+#define HORIZON_END UINT64_MAX // Horizon granted once Lowcaf no longer depends on the simulation
+#define POLL_INTERVAL_MS 1 // Interval of listening for data without time synchronization
 
 using namespace ns3;
 
@@ -112,11 +141,24 @@ namespace ns3
     LApplicationType LType;         // Type of this application: source, intermediate, sink
     u_int32_t LApplicationID;       // ID of this application
     u_int32_t LNodeID;              // ID of remote Lowcaf node
-    char LServerCommBuffer[512000]; // Buffer for processing messages from the Lowcaf framework. Needed due to packet segmentation in TCP
-    u_int32_t LServerCommBufferLen; // Current size of Buffer
+    char *LRcvRing;                 // Circular receive buffer, mapped twice in a row so that data wrapping around its end stays contiguous
+    u_int32_t LRcvStart;            // Offset of the first unprocessed byte in LRcvRing
+    char *LServerCommBuffer;        // First unprocessed byte of messages from the Lowcaf framework. Needed due to packet segmentation in TCP
+    u_int32_t LServerCommBufferLen; // Number of unprocessed bytes
     char *LServerAddr;              // Lowcaf server address
     int LServerPort;                // Lowcaf service port
     bool commactive;                // Flag whether the communication is still active
+    u_int32_t LPeerCaps;            // Capabilities negotiated with the Lowcaf framework
+    std::vector<u_int8_t> LSendBuffer; // Packet records not yet sent to Lowcaf. Reused between sends
+    u_int32_t LSendBufferCount;     // Number of packet records in LSendBuffer
+    std::vector<u_int32_t> LSendRecordEnds; // End of every packet record in LSendBuffer
+    std::vector<struct iovec> LSendIov; // Buffers of a single write. Reused between sends
+    bool LFlushScheduled;           // Whether LFlushSendBuffer is already scheduled
+    u_int64_t LHorizon;             // Lowcaf sends no packet for a time before this horizon in ns
+    u_int64_t LAnnounced;           // Horizon in ns last announced to Lowcaf
+    bool LAnnouncedAny;             // Whether a horizon was announced yet
+
+    static std::vector<LApplication *> LInstances; // All initialized applications
 
     /**
      * @brief Start the application
@@ -151,11 +193,34 @@ namespace ns3
     void LDispatchPacket(Ptr<NetDevice> netdev, Ptr<Packet> packet);
 
     /**
-     * @brief Listen for data from the lowcaf server
+     * @brief Listen for data from the lowcaf server. With time synchronization, waits until Lowcaf
+     * granted a horizon beyond the current time and schedules the next listen at that horizon.
+     * Otherwise, the next listen is scheduled after POLL_INTERVAL_MS.
      *
      */
     void LListenForServerData();
 
+    /**
+     * @brief Reads and processes the data the Lowcaf server sent so far
+     *
+     * @param block Wait until data is available
+     */
+    void LReceiveServerData(bool block);
+
+    /**
+     * @brief Schedules the next LListenForServerData
+     *
+     */
+    void LScheduleListen();
+
+    /**
+     * @brief Tells Lowcaf that no packet for a time before the current simulation time will be
+     * dispatched anymore. Only done by applications dispatching packets over a connection
+     * supporting time synchronization
+     *
+     */
+    void LAnnounceHorizon();
+
     /**
      * @brief Send packet towards succeeding ns-3 nodes
      *
@@ -175,6 +240,69 @@ namespace ns3
      */
     int LProcessRcvPacket();
 
+    /**
+     * @brief Processes a batch message from the LServerBuffer. Behaves like
+     * LProcessRcvPacket, but schedules all packets contained in the batch
+     *
+     * @return int 0 on success, otherwise -1
+     */
+    int LProcessRcvBatch();
+
+    /**
+     * @brief Processes the hello message of the Lowcaf framework and stores the negotiated
+     * capabilities
+     *
+     * @return int 0 on success, otherwise -1
+     */
+    int LProcessHello();
+
+    /**
+     * @brief Processes a horizon granted by the Lowcaf framework
+     *
+     * @return int 0 on success, otherwise -1
+     */
+    int LProcessHorizon();
+
+    /**
+     * @brief Schedules the packet contained in a single packet record, i.e., a packet message
+     * without its command byte
+     *
+     * @param record Start of the record
+     * @param available Number of valid bytes starting at record
+     * @return int Size of the record on success, -1 if the record is incomplete
+     */
+    int LScheduleRecord(const char *record, u_int32_t available);
+
+    /**
+     * @brief Maps the circular receive buffer LRcvRing
+     *
+     */
+    void LMapRcvRing();
+
+    /**
+     * @brief Removes len bytes from the front of the LServerCommBuffer
+     *
+     * @param len Number of bytes to remove
+     */
+    void LConsumeBuffer(u_int32_t len);
+
+    /**
+     * @brief Sends all pending packet records towards the Lowcaf framework with a single write.
+     * Several records are sent as one batch message if the peer supports it, as packet messages
+     * otherwise
+     *
+     */
+    void LFlushSendBuffer();
+
+    /**
+     * @brief Writes all given buffers to the ClientSocket with as few syscalls as possible
+     *
+     * @param iov Buffers to send. The array is modified
+     * @param iovcnt Number of buffers
+     * @return true if everything was sent
+     */
+    bool LWriteAll(struct iovec *iov, int iovcnt);
+
     /**
      * @brief Initialize communication towards Lowcaf framework
      * 